@@ -1,34 +1,57 @@
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
-from fastapi.responses import ORJSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from fastapi_cache.decorator import cache
 from fastapi_limiter import FastAPILimiter
 from fastapi_pagination import add_pagination
-from redis import asyncio as aioredis
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from api.src.users.v1.user import router as user_router
+from infrastructure.api_services.common.cache import TieredCache
+from infrastructure.api_services.common.cache_backend import StampedeProtectedBackend
 from infrastructure.api_services.common.cors import setup_cors
+from infrastructure.api_services.common.http_client import close_http_clients
+from infrastructure.api_services.common.request import start_workers, stop_workers
+from infrastructure.api_services.common.response_cache import close_response_cache, init_response_cache
 from infrastructure.database import setup as database
 from infrastructure.database import setup as database_setup
+from infrastructure.database.instrumentation import query_scope
 from infrastructure.database.requests import RequestsRepo
+from infrastructure.metrics import CONTENT_TYPE, HTTP_REQUEST_LATENCY, registry
+from infrastructure.metrics.redis_client import InstrumentedRedis
 from settings import settings, logger
 
 
 @asynccontextmanager
 async def lifespan(App: FastAPI):  # noqa
-    database.redis = aioredis.from_url(settings.redis.dsn, encoding="utf-8")
+    database.redis = InstrumentedRedis.from_url(settings.redis.dsn, encoding="utf-8")
     # Initialize Cache and Limiter
     await initialize_cache_and_limiter()
     # Initialize database
     await initialize_database()
+    # Hot responses are served from process memory, other replicas are told about writes
+    response_storage = TieredCache(database.redis, prefix="http_cache")
+    response_storage.start()
+    init_response_cache(
+        database.redis,
+        cache=response_storage,
+        stale_ttl=settings.http.cache_stale_ttl,
+        lock_timeout=settings.http.cache_lock_timeout,
+    )
+    await start_workers()
     logger.info("Application initialized")
     yield
+    await stop_workers()
+    await close_response_cache()
+    await response_storage.close()
     await database.redis.close()
     await FastAPILimiter.close()
+    await close_http_clients()
+    if database.replicas is not None:
+        await database.replicas.close()
 
 
 app = FastAPI(
@@ -42,6 +65,37 @@ app = FastAPI(
 )
 
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        with query_scope(f"{request.method} {request.url.path}"):
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template keeps the label set bounded, unlike the raw path
+        route = request.scope.get("route")
+        HTTP_REQUEST_LATENCY.labels(
+            request.method,
+            route.path if route is not None else "unmatched",
+            status,
+        ).observe(time.perf_counter() - start)
+
+
+@app.middleware("http")
+async def release_cache_locks(request: Request, call_next):
+    # An endpoint that failed never stores its value, which releases the recompute lock
+    async with FastAPICache.get_backend().recompute_scope():
+        return await call_next(request)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/ping")
 async def pong() -> dict[str, str]:
     return {"ping": "pong!"}
@@ -60,8 +114,8 @@ add_pagination(app)
 
 
 async def initialize_cache_and_limiter():
-    database.redis = aioredis.from_url(settings.redis.dsn, encoding="utf-8")
-    FastAPICache.init(RedisBackend(database.redis), prefix="fastapi-cache")
+    database.redis = InstrumentedRedis.from_url(settings.redis.dsn, encoding="utf-8")
+    FastAPICache.init(StampedeProtectedBackend(database.redis), prefix="fastapi-cache")
     await FastAPILimiter.init(database.redis)
 
 
@@ -6,6 +6,17 @@ from infrastructure.database.requests import RequestsRepo, get_database_repo
 router = APIRouter()
 
 
+@router.get(
+    "/stats",
+)
+async def users_stats(
+        repo: RequestsRepo = Depends(get_database_repo),
+):
+    return await generic_exception_handler(
+        async_func=repo.stats.get_user_stats,
+    )
+
+
 @router.get(
     "/{user_id}",
 )
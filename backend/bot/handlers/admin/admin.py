@@ -1,13 +1,72 @@
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
 from infrastructure.database.requests import RequestsRepo
+from infrastructure.database.repo.stats import UserStats
+from services.broadcast_jobs import BroadcastJobStore, BroadcastJobStatus
 
 router = Router()
 
 
 @router.message(Command('admin'))
 async def admin_start(message: Message, repo: RequestsRepo):
-    users_count = await repo.users.count_all()
-    await message.answer(f"Привет, админ!\n\nВсего пользователей: {users_count}")
+    stats = await repo.stats.get_user_stats()
+    await message.answer(f"Привет, админ!\n\n{format_user_stats(stats)}")
+
+
+@router.message(Command('broadcast'))
+async def admin_broadcast(message: Message, command: CommandObject, repo: RequestsRepo,
+                          broadcast_jobs: BroadcastJobStore):
+    if not command.args:
+        await message.answer("Использование: /broadcast <текст>")
+        return
+
+    # Streamed from the database, so the audience is never loaded into memory at once
+    job_id = await broadcast_jobs.create_job((user.id async for user in repo.users.iter_all()), command.args)
+    status = await broadcast_jobs.get_status(job_id)
+    await message.answer(f"Рассылка #{job_id} создана для {status.total} пользователей.\n"
+                         f"Прогресс: /broadcast_status {job_id}")
+
+
+@router.message(Command('broadcast_status'))
+async def admin_broadcast_status(message: Message, command: CommandObject, broadcast_jobs: BroadcastJobStore):
+    job_ids = [command.args.strip()] if command.args else await broadcast_jobs.active_jobs()
+    if not job_ids:
+        await message.answer("Активных рассылок нет.")
+        return
+
+    lines = []
+    for job_id in job_ids:
+        status = await broadcast_jobs.get_status(job_id)
+        if status is None:
+            lines.append(f"Рассылка #{job_id} не найдена.")
+        else:
+            lines.append(format_job_status(status))
+    await message.answer("\n\n".join(lines))
+
+
+def format_job_status(status: BroadcastJobStatus) -> str:
+    percent = status.processed / status.total * 100 if status.total else 100
+    eta = f"{status.eta:.0f} сек." if status.eta is not None else "—"
+    return (
+        f"Рассылка #{status.job_id}: {status.status}\n"
+        f"Обработано: {status.processed}/{status.total} ({percent:.1f}%)\n"
+        f"Отправлено: {status.sent}, ошибок: {status.failed}\n"
+        f"Скорость: {status.rate:.1f} сообщ./сек., осталось: {eta}"
+    )
+
+
+def format_user_stats(stats: UserStats) -> str:
+    if not stats.exact:
+        return f"Всего пользователей: ~{stats.total}"
+
+    languages = ", ".join(
+        f"{language or '—'}: {count}"
+        for language, count in sorted(stats.languages.items(), key=lambda item: -item[1])
+    )
+    return (
+        f"Всего пользователей: {stats.total}\n"
+        f"Новых сегодня: {stats.new_today}\n"
+        f"По языкам: {languages or '—'}"
+    )
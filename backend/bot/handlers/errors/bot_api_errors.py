@@ -1,4 +1,3 @@
-import asyncio
 import logging
 
 from aiogram import Router
@@ -18,8 +17,8 @@ router = Router()
 @router.error()
 async def error_handler(event: ErrorEvent):
     if isinstance(event.exception, TelegramRetryAfter):
-        logging.warning(f"Флуд атака началась, сплю {event.exception.retry_after} сек.")
-        await asyncio.sleep(int(event.exception.retry_after) + 2)
+        # RequestScheduler already held the chat and retried the request
+        logger.warning(f"Флуд атака, повторы запроса исчерпаны (retry_after={event.exception.retry_after} сек.)")
         return True  # Слишком много запросов
 
     if isinstance(event, CancelHandler):
@@ -9,17 +9,29 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.i18n import I18n
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from redis.asyncio.client import Redis
-from redis.connection import ConnectionPool
+from redis.asyncio.connection import ConnectionPool
 from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from handlers import routers_list
-from infrastructure.database.setup import create_engine, create_session_pool
+from infrastructure.database.repo.stats import StatsRepo
+from infrastructure.database.setup import create_engine, create_replica_pool, create_session_pool
+from infrastructure.metrics.redis_client import InstrumentedRedis
 from middlewares.config import ConfigMiddleware
 from middlewares.database import DatabaseMiddleware
 from middlewares.i18n import CustomI18nMiddleware
+from middlewares.metrics import HandlerMetricsMiddleware
 from services import broadcaster
+from services.broadcast_jobs import BroadcastJobRunner, BroadcastJobStore
+from services.fsm_storage import PipelinedRedisStorage
+from services.metrics_server import start_metrics_server
+from services.request_scheduler import RequestScheduler
+from services.sheduler import BatchingRedisJobStore, SchedulerLeader
+from services.update_executor import UpdateExecutor
+from services.user_cache import UserCache
+from services.webhook import check_webhook_settings, run_webhook
 from settings import get_app_settings
 from settings.app_settings import AppSettings
+from utils.file_cache import init_file_cache
 from utils.set_bot_commands import set_default_commands, set_admin_commands
 
 
@@ -36,12 +48,14 @@ def register_global_middlewares(
         async_session: async_sessionmaker = None,
         redis: Redis = None,
         apscheduler: AsyncIOScheduler = None,
+        user_cache: UserCache = None,
 ):
     """
     Register global middlewares for the given dispatcher.
     Global middlewares here are the ones that are applied to all the handlers (you specify the type of update)
 
     :param apscheduler: The apscheduler instance.
+    :param user_cache: The user snapshot cache instance.
     :param i18n: The i18n instance.
     :param redis: The redis instance.
     :param dp: The dispatcher instance.
@@ -52,7 +66,7 @@ def register_global_middlewares(
     """
     bot_middleware = [
         ConfigMiddleware(settings, apscheduler),
-        DatabaseMiddleware(async_session, redis),
+        DatabaseMiddleware(async_session, redis, user_cache),
         CustomI18nMiddleware(i18n),
     ]
 
@@ -68,6 +82,11 @@ def register_global_middlewares(
     for middleware_type in channel_middleware:
         dp.channel_post.outer_middleware(middleware_type)
 
+    handler_metrics = HandlerMetricsMiddleware()
+    for event_name, observer in dp.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(handler_metrics)
+
 
 def setup_logging():
     """
@@ -95,43 +114,131 @@ def setup_logging():
     logger.info("Starting bot")
 
 
-def get_storage():
+def get_storage(settings: AppSettings, redis: Redis):
     """
     Return storage based on the provided configuration.
 
+    Args:
+        settings (AppSettings): The configuration object from the loaded configuration.
+        redis (Redis): The redis instance used when `use_redis` is enabled.
+
     Returns:
         Storage: The storage object based on the configuration.
 
     """
+    if settings.bot.use_redis:
+        return PipelinedRedisStorage(
+            redis,
+            state_ttl=settings.bot.fsm_state_ttl,
+            data_ttl=settings.bot.fsm_data_ttl,
+        )
     return MemoryStorage()
 
 
 async def main():
     setup_logging()
 
-    scheduler = AsyncIOScheduler()
-    scheduler.start()
     settings = get_app_settings()
+    if settings.bot.use_webhook:
+        check_webhook_settings(settings.bot)
+
+    connection_pool = ConnectionPool.from_url(settings.redis.dsn)
+    redis = InstrumentedRedis(connection_pool=connection_pool)
 
-    storage = get_storage()
+    jobstore = BatchingRedisJobStore(
+        db=settings.redis.redis_db,
+        host=settings.redis.redis_host,
+        port=settings.redis.redis_port,
+        password=settings.redis.redis_password,
+    )
+    scheduler = AsyncIOScheduler(jobstores={"default": jobstore})
+    # Every instance can add jobs, only the leader runs them
+    scheduler.start(paused=True)
+    scheduler_leader = SchedulerLeader(scheduler, redis, ttl=settings.bot.scheduler_leader_ttl)
+    scheduler_leader.start()
+
+    init_file_cache(redis)
+    storage = get_storage(settings, redis)
     bot = Bot(token=settings.bot.token, default=DefaultBotProperties(parse_mode="HTML"))
+    bot.session.middleware(RequestScheduler(
+        rate=settings.bot.api_rate,
+        chat_interval=settings.bot.api_chat_interval,
+        group_interval=settings.bot.api_group_interval,
+        chat_burst=settings.bot.api_chat_burst,
+        max_retries=settings.bot.api_max_retries,
+    ))
     dp = Dispatcher(storage=storage)
 
+    # Runs the rest of the chain, FSM resolution included, on its workers
+    update_executor = UpdateExecutor(
+        dp,
+        concurrency=settings.bot.updates_concurrency,
+        queue_size=settings.bot.updates_queue_size,
+        # Webhook in-flight slots are held until the update is processed, polling only queues it
+        wait_for_result=settings.bot.use_webhook,
+    )
+    update_executor.install(dp)
+    update_executor.start()
+
     relative_path = os.path.join(os.getcwd(), "bot", "locales")
     i18n = I18n(path=relative_path, default_locale="ru", domain="messages")
 
     dp.include_routers(*routers_list)
 
+    pool_capacity = settings.postgres.pool_size + settings.postgres.max_overflow
+    if pool_capacity < settings.bot.updates_concurrency:
+        logging.warning(
+            f"Database pool holds {pool_capacity} connections for {settings.bot.updates_concurrency} "
+            f"concurrent updates, updates will wait for connections"
+        )
     engine = create_engine(settings.postgres)
-    session_pool = create_session_pool(engine)
+    replica_pool = create_replica_pool(settings.postgres)
+    session_pool = create_session_pool(engine, replica_pool)
+
+    user_cache = UserCache(
+        session_pool,
+        redis,
+        max_size=settings.bot.user_cache_size,
+        ttl=settings.bot.user_cache_ttl,
+        flush_interval=settings.bot.user_flush_interval,
+        flush_batch_size=settings.bot.user_flush_batch_size,
+        user_stats=StatsRepo(session_pool, redis, max_age=settings.misc.stats_max_age),
+    )
+    user_cache.start()
 
-    connection_pool = ConnectionPool.from_url(settings.redis.dsn)
-    redis = Redis(connection_pool=connection_pool)
+    register_global_middlewares(dp, settings, i18n, session_pool, redis, scheduler, user_cache)
 
-    register_global_middlewares(dp, settings, i18n, session_pool, redis, scheduler)
+    broadcast_jobs = BroadcastJobStore(
+        redis,
+        chunk_size=settings.bot.broadcast_chunk_size,
+        lease_ttl=settings.bot.broadcast_lease_ttl,
+    )
+    dp["broadcast_jobs"] = broadcast_jobs
+    broadcast_runner = BroadcastJobRunner(bot, broadcast_jobs)
+    broadcast_runner.start()
+
+    metrics_runner = None
+    if settings.bot.metrics_port:
+        metrics_runner = await start_metrics_server(settings.bot.metrics_host, settings.bot.metrics_port)
 
-    await on_startup(bot, settings.bot.admin_ids)
-    await dp.start_polling(bot)
+    try:
+        await on_startup(bot, settings.bot.admin_ids)
+        if settings.bot.use_webhook:
+            await run_webhook(dp, bot, settings.bot)
+        else:
+            await bot.delete_webhook()
+            # Updates are queued by the executor, so polling needs no task per update
+            await dp.start_polling(bot, handle_as_tasks=False)
+    finally:
+        await update_executor.close()
+        await broadcast_runner.close()
+        await scheduler_leader.close()
+        scheduler.shutdown(wait=False)
+        await user_cache.close()
+        if replica_pool is not None:
+            await replica_pool.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -1,16 +1,65 @@
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from redis.asyncio.client import Redis
 
 from infrastructure.database.requests import RequestsRepo
+from services.user_cache import UserCache
+
+
+class LazyResource:
+    """
+    Proxy that creates the wrapped object on the first attribute access.
+
+    Handlers and filters get it instead of the real session or repo,
+    so updates whose handlers never touch the database don't create them at all.
+    Attribute access and assignment, `async with` and `isinstance` checks go to the wrapped
+    object; `type()` still returns LazyResource.
+    """
+
+    __slots__ = ("_factory", "_instance")
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._instance: Optional[Any] = None
+
+    @property
+    def created(self) -> bool:
+        return self._instance is not None
+
+    @property
+    def instance(self) -> Any:
+        if self._instance is None:
+            self._instance = self._factory()
+        return self._instance
+
+    @property
+    def __class__(self) -> type:
+        # Lets isinstance(session, AsyncSession) hold as it did for the real session
+        return type(self.instance)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.instance, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in LazyResource.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.instance, name, value)
+
+    async def __aenter__(self) -> Any:
+        return await self.instance.__aenter__()
+
+    async def __aexit__(self, *exc_info: Any) -> Any:
+        return await self.instance.__aexit__(*exc_info)
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    def __init__(self, async_session, redis: Redis) -> None:
+    def __init__(self, async_session, redis: Redis, user_cache: UserCache) -> None:
         self.async_session = async_session
         self.redis = redis
+        self.user_cache = user_cache
 
     async def __call__(
             self,
@@ -21,21 +70,31 @@ class DatabaseMiddleware(BaseMiddleware):
             event: Message | CallbackQuery | ChatMemberUpdated,
             data: Dict[str, Any],
     ) -> Any:
-        async with self.async_session() as session:
-            repo = RequestsRepo(session)
+        # One unit of work per update: the session is shared by `session` and all repositories
+        repo = LazyResource(lambda: RequestsRepo(self.async_session, self.redis, unit_of_work=True))
+        session = LazyResource(lambda: repo.instance.session)
 
-            user = await repo.users.get_or_create(
-                user_id=event.from_user.id,
-                first_name=event.from_user.first_name,
-                last_name=event.from_user.last_name,
-                language=event.from_user.language_code,
-                username=event.from_user.username
-            )
+        user = await self.user_cache.get_user(
+            user_id=event.from_user.id,
+            first_name=event.from_user.first_name,
+            last_name=event.from_user.last_name,
+            language=event.from_user.language_code,
+            username=event.from_user.username
+        )
 
-            data["session"] = session
-            data["repo"] = repo
-            data["user"] = user
+        data["session"] = session
+        data["repo"] = repo
+        data["user"] = user
 
+        try:
             result = await handler(event, data)
-
-        return result
+            if repo.created:
+                await repo.instance.commit()
+            return result
+        except BaseException:
+            if repo.created:
+                await repo.instance.rollback()
+            raise
+        finally:
+            if repo.created:
+                await repo.instance.close()
@@ -0,0 +1,37 @@
+import time
+from typing import Callable, Dict, Any, Awaitable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from infrastructure.database.instrumentation import current_query_scope
+from infrastructure.metrics import HANDLER_LATENCY
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware that records handler latency.
+
+    Handlers are labeled by the module of their router and the function name.
+    The same name becomes the origin of SQL statements in the query scope of the update.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        callback = data["handler"].callback
+        module = getattr(callback, "__module__", "unknown")
+        name = getattr(callback, "__name__", type(callback).__name__)
+
+        scope = current_query_scope()
+        if scope is not None:
+            scope.origin = f"{module}.{name}"
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_LATENCY.labels(module, name).observe(time.perf_counter() - start)
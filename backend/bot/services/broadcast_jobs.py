@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, TypeVar, Union
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from services.broadcaster import get_broadcaster
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Atomically hand out the next chunk of recipients: an expired lease (a replica died
+# mid-chunk) is taken over first, otherwise the cursor is advanced by chunk_size.
+CLAIM_CHUNK_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #expired > 0 then
+    redis.call('ZADD', KEYS[1], ARGV[2], expired[1])
+    return tonumber(expired[1])
+end
+local total = tonumber(redis.call('HGET', KEYS[3], 'total') or '0')
+local chunk_size = tonumber(redis.call('HGET', KEYS[3], 'chunk_size') or '100')
+local start = tonumber(redis.call('GET', KEYS[2]) or '0')
+if start >= total then
+    return -1
+end
+redis.call('SET', KEYS[2], start + chunk_size)
+redis.call('ZADD', KEYS[1], ARGV[2], start)
+return start
+"""
+
+
+@dataclass
+class BroadcastJobStatus:
+    job_id: str
+    status: str
+    total: int
+    sent: int
+    failed: int
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """Messages per second since the job was started."""
+        if not self.elapsed:
+            return 0.0
+        return self.processed / self.elapsed
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left at the current rate."""
+        if self.status == "done":
+            return 0.0
+        if not self.rate:
+            return None
+        return (self.total - self.processed) / self.rate
+
+
+class BroadcastJobStore:
+    """
+    Broadcast jobs persisted in Redis.
+
+    Keys of a job:
+        {prefix}:job:{id}             hash with message, counters and timestamps
+        {prefix}:job:{id}:recipients  list of recipient ids
+        {prefix}:job:{id}:staging     recipients being written by create_job, expires if it fails
+        {prefix}:job:{id}:cursor      index of the next unclaimed recipient
+        {prefix}:job:{id}:leases      zset of claimed chunk starts scored by lease deadline
+        {prefix}:job:{id}:done        set of recipients the message was sent to
+        {prefix}:job:{id}:failed      set of recipients the message failed for
+    """
+
+    # Seconds a staging list of an interrupted create_job is kept
+    STAGING_TTL = 3600
+
+    def __init__(
+            self,
+            redis: Redis,
+            prefix: str = "broadcast",
+            chunk_size: int = 100,
+            lease_ttl: int = 60,
+    ) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.lease_ttl = lease_ttl
+        self._claim_chunk = redis.register_script(CLAIM_CHUNK_SCRIPT)
+
+    @property
+    def jobs_key(self) -> str:
+        return f"{self.prefix}:jobs"
+
+    def _key(self, job_id: str, suffix: str = "") -> str:
+        key = f"{self.prefix}:job:{job_id}"
+        return f"{key}:{suffix}" if suffix else key
+
+    async def create_job(
+            self,
+            recipients: Union[Iterable[Union[int, str]], AsyncIterable[Union[int, str]]],
+            text: str,
+            disable_notification: bool = False,
+            reply_markup: InlineKeyboardMarkup = None,
+            batch_size: int = 1000,
+    ) -> str:
+        """
+        Persist a new job. It becomes visible to runners only after all recipients are stored.
+        Recipients may be an async iterable, so they can be streamed from the database.
+
+        Recipients are streamed into a staging list that expires on its own, and the list
+        is renamed and the job hash written in one transaction, so a failure midway
+        leaves nothing behind.
+
+        :return: Job id.
+        """
+        job_id = str(await self.redis.incr(f"{self.prefix}:last_job_id"))
+        staging_key = self._key(job_id, "staging")
+
+        total = 0
+        batch = []
+        if not hasattr(recipients, "__aiter__"):
+            recipients = _iterate(recipients)
+        async for recipient in recipients:
+            batch.append(recipient)
+            if len(batch) >= batch_size:
+                await self._stage(staging_key, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            await self._stage(staging_key, batch)
+            total += len(batch)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if total:
+                pipe.rename(staging_key, self._key(job_id, "recipients"))
+                pipe.persist(self._key(job_id, "recipients"))
+            pipe.hset(self._key(job_id), mapping={
+                "status": "pending" if total else "done",
+                "text": text,
+                "disable_notification": int(disable_notification),
+                "reply_markup": reply_markup.model_dump_json(exclude_none=True) if reply_markup else "",
+                "total": total,
+                "chunk_size": self.chunk_size,
+                "sent": 0,
+                "failed": 0,
+                "created_at": time.time(),
+            })
+            if total:
+                pipe.sadd(self.jobs_key, job_id)
+            await pipe.execute()
+
+        logger.info(f"Broadcast job {job_id} created for {total} recipients")
+        return job_id
+
+    async def _stage(self, staging_key: str, recipients: List[Union[int, str]]) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(staging_key, *recipients)
+            pipe.expire(staging_key, self.STAGING_TTL)
+            await pipe.execute()
+
+    async def active_jobs(self) -> List[str]:
+        job_ids = await self.redis.smembers(self.jobs_key)
+        return sorted((job_id.decode() for job_id in job_ids), key=int)
+
+    async def get_status(self, job_id: str) -> Optional[BroadcastJobStatus]:
+        job = await self.redis.hgetall(self._key(job_id))
+        if not job:
+            return None
+
+        job = {key.decode(): value.decode() for key, value in job.items()}
+        return BroadcastJobStatus(
+            job_id=job_id,
+            status=job["status"],
+            total=int(job["total"]),
+            sent=int(job["sent"]),
+            failed=int(job["failed"]),
+            created_at=float(job["created_at"]),
+            started_at=float(job["started_at"]) if job.get("started_at") else None,
+            finished_at=float(job["finished_at"]) if job.get("finished_at") else None,
+        )
+
+    async def claim_chunk(self, job_id: str) -> Optional[tuple[int, List[str]]]:
+        """
+        Claim the next chunk of recipients that are not processed yet.
+
+        :return: Chunk start and its pending recipients, or None when nothing is left to claim.
+        """
+        now = time.time()
+        start = await self._claim_chunk(
+            keys=[self._key(job_id, "leases"), self._key(job_id, "cursor"), self._key(job_id)],
+            args=[now, now + self.lease_ttl],
+        )
+        if start < 0:
+            return None
+
+        await self.redis.hsetnx(self._key(job_id), "started_at", now)
+        await self.redis.hset(self._key(job_id), "status", "running")
+
+        recipients = await self.redis.lrange(self._key(job_id, "recipients"), start, start + self.chunk_size - 1)
+        if not recipients:
+            return start, []
+
+        # Skip recipients handled before a restart, so a taken over chunk is not sent twice
+        done = await self.redis.smismember(self._key(job_id, "done"), recipients)
+        failed = await self.redis.smismember(self._key(job_id, "failed"), recipients)
+        pending = [
+            recipient.decode()
+            for recipient, is_done, is_failed in zip(recipients, done, failed)
+            if not is_done and not is_failed
+        ]
+        return start, pending
+
+    async def mark(self, job_id: str, chunk_start: int, recipient: str, success: bool) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if success:
+                pipe.sadd(self._key(job_id, "done"), recipient)
+                pipe.hincrby(self._key(job_id), "sent", 1)
+            else:
+                pipe.sadd(self._key(job_id, "failed"), recipient)
+                pipe.hincrby(self._key(job_id), "failed", 1)
+            # Every processed recipient extends the lease of the chunk
+            pipe.zadd(self._key(job_id, "leases"), {chunk_start: time.time() + self.lease_ttl}, xx=True)
+            await pipe.execute()
+
+    async def renew_lease(self, job_id: str, chunk_start: int) -> None:
+        await self.redis.zadd(self._key(job_id, "leases"), {chunk_start: time.time() + self.lease_ttl}, xx=True)
+
+    async def complete_chunk(self, job_id: str, chunk_start: int) -> None:
+        await self.redis.zrem(self._key(job_id, "leases"), chunk_start)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self._key(job_id, "cursor"))
+            pipe.hget(self._key(job_id), "total")
+            pipe.zcard(self._key(job_id, "leases"))
+            cursor, total, leases = await pipe.execute()
+
+        if int(cursor or 0) >= int(total or 0) and not leases:
+            await self.finish_job(job_id)
+
+    async def finish_job(self, job_id: str, status: str = "done") -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={"status": status, "finished_at": time.time()})
+            pipe.srem(self.jobs_key, job_id)
+            await pipe.execute()
+        logger.info(f"Broadcast job {job_id}: {status}")
+
+    async def get_message(self, job_id: str) -> tuple[str, bool, Optional[InlineKeyboardMarkup]]:
+        text, disable_notification, reply_markup = await self.redis.hmget(
+            self._key(job_id), "text", "disable_notification", "reply_markup"
+        )
+        if text is None:
+            raise LookupError(f"Broadcast job {job_id} has no message")
+        return (
+            text.decode(),
+            bool(int(disable_notification)),
+            InlineKeyboardMarkup.model_validate_json(reply_markup) if reply_markup else None,
+        )
+
+
+async def _iterate(iterable: Iterable[T]) -> AsyncIterator[T]:
+    for item in iterable:
+        yield item
+
+
+class BroadcastJobRunner:
+    """
+    Background worker that claims recipient chunks of active jobs and sends them.
+
+    Every bot replica runs its own runner; chunks are claimed atomically, so replicas
+    share a job without sending to the same recipient twice. Rate limits of the bot
+    session apply per replica.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            store: BroadcastJobStore,
+            poll_interval: float = 5.0,
+    ) -> None:
+        self.bot = bot
+        self.store = store
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job_ids = await self.store.active_jobs()
+            except RedisError as e:
+                logger.error(f"Broadcast jobs: Redis error: {e}")
+                job_ids = []
+
+            for job_id in job_ids:
+                try:
+                    await self.process_job(job_id)
+                except RedisError as e:
+                    # Claimed chunks are taken over after their lease expires
+                    logger.error(f"Broadcast job {job_id}: Redis error: {e}")
+                except Exception:
+                    logger.exception(f"Broadcast job {job_id} failed")
+                    try:
+                        await self.store.finish_job(job_id, "failed")
+                    except RedisError as e:
+                        logger.error(f"Broadcast job {job_id}: can't mark as failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def process_job(self, job_id: str) -> None:
+        text, disable_notification, reply_markup = await self.store.get_message(job_id)
+        broadcaster = get_broadcaster(self.bot)
+
+        while (chunk := await self.store.claim_chunk(job_id)) is not None:
+            chunk_start, recipients = chunk
+
+            async def on_result(recipient: str, success: bool) -> None:
+                await self.store.mark(job_id, chunk_start, recipient, success)
+
+            # Sends extend the lease, but a send held by a long RetryAfter pause does not
+            heartbeat = asyncio.create_task(self._renew_lease(job_id, chunk_start))
+            try:
+                await broadcaster.run(recipients, text, disable_notification, reply_markup, on_result=on_result)
+            finally:
+                heartbeat.cancel()
+            await self.store.complete_chunk(job_id, chunk_start)
+
+    async def _renew_lease(self, job_id: str, chunk_start: int) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease_ttl / 3)
+            try:
+                await self.store.renew_lease(job_id, chunk_start)
+            except RedisError as e:
+                logger.warning(f"Broadcast job {job_id}: can't renew the lease of chunk {chunk_start}: {e}")
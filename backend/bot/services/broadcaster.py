@@ -1,11 +1,139 @@
 import asyncio
 import logging
-from typing import Union
+from typing import Awaitable, Callable, Iterable, Optional, Union
+from weakref import WeakKeyDictionary
 
 from aiogram import Bot
 from aiogram import exceptions
 from aiogram.types import InlineKeyboardMarkup
 
+from infrastructure.metrics import BROADCAST_MESSAGES
+from services.request_scheduler import retry_listener
+from settings import settings
+
+
+class Broadcaster:
+    """
+    Concurrent broadcaster engine.
+
+    Sends are paced by the bot session middleware (see `services.request_scheduler.RequestScheduler`):
+    the global token bucket, the per-chat pacer and the TelegramRetryAfter retries apply to them
+    together with the rest of the bot's requests, and a TelegramRetryAfter pauses all of them. The broadcaster bounds the number of
+    concurrent sends across all its runs, so broadcasts leave room in the bucket for replies to users.
+
+    Use one instance per bot, see `get_broadcaster`. The rate limit is per process:
+    N bot replicas send up to N times BOT__API_RATE messages per second, so set it to
+    Telegram's limit divided by the number of replicas.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            concurrency: Optional[int] = None,
+    ) -> None:
+        self.bot = bot
+        self.concurrency = settings.bot.broadcast_concurrency if concurrency is None else concurrency
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    async def send(
+            self,
+            user_id: Union[int, str],
+            text: str,
+            disable_notification: bool = False,
+            reply_markup: InlineKeyboardMarkup = None,
+    ) -> bool:
+        """
+        Safe messages sender
+
+        :param user_id: user id. If str - must contain only digits.
+        :param text: text of the message.
+        :param disable_notification: disable notification or not.
+        :param reply_markup: reply markup.
+        :return: success.
+        """
+        try:
+            async with self._slots:
+                listener = retry_listener.set(self._on_retry)
+                try:
+                    await self.bot.send_message(
+                        user_id,
+                        text,
+                        disable_notification=disable_notification,
+                        reply_markup=reply_markup,
+                    )
+                finally:
+                    retry_listener.reset(listener)
+        except exceptions.TelegramRetryAfter as e:
+            # The session middleware has already paused the sends and retried
+            logging.error(f"Target [ID:{user_id}]: Flood limit is exceeded, retry after {e.retry_after} seconds.")
+        except exceptions.TelegramBadRequest:
+            logging.error("Telegram server says - Bad Request: search not found")
+        except exceptions.TelegramForbiddenError:
+            logging.error(f"Target [ID:{user_id}]: got TelegramForbiddenError")
+        except exceptions.TelegramAPIError:
+            logging.exception(f"Target [ID:{user_id}]: failed")
+        else:
+            logging.info(f"Target [ID:{user_id}]: success")
+            self.sent += 1
+            BROADCAST_MESSAGES.labels("sent").inc()
+            return True
+
+        self.failed += 1
+        BROADCAST_MESSAGES.labels("failed").inc()
+        return False
+
+    def _on_retry(self, error: exceptions.TelegramRetryAfter) -> None:
+        self.retries += 1
+        BROADCAST_MESSAGES.labels("retry").inc()
+
+    async def run(
+            self,
+            users: Iterable[Union[str, int]],
+            text: str,
+            disable_notification: bool = False,
+            reply_markup: InlineKeyboardMarkup = None,
+            on_result: Optional[Callable[[Union[str, int], bool], Awaitable[None]]] = None,
+    ) -> int:
+        """
+        Send the message to all users with `concurrency` workers.
+
+        :param on_result: Coroutine called with the user id and the send result after every send.
+        :return: Count of messages sent in this run.
+        """
+        users_iter = iter(users)
+        sent = 0
+
+        async def worker():
+            nonlocal sent
+            # Workers share one iterator, so each user is taken exactly once
+            for user_id in users_iter:
+                success = await self.send(user_id, text, disable_notification, reply_markup)
+                sent += success
+                if on_result is not None:
+                    await on_result(user_id, success)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            logging.info(f"{sent} messages successful sent.")
+
+        return sent
+
+
+_broadcasters: "WeakKeyDictionary[Bot, Broadcaster]" = WeakKeyDictionary()
+
+
+def get_broadcaster(bot: Bot) -> Broadcaster:
+    """Broadcaster shared by all sends of the bot in this process."""
+    broadcaster = _broadcasters.get(bot)
+    if broadcaster is None:
+        broadcaster = _broadcasters[bot] = Broadcaster(bot)
+    return broadcaster
+
 
 async def send_message(
         bot: Bot,
@@ -24,31 +152,7 @@ async def send_message(
     :param reply_markup: reply markup.
     :return: success.
     """
-    try:
-        await bot.send_message(
-            user_id,
-            text,
-            disable_notification=disable_notification,
-            reply_markup=reply_markup,
-        )
-    except exceptions.TelegramBadRequest:
-        logging.error("Telegram server says - Bad Request: search not found")
-    except exceptions.TelegramForbiddenError:
-        logging.error(f"Target [ID:{user_id}]: got TelegramForbiddenError")
-    except exceptions.TelegramRetryAfter as e:
-        logging.error(
-            f"Target [ID:{user_id}]: Flood limit is exceeded. Sleep {e.retry_after} seconds."
-        )
-        await asyncio.sleep(e.retry_after)
-        return await send_message(
-            bot, user_id, text, disable_notification, reply_markup
-        )  # Recursive call
-    except exceptions.TelegramAPIError:
-        logging.exception(f"Target [ID:{user_id}]: failed")
-    else:
-        logging.info(f"Target [ID:{user_id}]: success")
-        return True
-    return False
+    return await get_broadcaster(bot).send(user_id, text, disable_notification, reply_markup)
 
 
 async def broadcast(
@@ -67,17 +171,4 @@ async def broadcast(
     :param reply_markup: Reply markup.
     :return: Count of messages.
     """
-    count = 0
-    try:
-        for user_id in users:
-            if await send_message(
-                    bot, user_id, text, disable_notification, reply_markup
-            ):
-                count += 1
-            await asyncio.sleep(
-                0.05
-            )  # 20 messages per second (Limit: 30 messages per second)
-    finally:
-        logging.info(f"{count} messages successful sent.")
-
-    return count
+    return await get_broadcaster(bot).run(users, text, disable_notification, reply_markup)
@@ -0,0 +1,91 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.storage.base import KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio.client import Redis
+
+# Data read together with the state by `get_state`, kept for the `get_data` of the same update.
+# Every update is processed in a context of its own (a task, see UpdateExecutor), so the
+# prefetched data never outlives the update that read it
+_prefetched: ContextVar[Optional[Tuple["PipelinedRedisStorage", str, Dict[str, Any]]]] = ContextVar(
+    "fsm_prefetched", default=None
+)
+
+
+class PipelinedRedisStorage(RedisStorage):
+    """
+    Redis FSM storage that reads state and data of a key in one pipelined round trip.
+
+    FSMContextMiddleware reads the state of every update before the handler runs, and handlers
+    usually read the data right after it, so `get_state` fetches both and keeps the data for the
+    next `get_data` of the key within the same update. Prefetched data is used once, dropped by
+    writes of the key and never seen by other updates, so a handler never gets data older than
+    the state its update was dispatched with, whichever replica wrote them.
+    State and data expire after `state_ttl`/`data_ttl`, so abandoned conversations are dropped.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            key_builder: Optional[KeyBuilder] = None,
+            state_ttl: Optional[int] = None,
+            data_ttl: Optional[int] = None,
+            prefetch: bool = True,
+            **kwargs: Any,
+    ) -> None:
+        super().__init__(redis, key_builder=key_builder, state_ttl=state_ttl, data_ttl=data_ttl, **kwargs)
+        self.prefetch = prefetch
+        # Bumped on every write, so data read before a write isn't prefetched after it
+        self._writes = 0
+
+    async def close(self) -> None:
+        # The Redis connection is shared with the rest of the bot and closed by its owner
+        pass
+
+    async def get_state_and_data(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_builder.build(key, "state"))
+            pipe.get(self.key_builder.build(key, "data"))
+            state, data = await pipe.execute()
+
+        if isinstance(state, bytes):
+            state = state.decode("utf-8")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        return state, self.json_loads(data) if data is not None else {}
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        if not self.prefetch:
+            return await super().get_state(key)
+
+        writes = self._writes
+        state, data = await self.get_state_and_data(key)
+        _prefetched.set((self, self.key_builder.build(key), data) if writes == self._writes else None)
+        return state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        prefetched = _prefetched.get()
+        if prefetched is not None and prefetched[0] is self and prefetched[1] == self.key_builder.build(key):
+            _prefetched.set(None)
+            return prefetched[2]
+        return await super().get_data(key)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        try:
+            await super().set_state(key, state)
+        finally:
+            self._drop()
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        try:
+            await super().set_data(key, data)
+        finally:
+            self._drop()
+
+    def _drop(self) -> None:
+        # After the write: also drops data prefetched while it was running
+        self._writes += 1
+        prefetched = _prefetched.get()
+        if prefetched is not None and prefetched[0] is self:
+            _prefetched.set(None)
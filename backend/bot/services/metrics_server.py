@@ -0,0 +1,27 @@
+import logging
+
+from aiohttp import web
+
+from infrastructure.metrics import CONTENT_TYPE, registry
+
+logger = logging.getLogger(__name__)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(body=registry.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Serve /metrics of the bot process for Prometheus.
+
+    :return: Runner to clean up on shutdown.
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Metrics are served on {host}:{port}/metrics")
+    return runner
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Union
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from utils.rate_limit import ChatPacer, TokenBucket
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+# Methods that post a new message to a chat; Telegram flood limits apply to them
+MESSAGE_METHOD_PREFIXES = ("send", "copyMessage", "forwardMessage")
+UNLIMITED_METHODS = {"sendChatAction"}
+
+# Called on every TelegramRetryAfter of the calls made in the context, e.g. to count broadcast retries
+retry_listener: ContextVar[Optional[Callable[[TelegramRetryAfter], None]]] = ContextVar(
+    "retry_listener", default=None
+)
+
+
+class _ChatHold:
+    __slots__ = ("refs", "held_until")
+
+    def __init__(self) -> None:
+        self.refs = 0
+        self.held_until = 0.0
+
+
+class RequestScheduler(BaseRequestMiddleware):
+    """
+    Bot session middleware that schedules every outgoing Bot API call.
+
+    Message sends pass the per-chat pacer, which lets `chat_burst` messages through at once
+    and paces the rest, and the global token bucket. Nothing is locked per chat: slots are
+    reserved in call order, and a handler awaits its own sends one after another anyway.
+    On TelegramRetryAfter the token bucket is drained for `retry_after` seconds, which pauses
+    all message sends of the bot, and calls to the affected chat are held for as long; after
+    that the original call is sent again, up to `max_retries` times.
+
+    The limits apply to one process: every bot replica has its own `rate`.
+    """
+
+    def __init__(
+            self,
+            rate: float = 30.0,
+            chat_interval: float = 1.0,
+            group_interval: float = 3.0,
+            chat_burst: int = 3,
+            max_retries: int = 3,
+            max_chats: int = 10000,
+    ) -> None:
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.bucket = TokenBucket(rate)
+        self.pacer = ChatPacer(interval=chat_interval, group_interval=group_interval, burst=chat_burst)
+        self.retries = 0
+        self._chats: Dict[Union[int, str], _ChatHold] = {}
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: "Bot",
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._send(make_request, bot, method, None)
+
+        hold = self._hold(chat_id)
+        hold.refs += 1
+        try:
+            return await self._send(make_request, bot, method, hold)
+        finally:
+            hold.refs -= 1
+            if not hold.refs and hold.held_until <= time.monotonic():
+                self._chats.pop(chat_id, None)
+
+    def _hold(self, chat_id: Union[int, str]) -> _ChatHold:
+        hold = self._chats.get(chat_id)
+        if hold is None:
+            if len(self._chats) >= self.max_chats:
+                # Holds that expired while no call was waiting for the chat
+                now = time.monotonic()
+                self._chats = {key: value for key, value in self._chats.items()
+                               if value.refs or value.held_until > now}
+            hold = self._chats[chat_id] = _ChatHold()
+        return hold
+
+    async def _send(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: "Bot",
+            method: TelegramMethod[TelegramType],
+            hold: _ChatHold | None,
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        limited = (
+                hold is not None
+                and api_method.startswith(MESSAGE_METHOD_PREFIXES)
+                and api_method not in UNLIMITED_METHODS
+        )
+
+        for attempt in range(self.max_retries + 1):
+            if hold is not None:
+                while (delay := hold.held_until - time.monotonic()) > 0:
+                    await asyncio.sleep(delay)
+            if limited:
+                await self.pacer.wait(method.chat_id)
+                await self.bucket.acquire()
+
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                listener = retry_listener.get()
+                if listener is not None:
+                    listener(e)
+                logger.warning(f"Flood limit on {api_method}, pausing sends and holding chat "
+                               f"{getattr(method, 'chat_id', None)} for {e.retry_after} sec.")
+                # Flood limits are bot-wide: the other sends would only collect more of them
+                self.bucket.drain(e.retry_after)
+                if hold is not None:
+                    hold.held_until = max(hold.held_until, time.monotonic() + e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
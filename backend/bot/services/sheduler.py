@@ -1,7 +1,201 @@
+import asyncio
+import logging
+import pickle
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Callable
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Set, Tuple
 
+from apscheduler.jobstores.base import ConflictingIdError
+from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.util import datetime_to_utc_timestamp
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class ScheduledJob:
+    funk: Callable[..., Any]
+    trigger: str = "date"
+    days_before: int = 0
+    hours_before: int = 0
+    minutes_before: int = 0
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    job_id: Optional[str] = None
+
+
+class BatchingRedisJobStore(RedisJobStore):
+    """
+    RedisJobStore that can buffer added jobs and write them with a single pipeline.
+
+    Jobs are persisted, so they survive restarts: `funk` must be a module-level function
+    and args/kwargs must be picklable.
+
+    The store uses the blocking Redis client of RedisJobStore, so open batches outside the event
+    loop (see `set_scheduled_jobs_bulk`). A batch buffers only the jobs added by the thread that
+    opened it, and batches of different threads run one after another.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._batch_lock = threading.Lock()
+        self._batch_thread: Optional[int] = None
+        self._batch = None
+        self._batch_ids: Set[str] = set()
+        self._looked_up_ids: Set[str] = set()
+        self._existing_ids: Set[str] = set()
+        # Positions of HSETNX results in the batch
+        self._batch_writes: List[Tuple[int, str]] = []
+
+    @contextmanager
+    def batch(self, job_ids: Iterable[str] = ()) -> Iterator[None]:
+        """
+        Buffer jobs added inside the block and write them in one round trip on exit.
+
+        Like `add_job` of RedisJobStore, adding a job whose id is already in the store raises
+        ConflictingIdError. Pass the ids of the jobs to be added as `job_ids` to look them up
+        with one request instead of one per job.
+        """
+        job_ids = [job_id for job_id in job_ids if job_id is not None]
+        with self._batch_lock:
+            self._looked_up_ids = set(job_ids)
+            if job_ids:
+                with self.redis.pipeline(transaction=False) as pipe:
+                    for job_id in job_ids:
+                        pipe.hexists(self.jobs_key, job_id)
+                    self._existing_ids = {job_id for job_id, exists in zip(job_ids, pipe.execute()) if exists}
+
+            self._batch = self.redis.pipeline(transaction=True)
+            self._batch_thread = threading.get_ident()
+            try:
+                yield
+                results = self._batch.execute()
+                for position, job_id in self._batch_writes:
+                    if not results[position]:
+                        # Added by another instance after the lookup
+                        logger.warning(f"Scheduler: job {job_id} already exists in the store, skipped")
+            finally:
+                self._batch.reset()
+                self._batch = None
+                self._batch_thread = None
+                self._batch_ids.clear()
+                self._looked_up_ids.clear()
+                self._existing_ids.clear()
+                self._batch_writes.clear()
+
+    def add_job(self, job):
+        if self._batch is None or self._batch_thread != threading.get_ident():
+            return super().add_job(job)
+
+        if job.id in self._batch_ids or job.id in self._existing_ids:
+            raise ConflictingIdError(job.id)
+        if job.id not in self._looked_up_ids and self.redis.hexists(self.jobs_key, job.id):
+            raise ConflictingIdError(job.id)
+
+        self._batch_ids.add(job.id)
+        self._batch_writes.append((len(self._batch), job.id))
+        self._batch.hsetnx(self.jobs_key, job.id, pickle.dumps(job.__getstate__(), self.pickle_protocol))
+        if job.next_run_time:
+            self._batch.zadd(self.run_times_key, {job.id: datetime_to_utc_timestamp(job.next_run_time)}, nx=True)
+
+
+class SchedulerLeader:
+    """
+    Leader lease that lets exactly one bot instance run scheduled jobs.
+
+    Every instance starts the scheduler paused, so it can still add jobs to the shared store.
+    The instance holding the lease in Redis resumes the scheduler; it pauses again as soon
+    as the lease can't be renewed. The leader rescans the store on every renewal (`ttl / 3`),
+    so jobs added by other instances run at most that late.
+    """
+
+    def __init__(
+            self,
+            scheduler: AsyncIOScheduler,
+            redis: Redis,
+            key: str = "apscheduler:leader",
+            ttl: int = 30,
+    ) -> None:
+        self.scheduler = scheduler
+        self.redis = redis
+        self.key = key
+        self.ttl = ttl
+        self.instance_id = uuid.uuid4().hex
+        self.is_leader = False
+        self._renew = redis.register_script(RENEW_LEASE_SCRIPT)
+        self._release = redis.register_script(RELEASE_LEASE_SCRIPT)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        if self.is_leader:
+            self._set_leader(False)
+            try:
+                await self._release(keys=[self.key], args=[self.instance_id])
+            except RedisError as e:
+                logger.warning(f"Scheduler: can't release leader lease: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self.is_leader:
+                    acquired = bool(await self._renew(keys=[self.key], args=[self.instance_id, self.ttl * 1000]))
+                else:
+                    acquired = bool(await self.redis.set(self.key, self.instance_id, nx=True, px=self.ttl * 1000))
+            except RedisError as e:
+                logger.warning(f"Scheduler: leader lease check failed: {e}")
+                acquired = False
+
+            self._set_leader(acquired)
+            if self.is_leader:
+                # Followers add jobs to the shared store with their scheduler paused, which doesn't
+                # wake the leader up; without this it would sleep until its own next run time,
+                # forever with an empty store
+                self.scheduler.wakeup()
+            await asyncio.sleep(self.ttl / 3)
+
+    def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+
+        self.is_leader = is_leader
+        if is_leader:
+            logger.info("Scheduler: this instance is the leader, running jobs")
+            self.scheduler.resume()
+        else:
+            logger.info("Scheduler: leadership lost, jobs are paused on this instance")
+            self.scheduler.pause()
 
 
 async def set_scheduled_jobs(
@@ -17,6 +211,9 @@ async def set_scheduled_jobs(
     """
     Schedules jobs to be run on the APScheduler based on specified parameters.
 
+    Jobs are persisted in the Redis job store, so `funk` must be a module-level function
+    and `args`/`kwargs` must be picklable.
+
     :param scheduler: The scheduler instance to which the jobs will be added.
     :param funk: The function to be scheduled.
     :param trigger: Type of trigger for the job ('cron', 'interval', etc.). Defaults to 'cron'.
@@ -37,3 +234,46 @@ async def set_scheduled_jobs(
         args=args,
         kwargs=kwargs,
     )
+
+
+async def set_scheduled_jobs_bulk(
+        scheduler: AsyncIOScheduler,
+        jobstore: BatchingRedisJobStore,
+        jobs: Iterable[ScheduledJob],
+        jobstore_alias: str = "default",
+) -> int:
+    """
+    Schedules many jobs with a single write to the job store. Jobs whose id is already
+    in the store are skipped. As in `set_scheduled_jobs`, functions and arguments must be picklable.
+    The job store talks to Redis synchronously, so the write runs in a worker thread.
+
+    :param scheduler: The scheduler instance to which the jobs will be added.
+    :param jobstore: The job store registered in the scheduler under `jobstore_alias`.
+    :param jobs: Jobs to schedule.
+    :param jobstore_alias: Alias of the job store in the scheduler.
+    :return: Count of scheduled jobs.
+    """
+    now = datetime.now()
+    jobs = list(jobs)
+
+    def add_jobs() -> int:
+        count = 0
+        with jobstore.batch(job.job_id for job in jobs):
+            for job in jobs:
+                try:
+                    scheduler.add_job(
+                        func=job.funk,
+                        trigger=job.trigger,
+                        run_date=now + timedelta(days=job.days_before, hours=job.hours_before, minutes=job.minutes_before),
+                        args=job.args,
+                        kwargs=job.kwargs,
+                        id=job.job_id,
+                        jobstore=jobstore_alias,
+                    )
+                except ConflictingIdError:
+                    logger.info(f"Scheduler: job {job.job_id} is already scheduled, skipped")
+                    continue
+                count += 1
+        return count
+
+    return await asyncio.to_thread(add_jobs)
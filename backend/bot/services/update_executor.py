@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.types import Update
+
+from infrastructure.database.instrumentation import query_scope
+from infrastructure.metrics import UPDATE_QUEUE_DEPTH, UPDATE_WAIT
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _UpdateJob:
+    key: Hashable
+    handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]]
+    event: Update
+    data: Dict[str, Any]
+    future: Optional[asyncio.Future] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class UpdateExecutorStats:
+    processed: int = 0
+    failed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def avg_wait(self) -> float:
+        if not self.processed:
+            return 0.0
+        return self.total_wait / self.processed
+
+
+class UpdateExecutor(BaseMiddleware):
+    """
+    Update execution layer around the Dispatcher.
+
+    Installed by `install` as the outer middleware of `dp.update` right before FSM resolution:
+    it takes the rest of the handling chain, FSM context included, and runs it on a pool of
+    `concurrency` workers, so the state of an update is read after earlier updates of its chat
+    have run. Updates of one chat run in order,
+    updates of different chats run in parallel. At most `queue_size` updates wait or run at
+    once; when the limit is reached, intake (polling loop or webhook requests) waits.
+
+    By default `__call__` returns None as soon as the update is queued, so the polling loop
+    can fetch the next updates: aiogram then logs the update as handled before it runs, and
+    handler errors surface only through the error router and the executor's log.
+    With `wait_for_result` (webhook mode) `__call__` waits until the update is processed and
+    returns the handler result, so the webhook in-flight limit covers the processing too.
+    """
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            concurrency: int = 64,
+            queue_size: int = 1000,
+            wait_for_result: bool = False,
+    ) -> None:
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.wait_for_result = wait_for_result
+        self.stats = UpdateExecutorStats()
+
+        # Errors have to reach the error router, but ErrorsMiddleware of the dispatcher
+        # only wraps the part of the chain that runs before this middleware
+        self._errors = ErrorsMiddleware(dispatcher)
+        self._queue: asyncio.Queue[_UpdateJob] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(queue_size)
+        self._chains: Dict[Hashable, Deque[_UpdateJob]] = {}
+        self._workers: List[asyncio.Task] = []
+        self._pending = 0
+        UPDATE_QUEUE_DEPTH.set_function(lambda: self._pending)
+
+    @property
+    def depth(self) -> int:
+        """Updates accepted and not finished yet."""
+        return self._pending
+
+    def install(self, dispatcher: Dispatcher) -> None:
+        """
+        Register the executor as an outer middleware of updates ahead of the FSM middleware
+        and everything registered after it.
+
+        :param dispatcher: Dispatcher to run the updates of.
+        """
+        manager = dispatcher.update.outer_middleware
+        tail = list(manager[manager.index(dispatcher.fsm):]) if dispatcher.fsm in manager else []
+        for middleware in tail:
+            manager.unregister(middleware)
+        manager.register(self)
+        for middleware in tail:
+            manager.register(middleware)
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self, timeout: float = 10.0) -> None:
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(f"Update executor: {self._pending} updates dropped on shutdown")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any],
+    ) -> Any:
+        await self._slots.acquire()
+        self._pending += 1
+        job = _UpdateJob(self._resolve_key(event, data), handler, event, data)
+        if self.wait_for_result:
+            job.future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(job)
+        if job.future is not None:
+            return await job.future
+
+    @staticmethod
+    def _resolve_key(event: Update, data: Dict[str, Any]) -> Hashable:
+        chat = data.get("event_chat")
+        if chat is not None:
+            return "chat", chat.id
+        user = data.get("event_from_user")
+        if user is not None:
+            return "user", user.id
+        # Nothing to keep order for
+        return "update", event.update_id
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                chain = self._chains.get(job.key)
+                if chain is not None:
+                    # Another worker runs this chat now, it will take the update in order
+                    chain.append(job)
+                    continue
+
+                key = job.key
+                chain = self._chains[key] = deque()
+                try:
+                    while True:
+                        await self._run(job)
+                        if not chain:
+                            break
+                        job = chain.popleft()
+                finally:
+                    del self._chains[key]
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: _UpdateJob) -> None:
+        wait = time.monotonic() - job.enqueued_at
+        self.stats.total_wait += wait
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        UPDATE_WAIT.observe(wait)
+        result = UNHANDLED
+        try:
+            # Handler middleware narrows the origin down to the handler once it is resolved
+            with query_scope(f"update:{job.event.event_type}"):
+                # A task of its own, so context variables set by the update don't reach
+                # the next updates of the worker
+                result = await asyncio.create_task(self._errors(job.handler, job.event, job.data))
+        except Exception:
+            self.stats.failed += 1
+            logger.exception(f"Update executor: update id={job.event.update_id} failed")
+        finally:
+            self.stats.processed += 1
+            self._pending -= 1
+            self._slots.release()
+            # The caller may have given up waiting
+            if job.future is not None and not job.future.done():
+                job.future.set_result(result)
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+import orjson
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from infrastructure.api_services.common.cache import RedisCache
+from infrastructure.database.models import User
+from infrastructure.database.repo.stats import StatsRepo
+from infrastructure.database.repo.users import UserRepo
+from infrastructure.metrics import USER_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("first_name", "last_name", "username", "language")
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+@dataclass
+class UserCacheStats:
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    changes: int = 0
+    flushes: int = 0
+    flushed_rows: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.local_hits + self.redis_hits + self.misses
+        if not total:
+            return 0.0
+        return (self.local_hits + self.redis_hits) / total
+
+
+class UserCache:
+    """
+    User snapshot cache for DatabaseMiddleware.
+
+    Snapshots live in an in-process LRU in front of Redis. Only a full miss goes to Postgres.
+    When first_name, last_name, username or language differ from the snapshot, the snapshot
+    is updated right away and the upsert is queued; queued upserts are coalesced per user
+    and written in batches by a background task.
+    """
+
+    def __init__(
+            self,
+            sessionmaker: async_sessionmaker,
+            redis: Redis,
+            max_size: int = 10000,
+            ttl: int = 3600,
+            flush_interval: float = 5.0,
+            flush_batch_size: int = 500,
+            key_prefix: str = "user_cache",
+            user_stats: Optional[StatsRepo] = None,
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.redis = redis
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.key_prefix = key_prefix
+        self.user_stats = user_stats
+        self.stats = UserCacheStats()
+
+        self._local: OrderedDict[int, tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def get_user(
+            self,
+            user_id: Union[int, str],
+            first_name: str,
+            last_name: Optional[str],
+            language: str,
+            username: Optional[str] = None,
+    ) -> User:
+        """
+        Return the user snapshot, creating the user in the database on a full miss.
+
+        :param user_id: Telegram user id.
+        :param first_name: First name from the incoming update.
+        :param last_name: Last name from the incoming update.
+        :param language: Language code from the incoming update.
+        :param username: Username from the incoming update.
+        :return: Detached User instance built from the snapshot.
+        """
+        user_id = int(user_id)
+        profile = dict(first_name=first_name, last_name=last_name, username=username, language=language)
+
+        snapshot = self._get_local(user_id)
+        if snapshot is not None:
+            self.stats.local_hits += 1
+            USER_CACHE_REQUESTS.labels("local_hit").inc()
+        else:
+            snapshot = await self._get_redis(user_id)
+            if snapshot is not None:
+                self.stats.redis_hits += 1
+                USER_CACHE_REQUESTS.labels("redis_hit").inc()
+                self._set_local(user_id, snapshot)
+
+        if snapshot is None:
+            self.stats.misses += 1
+            USER_CACHE_REQUESTS.labels("miss").inc()
+            user, created = await self._repo().upsert(user_id=user_id, **profile)
+            if created and self.user_stats is not None:
+                await self.user_stats.record_new_user(user.language)
+            snapshot = {column: getattr(user, column) for column in User.__table__.columns.keys()}
+            await self._store(user_id, snapshot)
+            return User(**snapshot)
+
+        if any(snapshot[name] != value for name, value in profile.items()):
+            self.stats.changes += 1
+            if self.user_stats is not None:
+                await self.user_stats.record_language_change(snapshot["language"], language)
+            snapshot = {**snapshot, **profile}
+            await self._store(user_id, snapshot)
+            self._pending[user_id] = dict(id=user_id, **profile)
+            if len(self._pending) >= self.flush_batch_size:
+                self._wakeup.set()
+
+        return User(**snapshot)
+
+    async def invalidate(self, user_id: Union[int, str]) -> None:
+        user_id = int(user_id)
+        self._local.pop(user_id, None)
+        try:
+            await self.redis.delete(self._key(user_id))
+        except RedisError as e:
+            logger.warning(f"User cache: can't invalidate {user_id} in Redis: {e}")
+
+    async def flush(self) -> int:
+        """
+        Write all queued profile changes to the database.
+
+        :return: Count of flushed rows.
+        """
+        if not self._pending:
+            return 0
+
+        rows = list(self._pending.values())
+        self._pending.clear()
+        try:
+            await self._repo().update_profiles(rows, batch_size=self.flush_batch_size)
+        except Exception as e:
+            logger.error(f"User cache: flush of {len(rows)} rows failed: {e}")
+            for row in rows:
+                # Newer changes queued during the flush win over the failed ones
+                self._pending.setdefault(row["id"], row)
+            return 0
+
+        self.stats.flushes += 1
+        self.stats.flushed_rows += len(rows)
+        logger.debug(f"User cache: flushed {len(rows)} rows, hit rate {self.stats.hit_rate:.2%}")
+        return len(rows)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def _repo(self) -> UserRepo:
+        # With the cache, writes invalidate users cached by `UserRepo.get`
+        return UserRepo(self.sessionmaker, cache=RedisCache(self.redis))
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.key_prefix}:{user_id}"
+
+    def _get_local(self, user_id: int) -> Optional[Dict[str, Any]]:
+        item = self._local.get(user_id)
+        if item is None:
+            return None
+
+        expires_at, snapshot = item
+        if expires_at < time.monotonic():
+            del self._local[user_id]
+            return None
+
+        self._local.move_to_end(user_id)
+        return snapshot
+
+    def _set_local(self, user_id: int, snapshot: Dict[str, Any]) -> None:
+        self._local[user_id] = (time.monotonic() + self.ttl, snapshot)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.max_size:
+            self._local.popitem(last=False)
+
+    async def _get_redis(self, user_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            value = await self.redis.get(self._key(user_id))
+        except RedisError as e:
+            logger.warning(f"User cache: Redis is unavailable: {e}")
+            return None
+
+        if value is None:
+            return None
+
+        snapshot = orjson.loads(value)
+        for name in DATETIME_FIELDS:
+            if snapshot.get(name):
+                snapshot[name] = datetime.fromisoformat(snapshot[name])
+        return snapshot
+
+    async def _store(self, user_id: int, snapshot: Dict[str, Any]) -> None:
+        self._set_local(user_id, snapshot)
+        try:
+            await self.redis.set(self._key(user_id), orjson.dumps(snapshot), ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"User cache: can't store {user_id} in Redis: {e}")
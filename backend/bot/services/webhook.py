@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Any, Dict
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from settings.bot_settings import BotSettings
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook request handler with a bound on updates processed at once.
+
+    Updates are handled in background. When all slots stay busy for `acquire_timeout` seconds
+    the request is answered with 429, so Telegram delivers the update again later
+    instead of the process piling up tasks.
+    """
+
+    def __init__(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            max_in_flight: int = 100,
+            acquire_timeout: float = 5.0,
+            secret_token: str | None = None,
+            **data: Any,
+    ) -> None:
+        super().__init__(
+            dispatcher=dispatcher,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=secret_token,
+            **data,
+        )
+        self.acquire_timeout = acquire_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        bot = await self.resolve_bot(request)
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), bot):
+            return web.Response(body="Unauthorized", status=401)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook: too many updates in flight, asking Telegram to retry")
+            return web.Response(body="Too Many Requests", status=429)
+
+        try:
+            return await self._handle_request_background(bot=bot, request=request)
+        except Exception:
+            self._slots.release()
+            raise
+
+    __call__ = handle
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        try:
+            await super()._background_feed_update(bot=bot, update=update)
+        finally:
+            self._slots.release()
+
+
+def check_webhook_settings(settings: BotSettings) -> None:
+    """
+    :raises RuntimeError: BOT__WEBHOOK_SECRET is not set.
+    """
+    if not settings.webhook_secret:
+        # Without it anyone who can reach the port can post forged updates
+        raise RuntimeError("Webhook mode requires BOT__WEBHOOK_SECRET")
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, settings: BotSettings, **data: Any) -> None:
+    """
+    Serve updates over a webhook until the process is stopped.
+
+    Requests without the X-Telegram-Bot-Api-Secret-Token header matching `settings.webhook_secret`
+    are rejected. When `settings.webhook_url` is set the webhook is registered with that secret,
+    otherwise it has to be registered with the same secret beforehand.
+
+    :param dp: The dispatcher instance.
+    :param bot: The bot instance.
+    :param settings: Bot settings with the webhook configuration.
+    :param data: Additional data passed to handlers.
+    :raises RuntimeError: BOT__WEBHOOK_SECRET is not set.
+    """
+    check_webhook_settings(settings)
+
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dp,
+        bot,
+        max_in_flight=settings.webhook_max_in_flight,
+        secret_token=settings.webhook_secret,
+        **data,
+    )
+    handler.register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot, **data)
+
+    if settings.webhook_url:
+        await bot.set_webhook(
+            url=f"{settings.webhook_url.rstrip('/')}{settings.webhook_path}",
+            secret_token=settings.webhook_secret,
+            max_connections=settings.webhook_max_connections,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port)
+    await site.start()
+    logger.info(f"Webhook is listening on {settings.webhook_host}:{settings.webhook_port}{settings.webhook_path}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -1,7 +1,9 @@
 import logging
 
 from aiogram.exceptions import TelegramAPIError
-from aiogram.types import Message, FSInputFile
+from aiogram.types import Message
+
+from utils.file_cache import answer_photo
 
 
 async def edit_message(message: Message, text: str, reply_markup=None, photo_path: str = None):
@@ -9,7 +11,7 @@ async def edit_message(message: Message, text: str, reply_markup=None, photo_pat
         if not photo_path:
             msg = await message.edit_text(text, reply_markup=reply_markup, disable_web_page_preview=True)
         else:
-            msg = await message.answer_photo(photo=FSInputFile(photo_path), caption=text, reply_markup=reply_markup)
+            msg = await answer_photo(message, photo_path, caption=text, reply_markup=reply_markup)
             await message.delete()
         return msg
 
@@ -17,7 +19,7 @@ async def edit_message(message: Message, text: str, reply_markup=None, photo_pat
         if not photo_path:
             msg = await message.answer(text, reply_markup=reply_markup, disable_web_page_preview=True)
         else:
-            msg = await message.answer_photo(photo=FSInputFile(photo_path), caption=text, reply_markup=reply_markup)
+            msg = await answer_photo(message, photo_path, caption=text, reply_markup=reply_markup)
         return msg
 
     except Exception as e:
@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class FileIdCache:
+    """
+    Cache of Telegram file_id values of local files.
+
+    Keys are built from the file path and a hash of its content, so an edited file is
+    uploaded again. Ids live in Redis, shared by all bot instances, with an in-process mirror.
+    Content hashes are kept per (mtime, size) to avoid reading the file on every send.
+    """
+
+    def __init__(self, redis: Redis, key_prefix: str = "file_id", ttl: int = 30 * 86400) -> None:
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self._ids: Dict[str, str] = {}
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+
+    async def answer_photo(self, message: Message, photo_path: str, **kwargs) -> Message:
+        """
+        Answer with a photo, uploading the file only when no valid file_id is cached.
+
+        :param message: Message to answer.
+        :param photo_path: Path of the local image.
+        :param kwargs: Other arguments of `Message.answer_photo`.
+        :return: Sent message.
+        """
+        key = await self._key(photo_path)
+        file_id = await self.get(key)
+        if file_id is not None:
+            try:
+                return await message.answer_photo(photo=file_id, **kwargs)
+            except TelegramBadRequest as e:
+                logger.warning(f"File cache: file_id of {photo_path} rejected, uploading again: {e}")
+                await self.forget(key)
+
+        msg = await message.answer_photo(photo=FSInputFile(photo_path), **kwargs)
+        if msg.photo:
+            await self.set(key, msg.photo[-1].file_id)
+        return msg
+
+    async def get(self, key: str) -> Optional[str]:
+        file_id = self._ids.get(key)
+        if file_id is not None:
+            return file_id
+
+        try:
+            value = await self.redis.get(key)
+        except RedisError as e:
+            logger.warning(f"File cache: Redis is unavailable: {e}")
+            return None
+
+        if value is None:
+            return None
+        file_id = value.decode() if isinstance(value, bytes) else value
+        self._ids[key] = file_id
+        return file_id
+
+    async def set(self, key: str, file_id: str) -> None:
+        self._ids[key] = file_id
+        try:
+            await self.redis.set(key, file_id, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"File cache: can't store {key} in Redis: {e}")
+
+    async def forget(self, key: str) -> None:
+        self._ids.pop(key, None)
+        try:
+            await self.redis.delete(key)
+        except RedisError as e:
+            logger.warning(f"File cache: can't delete {key} in Redis: {e}")
+
+    async def _key(self, path: str) -> str:
+        return f"{self.key_prefix}:{path}:{await self._digest(path)}"
+
+    async def _digest(self, path: str) -> str:
+        stat = os.stat(path)
+        cached = self._digests.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+
+        digest = await asyncio.to_thread(_hash_file, path)
+        self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+file_cache: Optional[FileIdCache] = None
+
+
+def init_file_cache(redis: Redis, **kwargs) -> FileIdCache:
+    """Create the cache used by `edit_message`; call once on startup."""
+    global file_cache
+    file_cache = FileIdCache(redis, **kwargs)
+    return file_cache
+
+
+async def answer_photo(message: Message, photo_path: str, **kwargs) -> Message:
+    """Answer with a photo through the file_id cache, or upload it when the cache isn't initialised."""
+    if file_cache is None:
+        return await message.answer_photo(photo=FSInputFile(photo_path), **kwargs)
+    return await file_cache.answer_photo(message, photo_path, **kwargs)
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Dict, Optional, Union
+
+
+def is_group_chat(chat_id: Union[int, str]) -> bool:
+    """Groups, supergroups and channels have negative ids or are addressed by @username."""
+    if isinstance(chat_id, int):
+        return chat_id < 0
+    return chat_id.startswith(("-", "@"))
+
+
+class TokenBucket:
+    """
+    Token bucket shared by concurrent coroutines.
+
+    Waiters are served in FIFO order: the lock is held while the bucket refills.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket so that nothing is acquired for at least `seconds`."""
+        self._refill()
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class ChatPacer:
+    """
+    Keeps a minimal average interval between sends to the same chat.
+
+    Telegram allows about 1 message per second to a private chat and 20 messages per minute to a group,
+    and tolerates short bursts: up to `burst` messages go out at once, the following ones are paced.
+    """
+
+    def __init__(
+            self,
+            interval: float = 1.0,
+            group_interval: float = 3.0,
+            burst: int = 1,
+            max_size: int = 100000,
+    ) -> None:
+        self.interval = interval
+        self.group_interval = group_interval
+        self.burst = burst
+        self.max_size = max_size
+        self._next_at: Dict[Union[int, str], float] = {}
+
+    def reserve(self, chat_id: Union[int, str]) -> float:
+        """
+        Reserve the next send slot for the chat.
+
+        :return: Delay in seconds until the reserved slot.
+        """
+        now = time.monotonic()
+        if len(self._next_at) >= self.max_size:
+            self._next_at = {key: at for key, at in self._next_at.items() if at > now}
+
+        interval = self.group_interval if is_group_chat(chat_id) else self.interval
+        next_at = self._next_at.get(chat_id, 0.0)
+        # Slots are reserved in call order, the first `burst` of them may fall before `next_at`
+        at = max(now, next_at - (self.burst - 1) * interval)
+        self._next_at[chat_id] = max(now, next_at) + interval
+        return at - now
+
+    async def wait(self, chat_id: Union[int, str]) -> None:
+        delay = self.reserve(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
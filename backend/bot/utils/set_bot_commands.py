@@ -19,6 +19,9 @@ async def set_admin_commands(bot: Bot, admin_ids: list[int]):
             await bot.set_my_commands(
                 [
                     BotCommand(command="start", description=_("Start the bot")),
+                    BotCommand(command="admin", description=_("Admin panel")),
+                    BotCommand(command="broadcast", description=_("Start a broadcast")),
+                    BotCommand(command="broadcast_status", description=_("Broadcast progress")),
                 ], scope=BotCommandScopeChat(chat_id=admin_id)
             )
         except exceptions.TelegramBadRequest:
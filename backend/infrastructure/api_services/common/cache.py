@@ -1,7 +1,24 @@
+import asyncio
+import logging
+import time
+import uuid
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import orjson
 from redis.asyncio import Redis as AsyncRedisClient
+from redis.exceptions import RedisError
+
+from infrastructure.metrics import TIERED_CACHE_REQUESTS
+
+try:
+    import msgpack
+except ImportError:  # optional, only needed by MsgpackSerializer
+    msgpack = None
+
+logger = logging.getLogger(__name__)
 
 
 class AbstractCache(ABC):
@@ -15,11 +32,21 @@ class AbstractCache(ABC):
         """Get data from cache by the key."""
         raise NotImplementedError
 
+    @abstractmethod
+    async def get_many(self, *keys: str) -> List[Any]:
+        """Get data from cache by several keys, None for missing ones."""
+        raise NotImplementedError
+
     @abstractmethod
     async def set(self, key: str, data: Any, timeout_secs: int | None = None) -> bool:
         """Save data (key: value) in cache with the given key and timeout."""
         raise NotImplementedError
 
+    @abstractmethod
+    async def incr(self, key: str, timeout_secs: int | None = None) -> int:
+        """Increment the integer under the key and (re)set its timeout."""
+        raise NotImplementedError
+
     @abstractmethod
     async def delete(self, *keys) -> int:
         """Delete keys from cache."""
@@ -41,6 +68,9 @@ class RedisCache(AbstractCache):
     ) -> Any | None:
         return await self.client.get(key)
 
+    async def get_many(self, *keys: str) -> List[Any]:
+        return await self.client.mget(keys)
+
     async def set(self, key: str, data: Any, timeout_secs: int | None = None) -> bool:
         return bool(
             await self.client.set(
@@ -50,5 +80,253 @@ class RedisCache(AbstractCache):
             )
         )
 
+    async def incr(self, key: str, timeout_secs: int | None = None) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            if timeout_secs is not None:
+                pipe.expire(key, timeout_secs)
+            value, *_ = await pipe.execute()
+        return value
+
     async def delete(self, *keys) -> int:
         return await self.client.delete(*keys)
+
+
+class Serializer(ABC):
+    @abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class OrjsonSerializer(Serializer):
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """More compact than JSON and keeps bytes values; requires the `msgpack` package."""
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise RuntimeError("MsgpackSerializer requires msgpack: pip install msgpack")
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class TieredCache(AbstractCache):
+    """
+    In-process LRU in front of Redis.
+
+    Local entries live for at most `local_ttl` seconds (and not longer than in Redis),
+    `max_items` most recently used ones are kept. Every write publishes the written keys
+    to `<prefix>:invalidate`, so other processes drop their local copies; after a
+    reconnect of the subscription the whole local tier is dropped, as messages may be lost.
+    Call `start()` to subscribe and `close()` on shutdown.
+
+    Values are serialized with `serializer` and compressed with zlib above `compress_min_size`
+    bytes, behind a header telling how. Bytes values are stored as they are, and values
+    without the header, i.e. written by other clients (e.g. counters of `incr`), are returned
+    raw, so it can replace `RedisCache` as is.
+    Values from the local tier are shared objects and must not be mutated.
+    """
+
+    # Starts every stored value: 0xFF never occurs in UTF-8, so no text value written by
+    # another client (counters, JSON) starts with it, and NUL rules out most binary formats
+    _MAGIC = b"\xff\x00tc"
+    _SERIALIZED = _MAGIC + b"s"
+    _SERIALIZED_COMPRESSED = _MAGIC + b"S"
+    _RAW = _MAGIC + b"r"
+    _RAW_COMPRESSED = _MAGIC + b"R"
+
+    def __init__(
+            self,
+            redis_client: AsyncRedisClient,
+            serializer: Optional[Serializer] = None,
+            max_items: int = 10000,
+            local_ttl: float = 5.0,
+            compress_min_size: int = 1024,
+            prefix: str = "tiered_cache",
+    ) -> None:
+        self.client = redis_client
+        self.serializer = serializer or OrjsonSerializer()
+        self.max_items = max_items
+        self.local_ttl = local_ttl
+        self.compress_min_size = compress_min_size
+        self.channel = f"{prefix}:invalidate"
+        self._local: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        # Bumped on every local invalidation, so a value fetched before it isn't stored after it
+        self._generation = 0
+        self._instance_id = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._clear_local()
+
+    async def exist(self, *keys) -> int:
+        return await self.client.exists(*keys)
+
+    async def get(self, key: str) -> Any | None:
+        return (await self.get_many(key))[0]
+
+    async def get_many(self, *keys: str) -> List[Any]:
+        values: List[Any] = [None] * len(keys)
+        missing: List[int] = []
+        for i, key in enumerate(keys):
+            found, value = self._local_get(key)
+            if found:
+                values[i] = value
+            else:
+                missing.append(i)
+        if len(missing) < len(keys):
+            TIERED_CACHE_REQUESTS.labels("local", "hit").inc(len(keys) - len(missing))
+        if not missing:
+            return values
+
+        generation = self._generation
+        raw_values = await self.client.mget([keys[i] for i in missing])
+        # An invalidation during the fetch may be about a value older than the one fetched
+        cacheable = generation == self._generation
+        for i, raw in zip(missing, raw_values):
+            if raw is None:
+                TIERED_CACHE_REQUESTS.labels("redis", "miss").inc()
+                continue
+            TIERED_CACHE_REQUESTS.labels("redis", "hit").inc()
+            values[i] = self._decode(raw)
+            if cacheable:
+                # Redis TTL is unknown here, local_ttl bounds the staleness
+                self._local_set(keys[i], values[i], self.local_ttl)
+        return values
+
+    async def set(self, key: str, data: Any, timeout_secs: int | None = None) -> bool:
+        return await self.set_many({key: data}, timeout_secs)
+
+    async def set_many(self, mapping: Dict[str, Any], timeout_secs: int | None = None) -> bool:
+        """Save several values with one round trip."""
+        encoded = {key: self._encode(data) for key, data in mapping.items()}
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, raw in encoded.items():
+                pipe.set(name=key, value=raw, ex=timeout_secs)
+            results = await pipe.execute()
+        self._invalidate_local(mapping.keys())
+
+        local_ttl = self.local_ttl if timeout_secs is None else min(self.local_ttl, timeout_secs)
+        for key, raw in encoded.items():
+            # What other processes read, not the caller's object, which it may still mutate
+            self._local_set(key, self._decode(raw), local_ttl)
+        await self._publish(mapping.keys())
+        return all(results)
+
+    async def incr(self, key: str, timeout_secs: int | None = None) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            if timeout_secs is not None:
+                pipe.expire(key, timeout_secs)
+            value, *_ = await pipe.execute()
+        self._invalidate_local([key])
+        await self._publish([key])
+        return value
+
+    async def delete(self, *keys) -> int:
+        deleted = await self.client.delete(*keys)
+        self._invalidate_local(keys)
+        await self._publish(keys)
+        return deleted
+
+    def _local_get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._local.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._local[key]
+            return False, None
+        self._local.move_to_end(key)
+        return True, value
+
+    def _invalidate_local(self, keys: Iterable[str]) -> None:
+        self._generation += 1
+        for key in keys:
+            self._local.pop(key, None)
+
+    def _clear_local(self) -> None:
+        self._generation += 1
+        self._local.clear()
+
+    def _local_set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._local[key] = (time.monotonic() + ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+
+    def _encode(self, data: Any) -> bytes:
+        if isinstance(data, bytes):
+            payload, header, compressed_header = data, self._RAW, self._RAW_COMPRESSED
+        else:
+            payload = self.serializer.dumps(data)
+            header, compressed_header = self._SERIALIZED, self._SERIALIZED_COMPRESSED
+        if len(payload) >= self.compress_min_size:
+            return compressed_header + zlib.compress(payload)
+        return header + payload
+
+    def _decode(self, raw: bytes) -> Any:
+        if not raw.startswith(self._MAGIC):
+            return raw
+        header, payload = raw[:len(self._RAW)], raw[len(self._RAW):]
+        if header == self._SERIALIZED:
+            return self.serializer.loads(payload)
+        if header == self._SERIALIZED_COMPRESSED:
+            return self.serializer.loads(zlib.decompress(payload))
+        if header == self._RAW:
+            return payload
+        if header == self._RAW_COMPRESSED:
+            return zlib.decompress(payload)
+        return raw
+
+    async def _publish(self, keys: Iterable[str]) -> None:
+        try:
+            await self.client.publish(self.channel, orjson.dumps([self._instance_id, list(keys)]))
+        except RedisError as e:
+            logger.warning(f"Tiered cache: can't publish invalidation, other processes may serve "
+                           f"stale values for {self.local_ttl} sec.: {e}")
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Invalidations published before the subscription are lost
+                self._clear_local()
+                async for message in pubsub.listen():
+                    instance_id, keys = orjson.loads(message["data"])
+                    if instance_id == self._instance_id:
+                        continue
+                    self._invalidate_local(keys)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Tiered cache: invalidation subscription failed, resubscribing: {e}")
+                self._clear_local()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi_cache.backends.redis import RedisBackend
+from redis.asyncio.client import Redis
+
+from infrastructure.api_services.common.locks import RedisLock
+from infrastructure.metrics import API_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Recompute locks taken by the current request with the time they were taken,
+# see `StampedeProtectedBackend.recompute_scope`
+_recomputing: ContextVar[Optional[Dict[str, Tuple[RedisLock, float]]]] = ContextVar("recomputing", default=None)
+
+
+class StampedeProtectedBackend(RedisBackend):
+    """
+    fastapi-cache backend that keeps a popular key from being recomputed by every request at once.
+
+    Entries are hashes of the value, its logical expiry and the time its last recompute took,
+    and are kept `stale_ttl` seconds past the expiry. A reader refreshes the key early with a
+    probability growing towards the expiry and with the recompute time (XFetch, `beta` scales
+    the eagerness). Only the reader holding the Redis recompute lock gets a miss, which makes
+    the `cache` decorator recompute and `set` the value; others keep serving the previous value,
+    or, when there is none, wait up to `lock_wait` seconds for it.
+
+    The lock is released by `set` of the request that took it; a `set` of another request, e.g.
+    one that gave up waiting, leaves it alone. Requests must run inside `recompute_scope`,
+    which releases the locks of the request when the endpoint failed and `set` was never called.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            beta: float = 1.0,
+            stale_ttl: int = 300,
+            lock_timeout: float = 30.0,
+            lock_wait: float = 5.0,
+    ) -> None:
+        super().__init__(redis)
+        self.beta = beta
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        entry = await self._read(key)
+        if entry is None:
+            if await self._lock(key):
+                API_CACHE_REQUESTS.labels("miss").inc()
+                return 0, None
+            return await self._wait(key)
+
+        value, expires_at, delta = entry
+        now = time.time()
+        # XFetch: -log(u) is exponentially distributed, so refreshes spread out before the expiry
+        if now - delta * self.beta * math.log(1.0 - random.random()) < expires_at:
+            API_CACHE_REQUESTS.labels("hit").inc()
+            return self._ttl(expires_at, now), value
+
+        if await self._lock(key):
+            API_CACHE_REQUESTS.labels("early_refresh" if now < expires_at else "expired").inc()
+            return 0, None
+
+        # Another worker is recomputing it
+        API_CACHE_REQUESTS.labels("stale").inc()
+        return self._ttl(expires_at, now), value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.hget(key, "value")
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        locks = _recomputing.get()
+        held = locks.pop(key, None) if locks is not None else None
+        delta = time.monotonic() - held[1] if held is not None else 0.0
+        expires_at = time.time() + expire if expire else math.inf
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                # The key may hold a plain value stored by RedisBackend
+                pipe.delete(key)
+                pipe.hset(key, mapping={"value": value, "expires_at": repr(expires_at), "delta": repr(delta)})
+                if expire:
+                    pipe.expire(key, expire + self.stale_ttl)
+                await pipe.execute()
+        finally:
+            if held is not None:
+                await held[0].release()
+
+    @asynccontextmanager
+    async def recompute_scope(self) -> AsyncIterator[None]:
+        """Release the recompute locks taken inside the block whose value was not set."""
+        locks: Dict[str, Tuple[RedisLock, float]] = {}
+        token = _recomputing.set(locks)
+        try:
+            yield
+        finally:
+            _recomputing.reset(token)
+            for key, (lock, _) in locks.items():
+                logger.warning(f"Cache key {key} was not recomputed, releasing the lock")
+                await lock.release()
+
+    async def _read(self, key: str) -> Optional[Tuple[bytes, float, float]]:
+        value, expires_at, delta = await self.redis.hmget(key, ["value", "expires_at", "delta"])
+        if value is None:
+            return None
+        return value, float(expires_at), float(delta)
+
+    async def _lock(self, key: str) -> bool:
+        lock = RedisLock(self.redis, f"{key}:lock", self.lock_timeout)
+        if not await lock.acquire():
+            return False
+
+        locks = _recomputing.get()
+        if locks is None:
+            # Outside of a scope: `set` is awaited by the same task, so it still sees the lock
+            locks = {}
+            _recomputing.set(locks)
+        locks[key] = lock, time.monotonic()
+        return True
+
+    async def _wait(self, key: str) -> Tuple[int, Optional[bytes]]:
+        API_CACHE_REQUESTS.labels("lock_wait").inc()
+        deadline = time.monotonic() + self.lock_wait
+        delay = 0.05
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            entry = await self._read(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                return self._ttl(expires_at, time.time()), value
+
+        API_CACHE_REQUESTS.labels("lock_timeout").inc()
+        logger.warning(f"Cache key {key} is still being recomputed after {self.lock_wait} sec., recomputing")
+        return 0, None
+
+    @staticmethod
+    def _ttl(expires_at: float, now: float) -> int:
+        # Used as Cache-Control max-age: an entry without expiry isn't cached by clients
+        if math.isinf(expires_at):
+            return 0
+        return max(0, int(expires_at - now))
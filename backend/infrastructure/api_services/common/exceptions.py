@@ -100,6 +100,17 @@ class ElasticsearchRepositoryError(AppBaseError):
     pass
 
 
+class RequestQueueFull(AppBaseError):
+    pass
+
+
+class CircuitOpenError(AppBaseError):
+    def __init__(self, host: str, retry_after: float) -> None:
+        super().__init__(f"Circuit of {host} is open, retry in {retry_after:.1f} sec.")
+        self.host = host
+        self.retry_after = retry_after
+
+
 class AuthIsUnavailableError(HTTPException):
     def __init__(self) -> None:
         super().__init__(
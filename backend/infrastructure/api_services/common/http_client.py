@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from infrastructure.api_services.common.exceptions import CircuitOpenError
+from infrastructure.metrics import (
+    HTTP_CLIENT_CIRCUIT_STATE,
+    HTTP_CLIENT_LATENCY,
+    HTTP_CLIENT_REJECTED,
+    HTTP_CLIENT_RETRIES,
+)
+from settings import settings
+from settings.http_settings import HttpClientSettings
+
+logger = logging.getLogger(__name__)
+
+# Requests that can be repeated without changing the result
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class CircuitBreaker:
+    """
+    Closed: requests pass, consecutive failures are counted.
+    Open: after `failure_threshold` failures requests fail with CircuitOpenError for `reset_timeout` sec.
+    Half-open: then a single trial request passes; success closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        HTTP_CLIENT_CIRCUIT_STATE.set_function(lambda: self._STATE_VALUES[self.state], host)
+
+    def before_request(self) -> None:
+        """
+        :raises CircuitOpenError: The circuit is open, or the trial request is already running.
+        """
+        if self.state == self.OPEN:
+            retry_after = self.opened_at + self.reset_timeout - time.monotonic()
+            if retry_after > 0:
+                HTTP_CLIENT_REJECTED.labels(self.host).inc()
+                raise CircuitOpenError(self.host, retry_after)
+            self.state = self.HALF_OPEN
+            self._trial = False
+
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                HTTP_CLIENT_REJECTED.labels(self.host).inc()
+                raise CircuitOpenError(self.host, 0.0)
+            self._trial = True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit of {self.host} is closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit of {self.host} is open for {self.reset_timeout} sec. "
+                               f"after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+    def release(self) -> None:
+        """The request ended without a result (e.g. was cancelled): let another trial through."""
+        self._trial = False
+
+
+class HttpClientPool:
+    """
+    One `httpx.AsyncClient` per upstream, so connections are kept alive and reused
+    instead of a TCP/TLS handshake per request, each with its own circuit breaker.
+
+    Idempotent requests are retried on transport errors and 502/503/504 with jittered
+    exponential backoff; other requests only when the connection was never established.
+    """
+
+    def __init__(self, config: HttpClientSettings) -> None:
+        self.config = config
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        client = self._clients.get(base_url)
+        if client is None or client.is_closed:
+            client = self._clients[base_url] = httpx.AsyncClient(
+                base_url=base_url,
+                limits=httpx.Limits(
+                    max_connections=self.config.max_connections,
+                    max_keepalive_connections=self.config.max_keepalive_connections,
+                    keepalive_expiry=self.config.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.config.timeout, connect=self.config.connect_timeout),
+            )
+        return client
+
+    def breaker(self, base_url: str) -> CircuitBreaker:
+        breaker = self._breakers.get(base_url)
+        if breaker is None:
+            breaker = self._breakers[base_url] = CircuitBreaker(
+                base_url,
+                failure_threshold=self.config.breaker_failure_threshold,
+                reset_timeout=self.config.breaker_reset_timeout,
+            )
+        return breaker
+
+    async def request(
+            self,
+            method: str,
+            base_url: str,
+            route: str,
+            retries: Optional[int] = None,
+            timeout: Optional[float] = None,
+            **kwargs: Any,
+    ) -> httpx.Response:
+        """
+        :param method: HTTP method.
+        :param base_url: Upstream, e.g. `http://host:port`.
+        :param route: Path relative to `base_url`.
+        :param retries: Retries instead of the configured number.
+        :param timeout: Timeout instead of the configured one.
+        :param kwargs: Other arguments of `httpx.AsyncClient.request`.
+        :return: Response of the last attempt; the status is not checked.
+        :raises CircuitOpenError: The upstream is considered down.
+        :raises httpx.TransportError: The last attempt failed.
+        """
+        method = method.upper()
+        client = self.client(base_url)
+        breaker = self.breaker(base_url)
+        retries = self.config.retries if retries is None else retries
+        request_timeout = httpx.USE_CLIENT_DEFAULT if timeout is None else timeout
+
+        attempt = 0
+        while True:
+            breaker.before_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, route, timeout=request_timeout, **kwargs)
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                HTTP_CLIENT_LATENCY.labels(base_url, method, "error").observe(time.perf_counter() - start)
+                if attempt >= retries or not self._retryable(method, e):
+                    raise
+                logger.warning(f"{method} {base_url}/{route.lstrip('/')} failed: {e!r}, retrying")
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                HTTP_CLIENT_LATENCY.labels(base_url, method, response.status_code).observe(time.perf_counter() - start)
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if (response.status_code not in RETRY_STATUSES or attempt >= retries
+                        or method not in IDEMPOTENT_METHODS):
+                    return response
+                logger.warning(f"{method} {base_url}/{route.lstrip('/')} returned {response.status_code}, retrying")
+
+            attempt += 1
+            HTTP_CLIENT_RETRIES.labels(base_url).inc()
+            await asyncio.sleep(self._backoff(attempt))
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+
+    @staticmethod
+    def _retryable(method: str, error: httpx.TransportError) -> bool:
+        # The request was never sent, so even a POST can't have been applied
+        return method in IDEMPOTENT_METHODS or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout,
+                                                                  httpx.PoolTimeout))
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.config.retry_backoff_max, self.config.retry_backoff * 2 ** (attempt - 1)))
+
+
+http_clients: Optional[HttpClientPool] = None
+
+
+def get_http_clients() -> HttpClientPool:
+    """Shared client pool of the process, created on first use."""
+    global http_clients
+    if http_clients is None:
+        http_clients = HttpClientPool(settings.http)
+    return http_clients
+
+
+async def close_http_clients() -> None:
+    """Close the connections of the shared pool; call on shutdown."""
+    global http_clients
+    if http_clients is not None:
+        await http_clients.close()
+        http_clients = None
@@ -0,0 +1,54 @@
+import logging
+import uuid
+from typing import Optional
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Non-blocking lock shared by all processes: SET NX with an expiry, so a crashed
+    holder releases it after `timeout` seconds, and only the holder can delete it.
+    """
+
+    def __init__(self, redis: Redis, key: str, timeout: float) -> None:
+        self.redis = redis
+        self.key = key
+        self.timeout = timeout
+        self._token: Optional[str] = None
+
+    async def acquire(self) -> bool:
+        """
+        :return: Whether the lock is taken; False when another holder has it.
+        :raises RedisError: Redis is unavailable, so nobody can tell who holds the lock.
+        """
+        token = uuid.uuid4().hex
+        locked = await self.redis.set(self.key, token, nx=True, px=int(self.timeout * 1000))
+        if locked:
+            self._token = token
+        return bool(locked)
+
+    async def release(self) -> None:
+        if self._token is None:
+            return
+        token, self._token = self._token, None
+        try:
+            await self.redis.register_script(RELEASE_LOCK_SCRIPT)(keys=[self.key], args=[token])
+        except RedisError as e:
+            logger.warning(f"Lock {self.key}: can't release, expires in {self.timeout} sec.: {e}")
+
+    async def is_locked(self) -> bool:
+        try:
+            return bool(await self.redis.exists(self.key))
+        except RedisError:
+            return False
@@ -1,12 +1,22 @@
 import asyncio
-from typing import Any, Dict, Optional
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
 
 import httpx
 
+from infrastructure.api_services.common.exceptions import CircuitOpenError, RequestQueueFull
+from infrastructure.api_services.common import response_cache as response_cache_module
+from infrastructure.api_services.common.http_client import get_http_clients
+from infrastructure.api_services.common.response_cache import response_key
+from infrastructure.metrics import REQUEST_QUEUE_DEPTH, REQUEST_QUEUE_JOBS, REQUEST_QUEUE_WAIT, REQUEST_QUEUE_WORKERS
 from settings import settings, logger
 
-semaphore = asyncio.Semaphore(5)
-request_queue = asyncio.Queue()
+# Чем меньше приоритет, тем раньше выполняется запрос
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
 
 
 async def make_request(
@@ -18,12 +28,18 @@ async def make_request(
         data: Optional[Dict[str, Any] | str] = None,
         json: Optional[Dict[str, Any]] = None,
         headers: Optional[Dict[str, str]] = None,
-        timeout: float = 180.0,
+        timeout: Optional[float] = None,
+        cache_ttl: Optional[int] = None,
+        raise_errors: bool = False,
 ) -> Any:
     """
         Выполняет HTTP-запрос с использованием указанного метода на заданный маршрут.
 
-        :param method: HTTP-метод ('GET' или 'POST').
+        Запросы идут через общий пул клиентов (см. `http_client.HttpClientPool`): соединения
+        переиспользуются, идемпотентные запросы повторяются, а при недоступном сервере
+        запрос сразу завершается без ожидания таймаута.
+
+        :param method: HTTP-метод.
         :param route: Маршрут для запроса.
         :param host: (Необязательно) Host сервера для запроса.
         :param port: (Необязательно) Порт сервера для запроса.
@@ -31,57 +47,284 @@ async def make_request(
         :param data: (Необязательно) Словарь данных формы для POST-запросов.
         :param json: (Необязательно) Словарь для тела запроса в формате JSON для POST-запросов.
         :param headers: (Необязательно) Словарь заголовков запроса.
-        :param timeout: (Необязательно) Время ожидания ответа от сервера в секундах.
-        :return: Объект Response от httpx.
+        :param timeout: (Необязательно) Время ожидания ответа от сервера в секундах, по умолчанию из настроек HTTP__TIMEOUT.
+        :param cache_ttl: (Необязательно) Кэшировать ответ GET-запроса на указанное число секунд
+            (см. `response_cache.ResponseCache`). Ответ не должен зависеть от заголовков запроса.
+        :param raise_errors: (Необязательно) Пробрасывать ошибки запроса вместо того, чтобы
+            записать их в лог и вернуть None.
+        :return: Тело ответа в формате JSON или None, если ресурс не найден (404).
         """
-    async with semaphore:
-        try:
-            async with httpx.AsyncClient() as client:
-                prefix = "http://"
-                url = f"{prefix}{host}:{port}/{route}"
+    try:
+        cache = response_cache_module.response_cache
+        if cache_ttl and cache is not None and method.upper() == "GET":
+            return await cache.get_or_fetch(
+                response_key(method, f"http://{host}:{port}/{route}", params),
+                lambda: _make_request(method, route, host, port, params, data, json, headers, timeout),
+                ttl=cache_ttl,
+            )
+        return await _make_request(method, route, host, port, params, data, json, headers, timeout)
+
+    except Exception as e:
+        if raise_errors:
+            raise
+        _log_request_error(e)
 
-                if method.upper() == 'GET':
-                    response = await client.get(url=url, params=params, headers=headers, timeout=timeout)
-                elif method.upper() == 'POST':
-                    response = await client.post(url=url, data=data, json=json, headers=headers, timeout=timeout)
-                else:
-                    raise ValueError("Метод должен быть 'GET' или 'POST'.")
 
-                # Проверяем, что ответ от сервера успешный (код состояния 2xx)
-                response.raise_for_status()
-                return response.json()
+async def _make_request(
+        method: str,
+        route: str,
+        host: Optional[str],
+        port: Optional[str],
+        params: Optional[Dict[str, Any]],
+        data: Optional[Dict[str, Any] | str],
+        json: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+        timeout: Optional[float],
+) -> Any:
+    response = await get_http_clients().request(
+        method,
+        f"http://{host}:{port}",
+        route,
+        params=params,
+        data=data,
+        json=json,
+        headers=headers,
+        timeout=timeout,
+    )
+    if response.status_code == 404:
+        return None
+
+    # Проверяем, что ответ от сервера успешный (код состояния 2xx)
+    response.raise_for_status()
+    return response.json()
 
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 404:
-                return None
 
-            logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
+def _log_request_error(error: Exception) -> None:
+    if isinstance(error, CircuitOpenError):
+        logger.warning(f"Request skipped: {error}")
+    elif isinstance(error, httpx.HTTPStatusError):
+        logger.error(f"HTTP error occurred: {error.response.status_code} - {error.response.text}")
+    elif isinstance(error, httpx.NetworkError):
+        logger.error(f"Network error occurred: {error}")
+    elif isinstance(error, httpx.TimeoutException):
+        logger.error(f"Timeout occurred: {error}")
+    elif isinstance(error, httpx.RemoteProtocolError):
+        logger.error(f"Remote protocol error occurred: {error}")
+    else:
+        logger.error(f"An unexpected error occurred: {error}")
 
-        except httpx.NetworkError as e:
-            logger.error(f"Network error occurred: {e}")
 
-        except httpx.TimeoutException as e:
-            logger.error(f"Timeout occurred: {e}")
+@dataclass(order=True)
+class RequestJob:
+    priority: int
+    # Порядок постановки в очередь среди запросов с одинаковым приоритетом
+    seq: int
+    method: str = field(compare=False)
+    route: str = field(compare=False)
+    host: Optional[str] = field(compare=False)
+    port: Optional[str] = field(compare=False)
+    kwargs: Dict[str, Any] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False, default_factory=time.perf_counter)
 
-        except httpx.RemoteProtocolError as e:
-            logger.error(f"Remote protocol error occurred: {e}")
 
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
+class RequestQueue:
+    """
+    Ограниченная очередь исходящих запросов с приоритетами, которые выполняются через
+    `make_request` фоновыми обработчиками.
+
+    `submit` возвращает future с результатом `make_request`; ошибки запроса передаются в future.
+    Если очередь заполнена, `submit` ждёт свободного места, а с `block=False` или по истечении
+    `timeout` выбрасывает RequestQueueFull. Обработчики добавляются, пока запросы ждут, а
+    свободных обработчиков нет (не больше `max_workers`), и лишние обработчики завершаются
+    после `idle_timeout` секунд простоя (не меньше `min_workers`).
+    """
+
+    def __init__(
+            self,
+            name: str = "default",
+            maxsize: int = 1000,
+            min_workers: int = 1,
+            max_workers: int = 10,
+            idle_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize)
+        self._workers: Set[asyncio.Task] = set()
+        self._idle = 0
+        self._seq = itertools.count()
+        self._running = False
+        REQUEST_QUEUE_DEPTH.set_function(self._queue.qsize, name)
+        REQUEST_QUEUE_WORKERS.set_function(lambda: len(self._workers), name)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> None:
+        self._running = True
+        while len(self._workers) < self.min_workers:
+            self._spawn()
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """
+        Останавливает обработчики, дав запросам из очереди до `drain_timeout` секунд на выполнение.
+        Оставшиеся после этого запросы отменяются.
+        """
+        self._running = False
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Request queue {self.name}: {self._queue.qsize()} jobs are not finished, cancelling")
 
+        workers = list(self._workers)
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
-async def worker():
-    while True:
-        method, route, params, data, json, headers = await request_queue.get()
+        while not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.future.cancel()
+            REQUEST_QUEUE_JOBS.labels(self.name, "cancelled").inc()
+            self._queue.task_done()
+
+    async def submit(
+            self,
+            method: str,
+            route: str,
+            host: Optional[str],
+            port: Optional[str],
+            priority: int = PRIORITY_NORMAL,
+            block: bool = True,
+            timeout: Optional[float] = None,
+            **kwargs: Any,
+    ) -> asyncio.Future:
+        """
+        Ставит запрос в очередь.
+
+        :param priority: Запросы с меньшим приоритетом выполняются раньше, см. PRIORITY_*.
+        :param block: Ждать свободного места, если очередь заполнена.
+        :param timeout: Время ожидания свободного места в секундах.
+        :param kwargs: Остальные аргументы `make_request`.
+        :return: Future с результатом `make_request` или ошибкой запроса.
+        :raises RequestQueueFull: Очередь заполнена.
+        """
+        if not self._running:
+            self.start()
+
+        job = RequestJob(
+            priority=priority,
+            seq=next(self._seq),
+            method=method,
+            route=route,
+            host=host,
+            port=port,
+            kwargs=kwargs,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        try:
+            if not block:
+                self._queue.put_nowait(job)
+            else:
+                async with asyncio.timeout(timeout):
+                    await self._queue.put(job)
+        except (asyncio.QueueFull, TimeoutError):
+            REQUEST_QUEUE_JOBS.labels(self.name, "rejected").inc()
+            raise RequestQueueFull(f"Request queue {self.name} is full ({self._queue.maxsize} jobs)")
+
+        self._scale_up()
+        return job.future
+
+    async def request(self, method: str, route: str, host: Optional[str], port: Optional[str], **kwargs: Any) -> Any:
+        """Ставит запрос в очередь и ждёт результата; аргументы те же, что у `submit`."""
+        return await (await self.submit(method, route, host, port, **kwargs))
+
+    def _scale_up(self) -> None:
+        if self._queue.qsize() > self._idle and len(self._workers) < self.max_workers:
+            self._spawn()
+
+    def _spawn(self) -> None:
+        task = asyncio.create_task(self._worker(), name=f"request-queue-{self.name}")
+        self._workers.add(task)
+        task.add_done_callback(self._workers.discard)
+
+    async def _worker(self) -> None:
+        while True:
+            self._idle += 1
+            try:
+                # В отличие от wait_for до 3.12, asyncio.timeout не теряет запрос, взятый из очереди
+                # в момент истечения таймаута
+                async with asyncio.timeout(self.idle_timeout if len(self._workers) > self.min_workers else None):
+                    job = await self._queue.get()
+            except TimeoutError:
+                if len(self._workers) > self.min_workers:
+                    # Удаляемся из множества сразу, а не в done callback, чтобы простаивающие
+                    # обработчики не завершились все одновременно
+                    self._workers.discard(asyncio.current_task())
+                    return
+                continue
+            finally:
+                self._idle -= 1
+
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: RequestJob) -> None:
+        if job.future.done():
+            # Отменён вызывающим кодом, пока ждал в очереди
+            REQUEST_QUEUE_JOBS.labels(self.name, "cancelled").inc()
+            return
+
+        REQUEST_QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - job.enqueued_at)
         try:
-            response = await make_request(method, route, params=params, data=data, json=json, headers=headers)
-            logger.info(f"Response: {response}")
+            result = await make_request(job.method, job.route, job.host, job.port, raise_errors=True, **job.kwargs)
+        except asyncio.CancelledError:
+            job.future.cancel()
+            REQUEST_QUEUE_JOBS.labels(self.name, "cancelled").inc()
+            raise
         except Exception as e:
             logger.error(f"Error occurred while processing request: {e}")
-        finally:
-            request_queue.task_done()
+            if not job.future.done():
+                job.future.set_exception(e)
+            REQUEST_QUEUE_JOBS.labels(self.name, "failed").inc()
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+            REQUEST_QUEUE_JOBS.labels(self.name, "done").inc()
+
+
+request_queue: Optional[RequestQueue] = None
+
+
+def get_request_queue() -> RequestQueue:
+    """Общая очередь запросов процесса, создаётся при первом обращении."""
+    global request_queue
+    if request_queue is None:
+        request_queue = RequestQueue(
+            maxsize=settings.http.queue_maxsize,
+            min_workers=settings.http.queue_min_workers,
+            max_workers=settings.http.queue_max_workers,
+            idle_timeout=settings.http.queue_worker_idle_timeout,
+        )
+    return request_queue
 
 
 async def start_workers():
-    for _ in range(3):
-        asyncio.create_task(worker())
+    get_request_queue().start()
+
+
+async def stop_workers():
+    global request_queue
+    if request_queue is not None:
+        await request_queue.stop()
+        request_queue = None
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import orjson
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+
+from infrastructure.api_services.common.cache import AbstractCache, RedisCache
+from infrastructure.api_services.common.locks import RedisLock
+from infrastructure.metrics import RESPONSE_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Result of a shared future whose fetching caller was cancelled
+_ABANDONED = object()
+
+
+def response_key(method: str, url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    raw = orjson.dumps([method.upper(), url, params or {}], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha1(raw).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache of outbound GET responses with stale-while-revalidate and singleflight.
+
+    An entry is fresh for `ttl` seconds and then served stale for up to `stale_ttl` more
+    while one background call refreshes it. On a miss concurrent identical requests share
+    one upstream call: in-process through a shared future, across replicas through a Redis
+    lock, whose losers wait for the entry stored by the holder.
+    Only non-None responses are cached, so errors and 404 are not.
+    """
+
+    def __init__(
+            self,
+            redis: Redis,
+            cache: Optional[AbstractCache] = None,
+            stale_ttl: int = 300,
+            lock_timeout: float = 10.0,
+            prefix: str = "http_cache",
+    ) -> None:
+        self.redis = redis
+        self.cache = cache or RedisCache(redis)
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.prefix = prefix
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+
+    async def get_or_fetch(
+            self,
+            key: str,
+            fetch: Callable[[], Awaitable[Any]],
+            ttl: int,
+            stale_ttl: Optional[int] = None,
+    ) -> Any:
+        """
+        :param key: Request key, see `response_key`.
+        :param fetch: Upstream call.
+        :param ttl: Seconds the response is fresh.
+        :param stale_ttl: Seconds a stale response may be served, `self.stale_ttl` by default.
+        :return: Cached or fetched response.
+        """
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        entry = await self._read(key)
+        if entry is not None:
+            if entry["fresh_until"] > time.time():
+                RESPONSE_CACHE_REQUESTS.labels("hit").inc()
+                return entry["value"]
+            RESPONSE_CACHE_REQUESTS.labels("stale").inc()
+            if key not in self._inflight:
+                task = asyncio.create_task(self._singleflight(key, fetch, ttl, stale_ttl))
+                self._refreshing.add(task)
+                task.add_done_callback(self._refreshing.discard)
+            return entry["value"]
+
+        RESPONSE_CACHE_REQUESTS.labels("miss").inc()
+        return await self._singleflight(key, fetch, ttl, stale_ttl)
+
+    async def close(self) -> None:
+        """Cancel background refreshes; call on shutdown."""
+        tasks = list(self._refreshing)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _singleflight(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int) -> Any:
+        future = self._inflight.get(key)
+        while future is not None:
+            RESPONSE_CACHE_REQUESTS.labels("coalesced").inc()
+            value = await asyncio.shield(future)
+            if value is not _ABANDONED:
+                return value
+            # The caller that was fetching got cancelled, fetch instead of it
+            future = self._inflight.get(key)
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._fetch_once(key, fetch, ttl, stale_ttl)
+        except asyncio.CancelledError:
+            # Only the fetching caller is cancelled, not the ones waiting for it
+            future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    async def _fetch_once(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int, stale_ttl: int) -> Any:
+        lock = RedisLock(self.redis, f"{self.prefix}:lock:{key}", self.lock_timeout)
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.05
+        while True:
+            try:
+                if await lock.acquire():
+                    break
+            except RedisError as e:
+                # Nothing to wait for: the response can't be stored either
+                logger.warning(f"Response cache: Redis is unavailable, fetching {key} without the lock: {e}")
+                return await fetch()
+            if time.monotonic() >= deadline:
+                # The holder is too slow, don't make the caller wait any longer
+                break
+            RESPONSE_CACHE_REQUESTS.labels("lock_wait").inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            entry = await self._read(key)
+            if entry is not None and entry["fresh_until"] > time.time():
+                return entry["value"]
+
+        try:
+            value = await fetch()
+            if value is not None:
+                await self._write(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            await lock.release()
+
+    async def _read(self, key: str) -> Optional[dict]:
+        try:
+            raw = await self.cache.get(f"{self.prefix}:{key}")
+        except RedisError as e:
+            logger.warning(f"Response cache: Redis is unavailable: {e}")
+            return None
+        if raw is None:
+            return None
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # E.g. written by another version of the cache: fetch and overwrite it
+            logger.warning(f"Response cache: can't decode {key}, ignoring it")
+            return None
+
+    async def _write(self, key: str, value: Any, ttl: int, stale_ttl: int) -> None:
+        entry = orjson.dumps({"value": value, "fresh_until": time.time() + ttl})
+        try:
+            await self.cache.set(f"{self.prefix}:{key}", entry, ttl + stale_ttl)
+        except RedisError as e:
+            logger.warning(f"Response cache: can't store {key}: {e}")
+
+
+response_cache: Optional[ResponseCache] = None
+
+
+def init_response_cache(redis: Redis, **kwargs) -> ResponseCache:
+    """Create the cache used by `make_request(..., cache_ttl=...)`; call once on startup."""
+    global response_cache
+    response_cache = ResponseCache(redis, **kwargs)
+    return response_cache
+
+
+async def close_response_cache() -> None:
+    global response_cache
+    if response_cache is not None:
+        await response_cache.close()
+        response_cache = None
@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from infrastructure.metrics import (
+    DB_N_PLUS_ONE,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS,
+    DB_QUERIES,
+    DB_QUERY_LATENCY,
+    DB_SLOW_QUERIES,
+    DB_STATEMENT_CALLS,
+    DB_STATEMENT_P95,
+    DB_STATEMENT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST = re.compile(r"(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    Normalize a statement so that executions differing only in literals, placeholders
+    or the length of IN/VALUES lists share one fingerprint.
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _PLACEHOLDER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _PLACEHOLDER_LIST.sub("(...)", normalized)
+    normalized = _VALUES_LIST.sub(r"\1", normalized)
+    return _WHITESPACE.sub(" ", normalized).strip()
+
+
+@dataclass
+class StatementStats:
+    fingerprint_id: str
+    statement: str
+    # Metrics label: the fingerprint id, or "other" past `max_exported_fingerprints`
+    label: str = "other"
+    count: int = 0
+    total: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=500))
+
+    @property
+    def p95(self) -> float:
+        """95th percentile over the latest samples."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+@dataclass
+class QueryScope:
+    """Statements executed while handling one update or API request."""
+    origin: str
+    counts: Dict[str, int] = field(default_factory=dict)
+    flagged: set = field(default_factory=set)
+
+
+_scope: ContextVar[Optional[QueryScope]] = ContextVar("query_scope", default=None)
+
+
+@contextmanager
+def query_scope(origin: str) -> Iterator[QueryScope]:
+    """
+    Attribute statements executed inside the block to `origin` (handler or route)
+    for the slow query log and N+1 detection.
+    """
+    scope = QueryScope(origin)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def current_query_scope() -> Optional[QueryScope]:
+    return _scope.get()
+
+
+class QueryInstrumentation:
+    """
+    Engine listeners that keep per-fingerprint statistics, log statements slower than
+    `slow_query_ms` and flag a fingerprint executed `n_plus_one_threshold` times
+    within one query scope as a likely N+1 pattern.
+
+    Statistics of up to `max_fingerprints` fingerprints are kept in process (see `top`).
+    Metrics are labelled with the 12-character fingerprint id of the first
+    `max_exported_fingerprints` of them and with "other" for the rest, so the series count
+    stays bounded; the statement of an id is logged when the fingerprint is first seen.
+    """
+
+    def __init__(self, slow_query_ms: float = 200.0, n_plus_one_threshold: int = 10,
+                 max_fingerprints: int = 2000, max_exported_fingerprints: int = 100) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.max_fingerprints = max_fingerprints
+        self.max_exported_fingerprints = max_exported_fingerprints
+        self.statements: Dict[str, StatementStats] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._exported = 0
+
+    def attach(self, engine: AsyncEngine) -> AsyncEngine:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine.sync_engine, "handle_error", self._handle_error)
+        return engine
+
+    def top(self, limit: int = 10) -> List[StatementStats]:
+        """Statements with the largest total time."""
+        return sorted(self.statements.values(), key=lambda stats: stats.total, reverse=True)[:limit]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        operation = _operation(statement)
+        DB_QUERIES.labels(operation).inc()
+        DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+
+        stats = self._statement_stats(statement)
+        if stats is not None:
+            stats.count += 1
+            stats.total += elapsed
+            stats.samples.append(elapsed)
+            DB_STATEMENT_CALLS.labels(stats.label).inc()
+            DB_STATEMENT_SECONDS.labels(stats.label).inc(elapsed)
+
+        scope = _scope.get()
+        origin = scope.origin if scope is not None else "unknown"
+
+        if elapsed * 1000 >= self.slow_query_ms:
+            DB_SLOW_QUERIES.labels(operation).inc()
+            logger.warning(f"Slow query {elapsed * 1000:.0f} ms in {origin}: {_shorten(statement)}")
+
+        if scope is not None and stats is not None:
+            fingerprint_id = stats.fingerprint_id
+            scope.counts[fingerprint_id] = count = scope.counts.get(fingerprint_id, 0) + 1
+            if count >= self.n_plus_one_threshold and fingerprint_id not in scope.flagged:
+                scope.flagged.add(fingerprint_id)
+                DB_N_PLUS_ONE.labels(origin).inc()
+                logger.warning(f"Possible N+1 in {origin}: statement executed {count} times: "
+                               f"{_shorten(stats.statement)}")
+
+    @staticmethod
+    def _handle_error(context):
+        # after_cursor_execute is not called for failed statements
+        if context.connection is not None and context.connection.info.get("query_start_time"):
+            context.connection.info["query_start_time"].pop()
+
+    def _statement_stats(self, statement: str) -> Optional[StatementStats]:
+        # SQLAlchemy caches compiled statements, so the raw text repeats and is cheap to look up
+        fingerprint_id = self._fingerprints.get(statement)
+        if fingerprint_id is not None:
+            return self.statements[fingerprint_id]
+
+        normalized = fingerprint(statement)
+        fingerprint_id = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+        stats = self.statements.get(fingerprint_id)
+        if stats is None:
+            if len(self.statements) >= self.max_fingerprints:
+                return None
+            stats = self.statements[fingerprint_id] = StatementStats(fingerprint_id, _shorten(normalized))
+            if self._exported < self.max_exported_fingerprints:
+                self._exported += 1
+                stats.label = fingerprint_id
+                DB_STATEMENT_P95.set_function(lambda: stats.p95, fingerprint_id)
+            logger.info(f"Statement fingerprint {fingerprint_id}: {stats.statement}")
+        if len(self._fingerprints) < self.max_fingerprints * 4:
+            self._fingerprints[statement] = fingerprint_id
+        return stats
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Connection pool that records how long checkouts wait for a free connection.
+    Metrics are labelled with the pool logging name (`pool_logging_name` of the engine).
+    """
+
+    def _do_get(self):
+        engine = self.logging_name or "primary"
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(engine).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(engine).observe(time.perf_counter() - start)
+
+
+def observe_pool(engine: AsyncEngine, name: str) -> None:
+    """Export pool occupancy of the engine; the pool is read at scrape time, so it survives dispose()."""
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.checkedout(), name, "checked_out")
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.checkedin(), name, "idle")
+    # QueuePool counts overflow from -pool_size
+    DB_POOL_CONNECTIONS.set_function(lambda: max(0, engine.pool.overflow()), name, "overflow")
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.size(), name, "size")
+
+
+def _operation(statement: str) -> str:
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].upper() if parts else "UNKNOWN"
+
+
+def _shorten(statement: str, limit: int = 300) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+instrumentation = QueryInstrumentation()
+
+
+def instrument_engine(
+        engine: AsyncEngine,
+        slow_query_ms: Optional[float] = None,
+        n_plus_one_threshold: Optional[int] = None,
+) -> AsyncEngine:
+    """
+    Record count and latency of every statement executed by the engine.
+    Thresholds apply to all instrumented engines of the process.
+    """
+    if slow_query_ms is not None:
+        instrumentation.slow_query_ms = slow_query_ms
+    if n_plus_one_threshold is not None:
+        instrumentation.n_plus_one_threshold = n_plus_one_threshold
+    return instrumentation.attach(engine)
@@ -1,4 +1,4 @@
-from sqlalchemy import BIGINT, String
+from sqlalchemy import BIGINT, Index, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base, TimestampMixin, TableNameMixin, int_pk
@@ -11,5 +11,12 @@ class User(Base, TableNameMixin, TimestampMixin):
     username: Mapped[str | None]
     language: Mapped[str] = mapped_column(String, server_default="en")
 
+    __table_args__ = (
+        # Keyset pagination order of BaseRepo.get_page. Existing databases get it from the next
+        # autogenerated migration (scripts/alembic/create_migrations.sh); on a large table build it
+        # with postgresql_concurrently=True inside op.get_context().autocommit_block()
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
+
     #  joinedload - для m2o и o2o связей
     #  selectinload - для o2m и m2m связей
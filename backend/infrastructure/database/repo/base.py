@@ -1,38 +1,161 @@
-from typing import Any, Optional, Type, TypeVar, Union, List
+import base64
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Generic, Iterable, Optional, Sequence, Tuple, Type, TypeVar, Union, List
 
-from sqlalchemy import update, delete, func
+import orjson
+from sqlalchemy import update, delete, func, tuple_
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.future import select
 from sqlalchemy.orm import DeclarativeMeta
 
+from infrastructure.api_services.common.cache import AbstractCache
+from infrastructure.database.repo.entity_cache import (
+    ALL,
+    EntityCache,
+    defer_invalidation,
+    pending_invalidation,
+    primary_keys,
+)
+from infrastructure.database.repo.records import record_columns, record_type
+from infrastructure.database.routing import replica_reads
+
 T = TypeVar('T', bound=DeclarativeMeta)
 
+logger = logging.getLogger(__name__)
+
+# Bind parameters per statement allowed by the Postgres protocol
+MAX_BIND_PARAMS = 32767
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T]
+    # Pass to get_page to continue, None on the last page
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(created_at: datetime, obj_id: Any) -> str:
+    raw = orjson.dumps([created_at.isoformat(), obj_id if isinstance(obj_id, int) else str(obj_id)])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, obj_id = orjson.loads(raw)
+        return datetime.fromisoformat(created_at), obj_id
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+@dataclass
+class BulkResult:
+    rows: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    # Affected rows when RETURNING was requested
+    returned: list = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.elapsed:
+            return 0.0
+        return self.rows / self.elapsed
+
 
 class BaseRepo:
-    def __init__(self, sessionmaker: async_sessionmaker, model: Type[T]):
+    """
+    Base repository of a model.
+
+    Without `session` every method runs in its own session and commits on its own.
+    With `session` (unit of work) all methods share it and nothing is committed:
+    the owner of the session commits or rolls back at the boundary.
+
+    Repositories that set `entity_cache_ttl` cache `get` results in `cache` when it is given.
+    Writes invalidate the entries they touch once they are committed.
+    """
+
+    # Seconds to keep rows in the entity cache, None disables it for the model
+    entity_cache_ttl: Optional[int] = None
+
+    def __init__(
+            self,
+            sessionmaker: async_sessionmaker,
+            model: Type[T],
+            session: Optional[AsyncSession] = None,
+            cache: Optional[AbstractCache] = None,
+    ):
         self.sessionmaker = sessionmaker
         self.model = model
+        self.session = session
+        self.entity_cache: Optional[EntityCache] = None
+        if cache is not None and self.entity_cache_ttl:
+            self.entity_cache = EntityCache(cache, model, ttl=self.entity_cache_ttl)
+
+    @asynccontextmanager
+    async def _session(self, read_only: bool = False) -> AsyncIterator[AsyncSession]:
+        """
+        :param read_only: Let SELECTs go to a read replica, unless the session has already written.
+        """
+        if self.session is not None:
+            with replica_reads(self.session, read_only):
+                yield self.session
+        else:
+            async with self.sessionmaker() as session:
+                with replica_reads(session, read_only):
+                    yield session
+
+    async def _commit(self, session: AsyncSession, invalidate: Any = None) -> None:
+        """
+        :param invalidate: Primary keys of written rows (or `ALL`) to drop from the entity cache after the commit.
+        """
+        if self.session is None:
+            await session.commit()
+            if invalidate is not None and self.entity_cache is not None:
+                await self.entity_cache.invalidate(invalidate)
+        elif invalidate is not None and self.entity_cache is not None:
+            defer_invalidation(session, self.entity_cache, invalidate)
 
     async def get(self, obj_id: Any) -> Optional[T]:
-        async with self.sessionmaker() as session:
+        if self.entity_cache is None or (
+                self.session is not None and pending_invalidation(self.session, self.entity_cache, obj_id)
+        ):
+            return await self._get(obj_id, read_only=True)
+
+        lookup = await self.entity_cache.get(obj_id)
+        if lookup.found:
+            return lookup.value
+
+        # A lagging replica could put an old row under the new version, so fill from the primary
+        obj = await self._get(obj_id, read_only=False)
+        await self.entity_cache.set(obj_id, obj, lookup.version)
+        return obj
+
+    async def _get(self, obj_id: Any, read_only: bool) -> Optional[T]:
+        async with self._session(read_only=read_only) as session:
             stmt = select(self.model).filter_by(id=obj_id)
             result = await session.execute(stmt)
             return result.scalar_one_or_none()
 
     async def create(self, **kwargs) -> Optional[T]:
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             insert_stmt = (
                 insert(self.model)
                 .values(**kwargs)
                 .returning(self.model)
             )
             result = await session.execute(insert_stmt)
-            await session.commit()
-            return result.scalar_one_or_none()
+            obj = result.scalar_one_or_none()
+            await self._commit(session, invalidate=[obj.id] if obj is not None else [])
+            return obj
 
     async def create_on_conflict_do_nothing(self, **kwargs) -> Optional[T]:
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             if not kwargs:
                 kwargs = {}
 
@@ -43,14 +166,15 @@ class BaseRepo:
                 .returning(self.model)
             )
             result = await session.execute(insert_stmt)
-            await session.commit()
-            return result.scalar_one_or_none()
+            obj = result.scalar_one_or_none()
+            await self._commit(session, invalidate=[obj.id] if obj is not None else [])
+            return obj
 
     async def update(self, obj_id: Union[Any, List[Any]], **kwargs) -> Union[T, List[T], None]:
         if not obj_id:
             return None
 
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             if isinstance(obj_id, list):
                 stmt = (
                     update(self.model)
@@ -67,14 +191,14 @@ class BaseRepo:
                     .returning(self.model)
                 )
             result = await session.execute(stmt)
-            await session.commit()
+            await self._commit(session, invalidate=obj_id if isinstance(obj_id, list) else [obj_id])
 
             if isinstance(obj_id, list):
                 return list(result.scalars().all())
             return result.scalar_one_or_none()
 
     async def delete(self, obj_id: Union[Any, List[Any]]) -> Union[T, List[T], None]:
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             if isinstance(obj_id, list):
                 stmt = (
                     delete(self.model)
@@ -89,7 +213,7 @@ class BaseRepo:
                 )
 
             result = await session.execute(stmt)
-            await session.commit()
+            await self._commit(session, invalidate=obj_id if isinstance(obj_id, list) else [obj_id])
 
             if isinstance(obj_id, list):
                 return list(result.scalars().all())
@@ -97,10 +221,10 @@ class BaseRepo:
                 return result.scalar_one_or_none()
 
     async def delete_all(self):
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             stmt = delete(self.model)
             await session.execute(stmt)
-            await session.commit()
+            await self._commit(session, invalidate=ALL)
 
     async def get_all(
             self,
@@ -108,7 +232,7 @@ class BaseRepo:
             offset: Optional[int] = None,
             user_id: Optional[int] = None
     ) -> List[T]:
-        async with self.sessionmaker() as session:
+        async with self._session(read_only=True) as session:
             stmt = select(self.model).order_by(self.model.created_at.desc())
 
             if limit:
@@ -121,8 +245,326 @@ class BaseRepo:
             result = await session.execute(stmt)
             return list(result.scalars().all())
 
+    async def get_page(
+            self,
+            limit: int = 50,
+            cursor: Optional[str] = None,
+            user_id: Optional[int] = None,
+    ) -> Page[T]:
+        """
+        Return a page ordered by (created_at, id) descending. Unlike `get_all` with offset,
+        every page costs the same, however deep it is.
+
+        :param limit: Page size.
+        :param cursor: `next_cursor` of the previous page, None for the first page.
+        :param user_id: Filter by user_id.
+        :return: Page with the cursor of the next one.
+        :raises ValueError: If the cursor is malformed.
+        """
+        stmt = (
+            select(self.model)
+            .order_by(self.model.created_at.desc(), self.model.id.desc())
+            .limit(limit + 1)
+        )
+        if user_id:
+            stmt = stmt.filter_by(user_id=user_id)
+        stmt = self._after_cursor(stmt, cursor)
+
+        async with self._session(read_only=True) as session:
+            result = await session.execute(stmt)
+            items = list(result.scalars().all())
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+        return Page(items=items, next_cursor=next_cursor)
+
+    def _after_cursor(self, stmt, cursor: Optional[str]):
+        if not cursor:
+            return stmt
+        created_at, obj_id = decode_cursor(cursor)
+        id_type = self.model.id.type.python_type
+        if not isinstance(obj_id, id_type):
+            obj_id = id_type(obj_id)
+        return stmt.where(tuple_(self.model.created_at, self.model.id) < (created_at, obj_id))
+
+    async def get_record(self, obj_id: Any, columns: Optional[Sequence[str]] = None) -> Optional[Any]:
+        """
+        Fast path of `get`: select only `columns` and return an immutable record instead of the model.
+
+        :param obj_id: Primary key.
+        :param columns: Columns to select, all by default.
+        :return: Record (see `records.record_type`) or None.
+        """
+        names = record_columns(self.model, columns)
+        table = self.model.__table__
+        stmt = select(*(table.c[name] for name in names)).where(table.c.id == obj_id)
+
+        async with self._session(read_only=True) as session:
+            row = (await session.execute(stmt)).first()
+        return record_type(self.model, names)(*row) if row is not None else None
+
+    async def get_records(
+            self,
+            limit: int = 50,
+            cursor: Optional[str] = None,
+            columns: Optional[Sequence[str]] = None,
+    ) -> Page:
+        """
+        Fast path of `get_page`: same order and cursors, items are immutable records of `columns`.
+        """
+        names = record_columns(self.model, columns)
+        table = self.model.__table__
+        stmt = (
+            # Cursor columns go last and are not part of the record
+            select(*(table.c[name] for name in names), table.c.created_at, table.c.id)
+            .order_by(table.c.created_at.desc(), table.c.id.desc())
+            .limit(limit + 1)
+        )
+        stmt = self._after_cursor(stmt, cursor)
+
+        async with self._session(read_only=True) as session:
+            rows = (await session.execute(stmt)).all()
+
+        record = record_type(self.model, names)
+        size = len(names)
+        items = [record(*row[:size]) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][-2], rows[limit - 1][-1]) if len(rows) > limit else None
+        return Page(items=items, next_cursor=next_cursor)
+
+    async def iter_records(
+            self,
+            columns: Optional[Sequence[str]] = None,
+            batch_size: int = 1000,
+    ) -> AsyncIterator[Any]:
+        """
+        Fast path of `iter_all` for bulk scans and exports: streams immutable records of `columns`.
+        """
+        names = record_columns(self.model, columns)
+        table = self.model.__table__
+        stmt = select(*(table.c[name] for name in names)).execution_options(yield_per=batch_size)
+        record = record_type(self.model, names)
+
+        async with self._session(read_only=True) as session:
+            result = await session.stream(stmt)
+            try:
+                async for row in result:
+                    yield record(*row)
+            finally:
+                await result.close()
+
+    async def iter_all(self, batch_size: int = 1000, user_id: Optional[int] = None) -> AsyncIterator[T]:
+        """
+        Iterate over all rows through a server-side cursor, holding at most `batch_size`
+        rows in memory. The session stays in a transaction until the iteration ends.
+
+        :param batch_size: Rows fetched per round trip.
+        :param user_id: Filter by user_id.
+        """
+        stmt = select(self.model).execution_options(yield_per=batch_size)
+        if user_id:
+            stmt = stmt.filter_by(user_id=user_id)
+
+        async with self._session(read_only=True) as session:
+            result = await session.stream_scalars(stmt)
+            try:
+                async for obj in result:
+                    yield obj
+            finally:
+                await result.close()
+
     async def count_all(self) -> int:
-        async with self.sessionmaker() as session:
+        async with self._session(read_only=True) as session:
             stmt = select(func.count()).select_from(self.model)
             result = await session.execute(stmt)
             return result.scalar()
+
+    async def create_many(
+            self,
+            rows: Sequence[Dict[str, Any]],
+            batch_size: int = 1000,
+            returning: bool = False,
+            on_conflict_do_nothing: bool = False,
+    ) -> BulkResult:
+        """
+        Insert many rows with multi-row INSERT statements.
+
+        :param rows: Column values, every dict must have the same keys.
+        :param batch_size: Rows per statement, lowered to fit the bind parameter limit.
+        :param returning: Return created objects in `BulkResult.returned`.
+        :param on_conflict_do_nothing: Skip rows whose primary key already exists.
+        :return: Bulk operation result.
+        """
+
+        def build(batch: Sequence[Dict[str, Any]]):
+            stmt = insert(self.model).values(batch)
+            if on_conflict_do_nothing:
+                stmt = stmt.on_conflict_do_nothing(index_elements=self._primary_key())
+            return stmt
+
+        return await self._run_batches("create_many", rows, build, batch_size, returning)
+
+    async def upsert_many(
+            self,
+            rows: Sequence[Dict[str, Any]],
+            update_fields: Optional[Sequence[str]] = None,
+            index_elements: Optional[Sequence[str]] = None,
+            set_: Optional[Dict[str, Any]] = None,
+            batch_size: int = 1000,
+            returning: bool = False,
+    ) -> BulkResult:
+        """
+        Insert many rows, updating the existing ones (INSERT ... ON CONFLICT DO UPDATE).
+
+        :param rows: Column values, every dict must have the same keys.
+        :param update_fields: Columns taken from the new row on conflict, all given ones except the index by default.
+        :param index_elements: Conflict target, the primary key by default.
+        :param set_: Extra assignments on conflict, e.g. `{"updated_at": func.now()}`.
+        :param batch_size: Rows per statement, lowered to fit the bind parameter limit.
+        :param returning: Return inserted and updated objects in `BulkResult.returned`.
+        :return: Bulk operation result.
+        """
+        if not rows:
+            return BulkResult()
+
+        index_elements = list(index_elements or self._primary_key())
+        if update_fields is None:
+            update_fields = [name for name in rows[0] if name not in index_elements]
+
+        def build(batch: Sequence[Dict[str, Any]]):
+            stmt = insert(self.model).values(batch)
+            assignments = {name: stmt.excluded[name] for name in update_fields}
+            assignments.update(set_ or {})
+            if not assignments:
+                return stmt.on_conflict_do_nothing(index_elements=index_elements)
+            return stmt.on_conflict_do_update(index_elements=index_elements, set_=assignments)
+
+        return await self._run_batches("upsert_many", rows, build, batch_size, returning)
+
+    async def update_many(self, rows: Sequence[Dict[str, Any]], batch_size: int = 1000) -> BulkResult:
+        """
+        Update many rows by primary key. Each batch is sent as one executemany.
+
+        :param rows: Dicts with the primary key and the columns to set.
+        :param batch_size: Rows per batch.
+        :return: Bulk operation result.
+        """
+        result = BulkResult()
+        start = time.perf_counter()
+        async with self._session() as session:
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                await session.execute(update(self.model), batch)
+                result.rows += len(batch)
+                result.batches += 1
+            await self._commit(session, invalidate=primary_keys(rows, self._primary_key()[0]))
+
+        return self._finish("update_many", result, start)
+
+    async def copy_many(
+            self,
+            rows: Iterable[Dict[str, Any]],
+            columns: Optional[Sequence[str]] = None,
+            batch_size: int = 10000,
+    ) -> BulkResult:
+        """
+        Load rows with COPY (asyncpg `copy_records_to_table`), the fastest way for large imports.
+        Conflicts are not handled: a duplicate key fails the whole load.
+
+        :param rows: Column values.
+        :param columns: Columns to load, the keys of the first row by default. Timestamps
+            defaulting to now() are filled in with now() of the database when they are not given.
+        :param batch_size: Rows per COPY.
+        :return: Bulk operation result.
+        """
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return BulkResult()
+
+        columns = list(columns or first)
+        now_columns = [
+            column for column in self.model.__table__.columns
+            if column.name not in columns
+            and column.default is not None
+            and getattr(column.default.arg, "name", None) == "now"
+        ]
+
+        result = BulkResult()
+        start = time.perf_counter()
+        async with self._session() as session:
+            # What the column defaults of other inserts get: now() of the transaction in the column type
+            now = ()
+            if now_columns:
+                now = tuple((await session.execute(
+                    select(*[func.now().cast(column.type) for column in now_columns])
+                )).one())
+
+            def records(batch: List[Dict[str, Any]]) -> List[tuple]:
+                return [tuple(row.get(name) for name in columns) + now for row in batch]
+
+            copy_columns = columns + [column.name for column in now_columns]
+            connection = await session.connection()
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+
+            batch = [first]
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    await driver_connection.copy_records_to_table(
+                        self.model.__tablename__, records=records(batch), columns=copy_columns,
+                    )
+                    result.rows += len(batch)
+                    result.batches += 1
+                    batch = []
+            if batch:
+                await driver_connection.copy_records_to_table(
+                    self.model.__tablename__, records=records(batch), columns=copy_columns,
+                )
+                result.rows += len(batch)
+                result.batches += 1
+            await self._commit(session, invalidate=ALL)
+
+        return self._finish("copy_many", result, start)
+
+    def _primary_key(self) -> List[str]:
+        return [column.name for column in self.model.__table__.primary_key.columns]
+
+    async def _run_batches(
+            self,
+            operation: str,
+            rows: Sequence[Dict[str, Any]],
+            build,
+            batch_size: int,
+            returning: bool,
+    ) -> BulkResult:
+        result = BulkResult()
+        if not rows:
+            return result
+
+        # Column defaults may add parameters too, so count every column of the table
+        params_per_row = max(len(rows[0]), len(self.model.__table__.columns))
+        batch_size = max(1, min(batch_size, MAX_BIND_PARAMS // params_per_row))
+        start = time.perf_counter()
+        async with self._session() as session:
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                stmt = build(batch)
+                if returning:
+                    stmt = stmt.returning(self.model)
+                    result.returned.extend((await session.execute(stmt)).scalars().all())
+                else:
+                    await session.execute(stmt)
+                result.rows += len(batch)
+                result.batches += 1
+            await self._commit(session, invalidate=primary_keys(rows, self._primary_key()[0]))
+
+        return self._finish(operation, result, start)
+
+    def _finish(self, operation: str, result: BulkResult, start: float) -> BulkResult:
+        result.elapsed = time.perf_counter() - start
+        logger.debug(f"{self.model.__name__}.{operation}: {result.rows} rows in {result.batches} batches, "
+                    f"{result.elapsed:.2f} sec., {result.rows_per_second:.0f} rows/sec.")
+        return result
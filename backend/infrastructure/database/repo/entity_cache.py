@@ -0,0 +1,166 @@
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional, Tuple, Type
+
+import orjson
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from infrastructure.api_services.common.cache import AbstractCache
+from infrastructure.metrics import ENTITY_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Invalidate every entry of the model, e.g. after delete_all
+ALL = object()
+# Session.info key of invalidations waiting for the commit of a unit of work
+PENDING_INVALIDATIONS = "entity_cache_invalidations"
+
+_MISSING = b"\x00"
+
+
+@dataclass
+class CacheLookup:
+    found: bool
+    value: Any
+    # Version the entry has to be stored under after a miss
+    version: str
+
+
+class EntityCache:
+    """
+    Read-through cache of model rows by primary key.
+
+    Entries are stored under versioned keys: `<prefix>:<table>:<id>:<generation>.<version>`.
+    A write bumps the row version (or the table generation for `ALL`) instead of deleting
+    the entry, so a reader that loaded the row before the write stores it under the old
+    version, which nobody reads any more. Missing rows are cached for `negative_ttl` seconds.
+    """
+
+    # Versions outlive entries by far, so a version never repeats while an entry of it exists
+    VERSION_TTL = 7 * 86400
+    # Bigger writes bump the table generation instead of every row version
+    MAX_ROW_INVALIDATIONS = 100
+
+    def __init__(
+            self,
+            cache: AbstractCache,
+            model: Type,
+            ttl: int = 300,
+            negative_ttl: int = 30,
+            prefix: str = "entity",
+    ) -> None:
+        self.cache = cache
+        self.model = model
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = f"{prefix}:{model.__tablename__}"
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, obj_id: Any) -> CacheLookup:
+        try:
+            generation, version = await self.cache.get_many(self._generation_key(), self._version_key(obj_id))
+            version = f"{int(generation or 0)}.{int(version or 0)}"
+            value = await self.cache.get(self._key(obj_id, version))
+        except RedisError as e:
+            logger.warning(f"Entity cache: Redis is unavailable: {e}")
+            return CacheLookup(False, None, "")
+
+        if value is None:
+            self.misses += 1
+            ENTITY_CACHE_REQUESTS.labels(self.model.__name__, "miss").inc()
+            return CacheLookup(False, None, version)
+
+        self.hits += 1
+        if value == _MISSING:
+            ENTITY_CACHE_REQUESTS.labels(self.model.__name__, "negative_hit").inc()
+            return CacheLookup(True, None, version)
+
+        ENTITY_CACHE_REQUESTS.labels(self.model.__name__, "hit").inc()
+        return CacheLookup(True, self._load(value), version)
+
+    async def set(self, obj_id: Any, obj: Optional[Any], version: str) -> None:
+        if not version:
+            return
+        try:
+            if obj is None:
+                await self.cache.set(self._key(obj_id, version), _MISSING, self.negative_ttl)
+            else:
+                await self.cache.set(self._key(obj_id, version), self._dump(obj), self.ttl)
+        except RedisError as e:
+            logger.warning(f"Entity cache: can't store {self.prefix}:{obj_id}: {e}")
+
+    async def invalidate(self, obj_ids: Any) -> None:
+        """
+        :param obj_ids: Primary keys of written rows, or `ALL`.
+        """
+        if obj_ids is not ALL and len(obj_ids) > self.MAX_ROW_INVALIDATIONS:
+            obj_ids = ALL
+        keys = [self._generation_key()] if obj_ids is ALL else [self._version_key(obj_id) for obj_id in obj_ids]
+        try:
+            for key in keys:
+                await self.cache.incr(key, self.VERSION_TTL)
+        except RedisError as e:
+            logger.error(f"Entity cache: can't invalidate {self.prefix}, entries may be stale for {self.ttl} sec.: {e}")
+
+    def _key(self, obj_id: Any, version: str) -> str:
+        return f"{self.prefix}:{obj_id}:{version}"
+
+    def _version_key(self, obj_id: Any) -> str:
+        return f"{self.prefix}:{obj_id}:v"
+
+    def _generation_key(self) -> str:
+        return f"{self.prefix}:generation"
+
+    def _dump(self, obj: Any) -> bytes:
+        return orjson.dumps({column.name: getattr(obj, column.key) for column in self.model.__table__.columns})
+
+    def _load(self, value: bytes) -> Any:
+        data = orjson.loads(value)
+        for column in self.model.__table__.columns:
+            raw = data.get(column.name)
+            if isinstance(raw, str):
+                python_type = _python_type(column)
+                if python_type is datetime:
+                    data[column.name] = datetime.fromisoformat(raw)
+                elif python_type is date:
+                    data[column.name] = date.fromisoformat(raw)
+        return self.model(**data)
+
+
+def _python_type(column) -> Optional[type]:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def defer_invalidation(session: AsyncSession, entity_cache: EntityCache, obj_ids: Any) -> None:
+    """Invalidate after the unit of work of `session` commits."""
+    if obj_ids is not ALL:
+        obj_ids = [str(obj_id) for obj_id in obj_ids]
+    session.info.setdefault(PENDING_INVALIDATIONS, []).append((entity_cache, obj_ids))
+
+
+def pending_invalidation(session: AsyncSession, entity_cache: EntityCache, obj_id: Any) -> bool:
+    """Whether the unit of work has written the row, so its cache entry must not be used yet."""
+    for cache, obj_ids in session.info.get(PENDING_INVALIDATIONS, ()):
+        if cache.prefix == entity_cache.prefix and (obj_ids is ALL or str(obj_id) in obj_ids):
+            return True
+    return False
+
+
+async def run_pending_invalidations(session: AsyncSession) -> None:
+    pending: List[Tuple[EntityCache, Any]] = session.info.pop(PENDING_INVALIDATIONS, [])
+    for entity_cache, obj_ids in pending:
+        await entity_cache.invalidate(obj_ids)
+
+
+def discard_pending_invalidations(session: AsyncSession) -> None:
+    session.info.pop(PENDING_INVALIDATIONS, None)
+
+
+def primary_keys(rows: Iterable[dict], key: str = "id") -> List[Any]:
+    return [row[key] for row in rows if row.get(key) is not None]
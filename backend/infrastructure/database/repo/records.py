@@ -0,0 +1,33 @@
+from dataclasses import make_dataclass
+from functools import lru_cache
+from typing import Any, Optional, Sequence, Tuple, Type
+
+
+@lru_cache(maxsize=None)
+def record_type(model: Type, columns: Tuple[str, ...]) -> type:
+    """
+    Frozen `__slots__` dataclass with the given columns of `model`.
+
+    Records are built straight from result tuples, without ORM identity map and
+    attribute instrumentation, and orjson serialises them as they are.
+    """
+    table_columns = model.__table__.columns
+    fields = [(name, Optional[_python_type(table_columns[name])]) for name in columns]
+    return make_dataclass(f"{model.__name__}Record", fields, frozen=True, slots=True)
+
+
+def record_columns(model: Type, columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+    if columns is None:
+        return tuple(model.__table__.columns.keys())
+
+    unknown = set(columns) - set(model.__table__.columns.keys())
+    if unknown:
+        raise ValueError(f"{model.__name__} has no columns {sorted(unknown)}")
+    return tuple(columns)
+
+
+def _python_type(column) -> Any:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return Any
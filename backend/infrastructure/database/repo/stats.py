@@ -0,0 +1,227 @@
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Dict, Optional
+
+from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from infrastructure.api_services.common.locks import RELEASE_LOCK_SCRIPT
+from infrastructure.database.models import User
+
+logger = logging.getLogger(__name__)
+
+
+def utc_today() -> date:
+    """Day of `UserStats.new_today`: created_at holds the database time, which is UTC."""
+    return datetime.now(timezone.utc).date()
+
+
+@dataclass
+class UserStats:
+    total: int
+    new_today: int
+    languages: Dict[str, int] = field(default_factory=dict)
+    # False when `total` is the planner estimate and the other counters are unknown
+    exact: bool = True
+    synced_at: Optional[datetime] = None
+
+
+class StatsRepo:
+    """
+    User counters maintained in Redis, so reading them doesn't scan the users table.
+
+    Counters are incremented when users are created and reconciled with the database
+    once they are older than `max_age` seconds. Only one process reconciles at a time;
+    the others keep returning the current counters, or the `pg_class.reltuples` estimate
+    when there are no counters yet.
+    """
+
+    def __init__(
+            self,
+            sessionmaker: async_sessionmaker,
+            redis: Redis,
+            max_age: int = 3600,
+            key_prefix: str = "stats:users",
+    ) -> None:
+        self.sessionmaker = sessionmaker
+        self.redis = redis
+        self.max_age = max_age
+        self.key_prefix = key_prefix
+
+    @property
+    def total_key(self) -> str:
+        return f"{self.key_prefix}:total"
+
+    @property
+    def languages_key(self) -> str:
+        return f"{self.key_prefix}:languages"
+
+    @property
+    def synced_at_key(self) -> str:
+        return f"{self.key_prefix}:synced_at"
+
+    @property
+    def lock_key(self) -> str:
+        return f"{self.key_prefix}:lock"
+
+    def new_key(self, day: date) -> str:
+        return f"{self.key_prefix}:new:{day.isoformat()}"
+
+    async def record_new_user(self, language: Optional[str]) -> None:
+        """
+        Count a user that has just been created.
+
+        :param language: Language of the new user.
+        """
+        new_key = self.new_key(utc_today())
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.incr(self.total_key)
+                pipe.incr(new_key)
+                pipe.expire(new_key, 2 * 86400)
+                pipe.hincrby(self.languages_key, language or "", 1)
+                await pipe.execute()
+        except RedisError as e:
+            # Counters are reconciled with the database later
+            logger.warning(f"Stats: can't count new user: {e}")
+
+    async def record_language_change(self, old: Optional[str], new: Optional[str]) -> None:
+        if old == new:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(self.languages_key, old or "", -1)
+                pipe.hincrby(self.languages_key, new or "", 1)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Stats: can't count language change: {e}")
+
+    async def get_user_stats(self, max_age: Optional[int] = None) -> UserStats:
+        """
+        Return user counters, reconciling them first when they are older than `max_age`.
+
+        :param max_age: Freshness bound in seconds, `self.max_age` by default. 0 forces reconciliation.
+        :return: User counters.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        stats = await self._read()
+        if stats is not None and stats.synced_at is not None \
+                and time.time() - stats.synced_at.timestamp() < max_age:
+            return stats
+
+        token = uuid.uuid4().hex
+        try:
+            locked = await self.redis.set(self.lock_key, token, nx=True, ex=60)
+        except RedisError as e:
+            logger.warning(f"Stats: Redis is unavailable: {e}")
+            locked = False
+
+        if locked:
+            try:
+                return await self.reconcile()
+            finally:
+                await self.redis.register_script(RELEASE_LOCK_SCRIPT)(keys=[self.lock_key], args=[token])
+
+        # Another process is reconciling
+        if stats is not None:
+            return stats
+        return UserStats(total=await self.estimate_total(), new_today=0, exact=False)
+
+    async def reconcile(self) -> UserStats:
+        """
+        Recount users in the primary database and correct the counters. Runs a full scan,
+        so it is only called once per freshness bound.
+
+        Counters are moved by the difference between the count and their value before the scan
+        rather than overwritten, so users counted by `record_new_user` during the scan are kept.
+        """
+        today = utc_today()
+        new_key = self.new_key(today)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(self.total_key)
+            pipe.get(new_key)
+            pipe.hgetall(self.languages_key)
+            total, new_today, counted = await pipe.execute()
+        counted = {(key.decode() if isinstance(key, bytes) else key): int(value) for key, value in counted.items()}
+
+        # Not on a replica: a lagging one would undercount the users that are already counted
+        async with self.sessionmaker() as session:
+            stmt = (
+                select(
+                    User.language,
+                    func.count(),
+                    func.count().filter(User.created_at >= datetime.combine(today, datetime.min.time())),
+                )
+                .group_by(User.language)
+            )
+            rows = (await session.execute(stmt)).all()
+
+        languages = {language or "": count for language, count, _ in rows}
+        synced_at = datetime.now()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incrby(self.total_key, sum(languages.values()) - int(total or 0))
+            pipe.incrby(new_key, sum(new for _, _, new in rows) - int(new_today or 0))
+            pipe.expire(new_key, 2 * 86400)
+            pipe.set(self.synced_at_key, synced_at.timestamp())
+            for language in languages.keys() | counted.keys():
+                pipe.hincrby(self.languages_key, language, languages.get(language, 0) - counted.get(language, 0))
+            pipe.hgetall(self.languages_key)
+            results = await pipe.execute()
+
+        stats = UserStats(
+            total=results[0],
+            new_today=results[1],
+            languages={
+                (key.decode() if isinstance(key, bytes) else key): int(value)
+                for key, value in results[-1].items()
+                if int(value)
+            },
+            synced_at=synced_at,
+        )
+        logger.info(f"Stats: reconciled, {stats.total} users")
+        return stats
+
+    async def estimate_total(self) -> int:
+        """Planner estimate of the users count, exact count when the table was never analyzed."""
+        async with self.sessionmaker() as session:
+            result = await session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+                {"table": User.__tablename__},
+            )
+            estimate = result.scalar()
+            if estimate is not None and estimate >= 0:
+                return estimate
+
+            result = await session.execute(select(func.count()).select_from(User))
+            return result.scalar()
+
+    async def _read(self) -> Optional[UserStats]:
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(self.total_key)
+                pipe.get(self.new_key(utc_today()))
+                pipe.hgetall(self.languages_key)
+                pipe.get(self.synced_at_key)
+                total, new_today, languages, synced_at = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Stats: Redis is unavailable: {e}")
+            return None
+
+        if total is None:
+            return None
+
+        return UserStats(
+            total=int(total),
+            new_today=int(new_today or 0),
+            languages={
+                (key.decode() if isinstance(key, bytes) else key): int(value)
+                for key, value in languages.items()
+                if int(value)
+            },
+            synced_at=datetime.fromtimestamp(float(synced_at)) if synced_at else None,
+        )
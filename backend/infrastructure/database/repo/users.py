@@ -1,15 +1,24 @@
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 
+from sqlalchemy import func, literal_column
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from infrastructure.api_services.common.cache import AbstractCache
 from infrastructure.database.models import User
 from infrastructure.database.repo.base import BaseRepo
 
 
 class UserRepo(BaseRepo):
-    def __init__(self, sessionmaker: async_sessionmaker):
-        super().__init__(sessionmaker, User)  # noqa
+    entity_cache_ttl = 300
+
+    def __init__(
+            self,
+            sessionmaker: async_sessionmaker,
+            session: Optional[AsyncSession] = None,
+            cache: Optional[AbstractCache] = None,
+    ):
+        super().__init__(sessionmaker, User, session, cache)  # noqa
 
     async def get_or_create(
             self,
@@ -20,7 +29,7 @@ class UserRepo(BaseRepo):
             username: Optional[str] = None,
             **kwargs
     ) -> User:
-        async with self.sessionmaker() as session:
+        async with self._session() as session:
             insert_stmt = (
                 insert(User)
                 .values(
@@ -41,5 +50,62 @@ class UserRepo(BaseRepo):
                 .returning(User)
             )
             result = await session.execute(insert_stmt)
-            await session.commit()
+            await self._commit(session, invalidate=[int(user_id)])
             return result.scalar_one_or_none()
+
+    async def upsert(
+            self,
+            user_id: Union[int, str],
+            first_name: str,
+            last_name: Optional[str],
+            language: str,
+            username: Optional[str] = None,
+    ) -> Tuple[User, bool]:
+        """
+        Same as `get_or_create`, but also tells whether the row was inserted.
+
+        :return: The user and True when the user has just been created.
+        """
+        async with self._session() as session:
+            insert_stmt = (
+                insert(User)
+                .values(
+                    id=int(user_id),
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    language=language,
+                )
+                .on_conflict_do_update(
+                    index_elements=[User.id],
+                    # Called on a cache miss, so the row may hold a profile that changed since
+                    set_=dict(
+                        first_name=first_name,
+                        last_name=last_name,
+                        username=username,
+                        language=language,
+                        updated_at=func.now(),
+                    ),
+                )
+                # xmax is 0 only for rows inserted by this statement, not for updated ones
+                .returning(User, literal_column("xmax = 0").label("created"))
+            )
+            result = await session.execute(insert_stmt)
+            await self._commit(session, invalidate=[int(user_id)])
+            user, created = result.one()
+            return user, created
+
+    async def update_profiles(self, rows: list[dict], batch_size: int = 1000) -> None:
+        """
+        Upsert profile fields (first_name, last_name, username, language) for many users
+        with multi-row statements.
+
+        :param rows: Dicts with `id` and the profile fields.
+        :param batch_size: Rows per statement.
+        """
+        await self.upsert_many(
+            rows,
+            update_fields=("first_name", "last_name", "username", "language"),
+            set_=dict(updated_at=func.now()),
+            batch_size=batch_size,
+        )
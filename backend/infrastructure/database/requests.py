@@ -1,9 +1,15 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
 
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from redis.asyncio.client import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from infrastructure.api_services.common.cache import RedisCache
 from infrastructure.database import setup as database_setup
+from infrastructure.database.repo.entity_cache import discard_pending_invalidations, run_pending_invalidations
+from infrastructure.database.repo.stats import StatsRepo
 from infrastructure.database.repo.users import UserRepo
+from settings import settings
 
 
 @dataclass
@@ -12,19 +18,92 @@ class RequestsRepo:
     Repository for handling database operations. This class holds all the repositories for the database models.
 
     You can add more repositories as properties to this class, so they will be easily accessible.
+
+    With `unit_of_work=True` all repositories share one session, opened on first use, and nothing
+    is committed until `commit()` is called. Used as an async context manager, it commits on
+    success, rolls back on error and closes the session. Without it every repository call runs
+    in its own session and transaction.
     """
 
     sessionmaker: async_sessionmaker
+    redis: Optional[Redis] = None
+    unit_of_work: bool = False
+    _session: Optional[AsyncSession] = field(default=None, init=False, repr=False)
+
+    @property
+    def session(self) -> Optional[AsyncSession]:
+        """
+        Session shared by the repositories in unit of work mode, None otherwise.
+        """
+        if not self.unit_of_work:
+            return None
+        if self._session is None:
+            self._session = self.sessionmaker()
+        return self._session
+
+    @property
+    def cache(self) -> Optional[RedisCache]:
+        """
+        Entity cache storage of the repositories, None without `redis`.
+        """
+        if self.redis is None:
+            return None
+        return RedisCache(self.redis)
 
     @property
     def users(self) -> UserRepo:
         """
         The User repository sessions are required to manage user operations.
         """
-        return UserRepo(self.sessionmaker)
+        return UserRepo(self.sessionmaker, self.session, self.cache)
+
+    @property
+    def stats(self) -> StatsRepo:
+        """
+        The Stats repository keeps user counters in Redis, so it requires `redis`.
+        """
+        if self.redis is None:
+            raise RuntimeError("StatsRepo requires redis")
+        return StatsRepo(self.sessionmaker, self.redis, max_age=settings.misc.stats_max_age)
+
+    async def commit(self) -> None:
+        if self._session is not None:
+            await self._session.commit()
+            # Invalidating before the commit would let a reader cache the old row under the new version
+            await run_pending_invalidations(self._session)
+
+    async def rollback(self) -> None:
+        if self._session is not None:
+            await self._session.rollback()
+            discard_pending_invalidations(self._session)
 
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
-def get_database_repo() -> RequestsRepo:
+    async def __aenter__(self) -> "RequestsRepo":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                await self.rollback()
+        finally:
+            await self.close()
+
+
+async def get_database_repo() -> AsyncIterator[RequestsRepo]:
+    """
+    FastAPI dependency: one unit of work per request, committed after the endpoint returns.
+    """
     if database_setup.async_session is None:
         raise RuntimeError("async_session not initialized")
-    return RequestsRepo(sessionmaker=database_setup.async_session)
+    async with RequestsRepo(
+            sessionmaker=database_setup.async_session,
+            redis=database_setup.redis,
+            unit_of_work=True,
+    ) as repo:
+        yield repo
@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import logging
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+logger = logging.getLogger(__name__)
+
+# Session.info keys
+REPLICAS = "replicas"
+REPLICA = "replica"
+REPLICA_READS = "replica_reads"
+HAS_WRITES = "has_writes"
+
+# Replay lag in seconds, 0 when the replica has replayed everything it received
+REPLICATION_LAG_QUERY = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+""")
+
+
+def is_connection_error(error: Optional[BaseException]) -> bool:
+    """Whether the error means the database can't be reached, rather than that the query is wrong."""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, OSError)
+
+
+class ReplicaPool:
+    """
+    Read replicas picked round-robin.
+
+    A background task measures the replication lag of every replica. Replicas that fail
+    the check, lag more than `max_lag` seconds or raise a connection error on any query
+    are skipped until a later check passes; with no healthy replica reads go to the primary.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float = 5.0, check_interval: float = 10.0) -> None:
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._healthy = {id(engine): True for engine in engines}
+        self._cycle = itertools.cycle(engines)
+        self._task: Optional[asyncio.Task] = None
+
+        for engine in engines:
+            event.listen(engine.sync_engine, "handle_error", self._on_error)
+
+    def start(self) -> None:
+        if self._task is None and self.engines:
+            self._task = asyncio.create_task(self._check_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for engine in self.engines:
+            await engine.dispose()
+
+    def next(self) -> Optional[Engine]:
+        """Next healthy replica, None when there is none."""
+        for _ in range(len(self.engines)):
+            engine = next(self._cycle)
+            if self._healthy[id(engine)]:
+                return engine.sync_engine
+        return None
+
+    async def check(self) -> None:
+        for engine in self.engines:
+            try:
+                async with engine.connect() as connection:
+                    lag = float((await connection.execute(REPLICATION_LAG_QUERY)).scalar() or 0)
+            except Exception as e:
+                self._set_healthy(engine, False, f"check failed: {e}")
+                continue
+
+            if lag > self.max_lag:
+                self._set_healthy(engine, False, f"lag {lag:.1f} sec.")
+            else:
+                self._set_healthy(engine, True)
+
+    async def _check_loop(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or is_connection_error(context.sqlalchemy_exception or context.original_exception):
+            for engine in self.engines:
+                if engine.sync_engine is context.engine:
+                    self._set_healthy(engine, False, f"connection error: {context.original_exception}")
+
+    def _set_healthy(self, engine: AsyncEngine, healthy: bool, reason: str = "") -> None:
+        if self._healthy[id(engine)] == healthy:
+            return
+        self._healthy[id(engine)] = healthy
+        if healthy:
+            logger.info(f"Replica {engine.url.host} is back in rotation")
+        else:
+            logger.warning(f"Replica {engine.url.host} is out of rotation: {reason}")
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to a replica while replica reads are enabled
+    (see `replica_reads`). Everything else goes to the primary. Once the session
+    has written anything, its reads go to the primary too, so a unit of work always
+    sees its own writes. A read that fails on the replica with a connection error is
+    retried once on the primary, which then serves the rest of the session.
+    """
+
+    # Replica the last statement was sent to
+    _replica_bind: Optional[Engine] = None
+
+    def get_bind(self, mapper=None, *, clause=None, **kw: Any):
+        # Raw connections (clause is None) may be used for anything, treat them as writes
+        if self._flushing or not isinstance(clause, Select):
+            self.info[HAS_WRITES] = True
+        elif self.info.get(REPLICA_READS) and not self.info.get(HAS_WRITES):
+            # One replica per session, so its reads see one consistent snapshot.
+            # False: the replica failed, the session reads from the primary
+            replica = self.info.get(REPLICA)
+            if replica is None:
+                replicas: Optional[ReplicaPool] = self.info.get(REPLICAS)
+                replica = self.info[REPLICA] = replicas.next() if replicas is not None else None
+            if replica:
+                self._replica_bind = replica
+                return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def execute(self, statement, params=None, **kw: Any):
+        self._replica_bind = None
+        try:
+            return super().execute(statement, params, **kw)
+        except (DBAPIError, OSError) as e:
+            replica = self._replica_bind
+            if replica is None or not is_connection_error(e):
+                raise
+            logger.warning(f"Read on replica {replica.url.host} failed, retrying on the primary: {e}")
+            self._drop_replica(replica)
+            return super().execute(statement, params, **kw)
+
+    def _drop_replica(self, replica: Engine) -> None:
+        self.info[REPLICA] = False
+        self._replica_bind = None
+        transaction = self.get_transaction()
+        # The failed connection would break the commit of the session
+        entry = transaction._connections.pop(replica, None) if transaction is not None else None
+        if entry is not None:
+            connection = entry[0]
+            transaction._connections.pop(connection, None)
+            connection.close()
+
+
+@contextmanager
+def replica_reads(session: AsyncSession, enabled: bool = True) -> Iterator[AsyncSession]:
+    """
+    Let SELECTs of `session` inside the block go to a replica.
+    Has no effect on sessions that are not RoutingSession.
+    """
+    previous = session.info.get(REPLICA_READS, False)
+    session.info[REPLICA_READS] = enabled
+    try:
+        yield session
+    finally:
+        session.info[REPLICA_READS] = previous
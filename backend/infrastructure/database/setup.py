@@ -1,37 +1,104 @@
 from typing import AsyncGenerator
+from uuid import uuid4
 
 from redis.asyncio import Redis
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
+from infrastructure.database.instrumentation import TimedQueuePool, instrument_engine, observe_pool
+from infrastructure.database.routing import REPLICAS, ReplicaPool, RoutingSession
 from settings.app_settings import AppSettings
 from settings.db_settings import DatabaseSettings
 
 async_session: async_sessionmaker | None = None
 redis: None | Redis = None
+replicas: ReplicaPool | None = None
 
 
-def create_engine(db: DatabaseSettings, echo=False):
+def _prepared_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+def connect_args(db: DatabaseSettings) -> dict:
+    """
+    asyncpg arguments for the prepared statement caches.
+
+    Directly connected, every connection keeps its hot statements prepared. Behind pgbouncer
+    in transaction mode a statement prepared in one transaction may be missing or, worse,
+    be a different statement with the same name on the next server connection, so names
+    are made unique and caching is disabled unless pgbouncer tracks prepared statements.
+    """
+    args = {
+        "prepared_statement_cache_size": db.prepared_statement_cache_size,
+        "statement_cache_size": db.statement_cache_size,
+    }
+    if db.pgbouncer:
+        args["prepared_statement_name_func"] = _prepared_statement_name
+        if not db.pgbouncer_prepared_statements:
+            args["prepared_statement_cache_size"] = 0
+            args["statement_cache_size"] = 0
+    return args
+
+
+def create_engine(db: DatabaseSettings, echo=False, url: str | None = None, name: str = "primary"):
+    """
+    :param url: Database URL, the primary by default.
+    :param name: Engine name in the pool metrics.
+    """
     engine = create_async_engine(
-        db.construct_sqlalchemy_url,
+        url or db.construct_sqlalchemy_url,
         query_cache_size=1200,
-        pool_size=20,
-        max_overflow=200,
+        poolclass=TimedQueuePool,
+        pool_size=db.pool_size,
+        max_overflow=db.max_overflow,
+        pool_timeout=db.pool_timeout,
+        pool_recycle=db.pool_recycle,
+        pool_logging_name=name,
+        connect_args=connect_args(db),
         future=True,
         echo=echo,
     )
-    return engine
+    observe_pool(engine, name)
+    return instrument_engine(engine, db.slow_query_ms, db.n_plus_one_threshold)
+
+
+def create_replica_pool(db: DatabaseSettings) -> ReplicaPool | None:
+    """
+    Create engines of the configured read replicas and start their health checks.
+
+    :return: Replica pool, or None when no replicas are configured.
+    """
+    if not db.replica_dsns:
+        return None
+
+    pool = ReplicaPool(
+        [
+            create_engine(db, url=url, name=f"replica:{make_url(url).host}")
+            for url in db.replica_sqlalchemy_urls
+        ],
+        max_lag=db.replica_max_lag,
+        check_interval=db.replica_check_interval,
+    )
+    pool.start()
+    return pool
 
 
-def create_session_pool(engine):
-    session_pool = async_sessionmaker(bind=engine, expire_on_commit=False)
+def create_session_pool(engine, replica_pool: ReplicaPool | None = None):
+    session_pool = async_sessionmaker(
+        bind=engine,
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        info={REPLICAS: replica_pool},
+    )
     return session_pool
 
 
 def init_database(settings: AppSettings) -> None:
-    global async_session
+    global async_session, replicas
 
     engine = create_engine(settings.postgres)
-    async_session = create_session_pool(engine)
+    replicas = create_replica_pool(settings.postgres)
+    async_session = create_session_pool(engine, replicas)
 
 
 async def get_db() -> AsyncGenerator[None, AsyncSession]:
@@ -0,0 +1,70 @@
+from .instruments import (
+    API_CACHE_REQUESTS,
+    BROADCAST_MESSAGES,
+    DB_N_PLUS_ONE,
+    DB_POOL_CHECKOUT_WAIT,
+    DB_POOL_CONNECTIONS,
+    DB_POOL_TIMEOUTS,
+    DB_QUERIES,
+    DB_QUERY_LATENCY,
+    DB_SLOW_QUERIES,
+    DB_STATEMENT_CALLS,
+    DB_STATEMENT_P95,
+    DB_STATEMENT_SECONDS,
+    ENTITY_CACHE_REQUESTS,
+    HANDLER_LATENCY,
+    HTTP_CLIENT_CIRCUIT_STATE,
+    HTTP_CLIENT_LATENCY,
+    HTTP_CLIENT_REJECTED,
+    HTTP_CLIENT_RETRIES,
+    HTTP_REQUEST_LATENCY,
+    REDIS_COMMAND_LATENCY,
+    REQUEST_QUEUE_DEPTH,
+    REQUEST_QUEUE_JOBS,
+    REQUEST_QUEUE_WAIT,
+    REQUEST_QUEUE_WORKERS,
+    RESPONSE_CACHE_REQUESTS,
+    TIERED_CACHE_REQUESTS,
+    UPDATE_QUEUE_DEPTH,
+    UPDATE_WAIT,
+    USER_CACHE_REQUESTS,
+)
+from .registry import CONTENT_TYPE, Counter, Gauge, Histogram, Registry, registry
+
+__all__ = [
+    "API_CACHE_REQUESTS",
+    "BROADCAST_MESSAGES",
+    "CONTENT_TYPE",
+    "Counter",
+    "DB_N_PLUS_ONE",
+    "DB_POOL_CHECKOUT_WAIT",
+    "DB_POOL_CONNECTIONS",
+    "DB_POOL_TIMEOUTS",
+    "DB_QUERIES",
+    "DB_QUERY_LATENCY",
+    "DB_SLOW_QUERIES",
+    "DB_STATEMENT_CALLS",
+    "DB_STATEMENT_P95",
+    "DB_STATEMENT_SECONDS",
+    "ENTITY_CACHE_REQUESTS",
+    "Gauge",
+    "HANDLER_LATENCY",
+    "HTTP_CLIENT_CIRCUIT_STATE",
+    "HTTP_CLIENT_LATENCY",
+    "HTTP_CLIENT_REJECTED",
+    "HTTP_CLIENT_RETRIES",
+    "HTTP_REQUEST_LATENCY",
+    "Histogram",
+    "REDIS_COMMAND_LATENCY",
+    "REQUEST_QUEUE_DEPTH",
+    "REQUEST_QUEUE_JOBS",
+    "REQUEST_QUEUE_WAIT",
+    "REQUEST_QUEUE_WORKERS",
+    "RESPONSE_CACHE_REQUESTS",
+    "TIERED_CACHE_REQUESTS",
+    "Registry",
+    "UPDATE_QUEUE_DEPTH",
+    "UPDATE_WAIT",
+    "USER_CACHE_REQUESTS",
+    "registry",
+]
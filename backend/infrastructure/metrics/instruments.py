@@ -0,0 +1,152 @@
+from infrastructure.metrics.registry import registry
+
+# Bot
+HANDLER_LATENCY = registry.histogram(
+    "bot_handler_duration_seconds",
+    "Bot handler latency.",
+    ["router", "handler"],
+)
+UPDATE_QUEUE_DEPTH = registry.gauge(
+    "bot_update_queue_depth",
+    "Updates accepted by the update executor and not finished yet.",
+)
+UPDATE_WAIT = registry.histogram(
+    "bot_update_wait_seconds",
+    "Time an update waited in the update executor queue.",
+)
+BROADCAST_MESSAGES = registry.counter(
+    "bot_broadcast_messages_total",
+    "Broadcast sends by result.",
+    ["result"],
+)
+USER_CACHE_REQUESTS = registry.counter(
+    "bot_user_cache_requests_total",
+    "User snapshot cache lookups by result.",
+    ["result"],
+)
+
+# API
+HTTP_REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds",
+    "API request latency.",
+    ["method", "route", "status"],
+)
+HTTP_CLIENT_LATENCY = registry.histogram(
+    "http_client_request_duration_seconds",
+    "Outbound HTTP request latency per attempt.",
+    ["host", "method", "status"],
+)
+HTTP_CLIENT_RETRIES = registry.counter(
+    "http_client_retries_total",
+    "Retried outbound HTTP requests.",
+    ["host"],
+)
+HTTP_CLIENT_REJECTED = registry.counter(
+    "http_client_rejected_total",
+    "Outbound HTTP requests failed fast by an open circuit.",
+    ["host"],
+)
+HTTP_CLIENT_CIRCUIT_STATE = registry.gauge(
+    "http_client_circuit_state",
+    "Circuit breaker state per upstream host: 0 closed, 1 half-open, 2 open.",
+    ["host"],
+)
+RESPONSE_CACHE_REQUESTS = registry.counter(
+    "response_cache_requests_total",
+    "Outbound GET response cache lookups by result: hit, stale, miss, coalesced, lock_wait.",
+    ["result"],
+)
+TIERED_CACHE_REQUESTS = registry.counter(
+    "tiered_cache_requests_total",
+    "Tiered cache lookups by tier (local, redis) and result.",
+    ["tier", "result"],
+)
+REQUEST_QUEUE_DEPTH = registry.gauge(
+    "request_queue_depth",
+    "Outbound requests waiting in the request queue.",
+    ["queue"],
+)
+REQUEST_QUEUE_WORKERS = registry.gauge(
+    "request_queue_workers",
+    "Running request queue workers.",
+    ["queue"],
+)
+REQUEST_QUEUE_WAIT = registry.histogram(
+    "request_queue_wait_seconds",
+    "Time a request waited in the request queue.",
+    ["queue"],
+)
+REQUEST_QUEUE_JOBS = registry.counter(
+    "request_queue_jobs_total",
+    "Request queue jobs by result: done, failed, cancelled, rejected.",
+    ["queue", "result"],
+)
+API_CACHE_REQUESTS = registry.counter(
+    "api_cache_requests_total",
+    "Endpoint cache lookups by result: hit, stale, miss, expired, early_refresh, lock_wait, lock_timeout.",
+    ["result"],
+)
+
+# Database
+DB_QUERIES = registry.counter(
+    "db_queries_total",
+    "Executed SQL statements.",
+    ["operation"],
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency.",
+    ["operation"],
+)
+DB_SLOW_QUERIES = registry.counter(
+    "db_slow_queries_total",
+    "SQL statements slower than the slow query threshold.",
+    ["operation"],
+)
+DB_N_PLUS_ONE = registry.counter(
+    "db_n_plus_one_total",
+    "Handlers or routes that repeated one statement past the N+1 threshold.",
+    ["origin"],
+)
+DB_STATEMENT_CALLS = registry.counter(
+    "db_statement_calls_total",
+    "Executions per statement fingerprint.",
+    ["fingerprint"],
+)
+DB_STATEMENT_SECONDS = registry.counter(
+    "db_statement_seconds_total",
+    "Total execution time per statement fingerprint.",
+    ["fingerprint"],
+)
+DB_STATEMENT_P95 = registry.gauge(
+    "db_statement_p95_seconds",
+    "95th percentile of recent execution times per statement fingerprint.",
+    ["fingerprint"],
+)
+ENTITY_CACHE_REQUESTS = registry.counter(
+    "entity_cache_requests_total",
+    "Entity cache lookups by model and result.",
+    ["model", "result"],
+)
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool.",
+    ["engine"],
+)
+DB_POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total",
+    "Checkouts that gave up after pool_timeout.",
+    ["engine"],
+)
+DB_POOL_CONNECTIONS = registry.gauge(
+    "db_pool_connections",
+    "Pool connections by state: checked_out, idle, overflow; size is the configured pool_size.",
+    ["engine", "state"],
+)
+
+# Redis
+REDIS_COMMAND_LATENCY = registry.histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency.",
+    ["command"],
+)
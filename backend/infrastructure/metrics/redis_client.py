@@ -0,0 +1,29 @@
+import time
+from typing import Any
+
+from redis.asyncio.client import Pipeline, Redis
+
+from infrastructure.metrics.instruments import REDIS_COMMAND_LATENCY
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> Any:
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            REDIS_COMMAND_LATENCY.labels("PIPELINE").observe(time.perf_counter() - start)
+
+
+class InstrumentedRedis(Redis):
+    """Redis client that records command latency."""
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_LATENCY.labels(str(args[0]).upper()).observe(time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Any = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,222 @@
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of metrics rendered in the Prometheus text format."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, values: Tuple[str, ...]) -> LabelValues:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        return tuple(str(value) for value in values)
+
+    def _format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra is not None:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape_help(self.documentation)}",
+            f"# TYPE {self.name} {self.type_name}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class _Child:
+    def __init__(self, metric: "Metric", values: LabelValues) -> None:
+        self._metric = metric
+        self._values = values
+
+
+class _CounterChild(_Child):
+    def inc(self, amount: float = 1.0) -> None:
+        self._metric.inc(amount, *self._values)
+
+
+class _GaugeChild(_Child):
+    def set(self, value: float) -> None:
+        self._metric.set(value, *self._values)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._metric.inc(amount, *self._values)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._metric.inc(-amount, *self._values)
+
+
+class _HistogramChild(_Child):
+    def observe(self, value: float) -> None:
+        self._metric.observe(value, *self._values)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def labels(self, *values: str) -> _CounterChild:
+        return _CounterChild(self, self._label_values(values))
+
+    def inc(self, amount: float = 1.0, *values: str) -> None:
+        key = self._label_values(values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def labels(self, *values: str) -> _GaugeChild:
+        return _GaugeChild(self, self._label_values(values))
+
+    def set(self, value: float, *values: str) -> None:
+        key = self._label_values(values)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, *values: str) -> None:
+        key = self._label_values(values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_function(self, function: Callable[[], float], *values: str) -> None:
+        """Read the value from `function` at scrape time."""
+        key = self._label_values(values)
+        with self._lock:
+            self._functions[key] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = dict(self._values)
+            functions = list(self._functions.items())
+        for key, function in functions:
+            items[key] = function()
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in items.items()]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> (bucket counts, sum, count)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def labels(self, *values: str) -> _HistogramChild:
+        return _HistogramChild(self, self._label_values(values))
+
+    def observe(self, value: float, *values: str) -> None:
+        key = self._label_values(values)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self._format_labels(key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics exposed on /metrics."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
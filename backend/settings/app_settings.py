@@ -5,6 +5,7 @@ from pydantic_settings import SettingsConfigDict, BaseSettings
 
 from settings.bot_settings import BotSettings
 from settings.db_settings import DatabaseSettings, RedisSettings
+from settings.http_settings import HttpClientSettings
 from settings.logging_settings import LoggingSettings
 from settings.miscellaneous_settings import MiscellaneousSettings
 
@@ -25,6 +26,7 @@ class AppSettings(BaseSettings):
     bot: BotSettings
     redis: RedisSettings
     misc: MiscellaneousSettings = Field(default_factory=MiscellaneousSettings)
+    http: HttpClientSettings = Field(default_factory=HttpClientSettings)
 
 
 @lru_cache(maxsize=1)
@@ -8,5 +8,48 @@ class BotSettings(BaseSettings):
     )
     token: str = Field(default="")
     admin_ids: list[int] = Field(default=[])
-    use_redis: str = Field(default=True)
+    use_redis: bool = Field(default=True)
     channel_id: int | None = Field(default=None)
+
+    # FSM storage (Redis only). Abandoned states expire after the TTL
+    fsm_state_ttl: int | None = Field(default=86400)
+    fsm_data_ttl: int | None = Field(default=86400)
+
+    # User snapshot cache
+    user_cache_size: int = Field(default=10000)
+    user_cache_ttl: int = Field(default=3600)
+    user_flush_interval: float = Field(default=5.0)
+    user_flush_batch_size: int = Field(default=500)
+
+    # Broadcaster
+    broadcast_concurrency: int = Field(default=25)
+    broadcast_chunk_size: int = Field(default=100)
+    broadcast_lease_ttl: int = Field(default=60)
+
+    # Webhook mode. Long polling is used when disabled. The secret is required in webhook mode
+    use_webhook: bool = Field(default=False)
+    webhook_url: str = Field(default="")
+    webhook_path: str = Field(default="/bot/webhook")
+    webhook_secret: str = Field(default="")
+    webhook_host: str = Field(default="0.0.0.0")
+    webhook_port: int = Field(default=8080)
+    webhook_max_in_flight: int = Field(default=100)
+    webhook_max_connections: int = Field(default=40)
+
+    # Update executor: updates of one chat run in order, of different chats in parallel
+    updates_concurrency: int = Field(default=64)
+    updates_queue_size: int = Field(default=1000)
+
+    # Outgoing Bot API requests. Limits are per process, divide them by the number of replicas
+    api_rate: float = Field(default=30.0)
+    api_chat_interval: float = Field(default=1.0)
+    api_group_interval: float = Field(default=3.0)
+    api_chat_burst: int = Field(default=3)
+    api_max_retries: int = Field(default=3)
+
+    # Scheduler: jobs are stored in Redis, only the instance holding the lease runs them
+    scheduler_leader_ttl: int = Field(default=30)
+
+    # Prometheus /metrics of the bot process, 0 disables it
+    metrics_host: str = Field(default="0.0.0.0")
+    metrics_port: int = Field(default=9100)
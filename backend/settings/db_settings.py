@@ -1,7 +1,7 @@
 from pydantic import Field, RedisDsn
 from pydantic_settings import BaseSettings
 
-from sqlalchemy.engine.url import URL
+from sqlalchemy.engine.url import URL, make_url
 
 
 class DatabaseSettings(BaseSettings):
@@ -10,6 +10,34 @@ class DatabaseSettings(BaseSettings):
     db_user: str
     db_name: str
     db_port: int = Field(default=5432)
+    # Read replicas as postgresql:// DSNs, JSON list in env: POSTGRES__REPLICA_DSNS='["postgresql://..."]'
+    replica_dsns: list[str] = Field(default=[])
+    replica_max_lag: float = Field(default=5.0)
+    replica_check_interval: float = Field(default=10.0)
+    # Statements slower than this are logged with the handler or route that ran them
+    slow_query_ms: float = Field(default=200.0)
+    # Executions of one statement per update or request that are reported as a likely N+1
+    n_plus_one_threshold: int = Field(default=10)
+    # Connections per process: pool_size kept open plus up to max_overflow on bursts.
+    # Every running update holds a session until its handler returns, so keep
+    # pool_size + max_overflow >= BOT__UPDATES_CONCURRENCY. Connected directly, keep
+    # (pool_size + max_overflow) * processes below the server max_connections; behind
+    # pgbouncer that sum only has to fit max_client_conn, and the server connections are
+    # bounded by its default_pool_size, which should be about the number of CPU cores
+    # of the database times 2-4
+    pool_size: int = Field(default=20)
+    max_overflow: int = Field(default=200)
+    pool_timeout: float = Field(default=30.0)
+    pool_recycle: int = Field(default=1800)
+    # Prepared statements kept per connection by SQLAlchemy and by asyncpg
+    prepared_statement_cache_size: int = Field(default=256)
+    statement_cache_size: int = Field(default=100)
+    # Connect through pgbouncer in transaction mode: prepared statements get unique names
+    # and are not cached, since the next transaction may run on another server connection
+    pgbouncer: bool = Field(default=False)
+    # pgbouncer >= 1.21 with max_prepared_statements > 0 tracks prepared statements itself,
+    # so the statement caches stay enabled in pgbouncer mode
+    pgbouncer_prepared_statements: bool = Field(default=False)
 
     # For SQLAlchemy
     @property
@@ -28,6 +56,13 @@ class DatabaseSettings(BaseSettings):
         )
         return uri.render_as_string(hide_password=False)
 
+    @property
+    def replica_sqlalchemy_urls(self) -> list[str]:
+        return [
+            make_url(dsn).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+            for dsn in self.replica_dsns
+        ]
+
 
 class RedisSettings(BaseSettings):
     redis_host: str = Field(default="localhost")
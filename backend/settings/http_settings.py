@@ -0,0 +1,29 @@
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+
+class HttpClientSettings(BaseSettings):
+    # Connections per upstream host; idle ones are kept alive for keepalive_expiry seconds
+    max_connections: int = Field(default=100)
+    max_keepalive_connections: int = Field(default=20)
+    keepalive_expiry: float = Field(default=30.0)
+    connect_timeout: float = Field(default=5.0)
+    # Default read/write/pool timeout of a request
+    timeout: float = Field(default=30.0)
+    # Retries of idempotent requests, with jittered exponential backoff
+    retries: int = Field(default=2)
+    retry_backoff: float = Field(default=0.2)
+    retry_backoff_max: float = Field(default=5.0)
+    # Consecutive failures that open the circuit of a host, and seconds until a trial request
+    breaker_failure_threshold: int = Field(default=5)
+    breaker_reset_timeout: float = Field(default=30.0)
+    # Seconds a cached GET response is served stale while it is refreshed
+    cache_stale_ttl: int = Field(default=300)
+    # Seconds other replicas wait for the one fetching an uncached response
+    cache_lock_timeout: float = Field(default=10.0)
+    # Background request queue: jobs waiting at most, and workers scaled with the queue depth
+    queue_maxsize: int = Field(default=1000)
+    queue_min_workers: int = Field(default=1)
+    queue_max_workers: int = Field(default=10)
+    # Seconds an extra worker stays idle before it stops
+    queue_worker_idle_timeout: float = Field(default=30.0)
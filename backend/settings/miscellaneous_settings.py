@@ -1,5 +1,7 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 
 
 class MiscellaneousSettings(BaseSettings):
-    pass
+    # Seconds after which user counters are reconciled with the database
+    stats_max_age: int = Field(default=3600)
@@ -0,0 +1,65 @@
+import os
+import time
+
+# Settings are read on import, before any test module is collected
+for name, value in {
+    "BOT__TOKEN": "123456:TEST",
+    "BOT__ADMIN_IDS": "[1]",
+    "BOT__CHANNEL_ID": "1",
+    "POSTGRES__DB_USER": "postgres",
+    "POSTGRES__DB_NAME": "postgres",
+    "POSTGRES__DB_PASSWORD": "postgres",
+    "POSTGRES__DB_HOST": "localhost",
+    "REDIS__REDIS_HOST": "localhost",
+    "LOGGING__LOGGING_LEVEL": "INFO",
+}.items():
+    os.environ.setdefault(name, value)
+
+import aiosqlite  # noqa: E402
+import pytest  # noqa: E402
+from fakeredis import FakeAsyncRedis, FakeServer  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from infrastructure.database.models.base import Base  # noqa: E402
+
+
+@pytest.fixture
+def redis_server() -> FakeServer:
+    return FakeServer()
+
+
+@pytest.fixture
+async def redis(redis_server: FakeServer) -> FakeAsyncRedis:
+    client = FakeAsyncRedis(server=redis_server)
+    yield client
+    await client.close()
+
+
+async def copy_records_to_table(self, table_name, *, records, columns):
+    # asyncpg COPY stand-in for SQLite
+    placeholders = ", ".join("?" * len(columns))
+    await self.executemany(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})", records)
+
+
+@pytest.fixture
+async def sessionmaker(monkeypatch):
+    monkeypatch.setattr(aiosqlite.Connection, "copy_records_to_table", copy_records_to_table, raising=False)
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def host_timezone():
+    # The app host is not in the time zone of the database (SQLite's now() is UTC)
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Tokyo"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
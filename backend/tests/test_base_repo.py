@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import DateTime, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import Cast
+
+from infrastructure.database.models.users import User
+from infrastructure.database.repo.base import BaseRepo, decode_cursor, encode_cursor
+
+
+@compiles(Cast, "sqlite")
+def _cast(cast, compiler, **kw):
+    # SQLite casts to DATETIME with NUMERIC affinity, while CURRENT_TIMESTAMP already is the text DateTime reads
+    if isinstance(cast.type, DateTime):
+        return compiler.process(cast.clause, **kw)
+    return compiler.visit_cast(cast, **kw)
+
+
+async def test_copy_many_takes_timestamps_from_the_database(sessionmaker, host_timezone):
+    repo = BaseRepo(sessionmaker, User)
+
+    result = await repo.copy_many(({"id": i, "username": f"user{i}"} for i in range(5)), batch_size=2)
+
+    assert (result.rows, result.batches) == (5, 3)
+    async with sessionmaker() as session:
+        users = (await session.scalars(select(User).order_by(User.id))).all()
+    assert [user.username for user in users] == [f"user{i}" for i in range(5)]
+    # One value per load, the database's now() rather than the local time of the app host
+    assert len({(user.created_at, user.updated_at) for user in users}) == 1
+    assert users[0].created_at == users[0].updated_at
+    assert abs(users[0].created_at - datetime.now(timezone.utc).replace(tzinfo=None)) < timedelta(minutes=1)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+async def test_get_page_walks_all_rows_once(sessionmaker):
+    start = datetime(2024, 1, 1)
+    async with sessionmaker() as session:
+        # Pairs of rows share created_at, so pages also break ties by id
+        session.add_all(User(id=i, created_at=start + timedelta(seconds=i // 2)) for i in range(1, 12))
+        await session.commit()
+    repo = BaseRepo(sessionmaker, User)
+
+    pages, cursor = [], None
+    while True:
+        page = await repo.get_page(limit=3, cursor=cursor)
+        pages.append([user.id for user in page.items])
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+
+    assert pages == [[11, 10, 9], [8, 7, 6], [5, 4, 3], [2, 1]]
+
+
+async def test_get_records_shares_the_cursor_of_get_page(sessionmaker):
+    start = datetime(2024, 1, 1)
+    async with sessionmaker() as session:
+        session.add_all(
+            User(id=i, username=f"user{i}", created_at=start + timedelta(seconds=i // 2)) for i in range(1, 6)
+        )
+        await session.commit()
+    repo = BaseRepo(sessionmaker, User)
+
+    first = await repo.get_records(limit=2, columns=["id", "username"])
+    assert [(record.id, record.username) for record in first.items] == [(5, "user5"), (4, "user4")]
+    assert first.next_cursor == (await repo.get_page(limit=2)).next_cursor
+
+    rest = await repo.get_records(limit=10, cursor=first.next_cursor, columns=["id"])
+    assert [record.id for record in rest.items] == [3, 2, 1]
+    assert rest.next_cursor is None
+    with pytest.raises(ValueError):
+        await repo.get_records(cursor="not a cursor")
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from services.broadcast_jobs import BroadcastJobRunner, BroadcastJobStore
+
+
+class FakeBot:
+    def __init__(self, hold: float = 0) -> None:
+        self.hold = hold
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.hold:
+            # The session middleware holds the chat after TelegramRetryAfter and retries
+            hold, self.hold = self.hold, 0
+            await asyncio.sleep(hold)
+        self.sent.append(chat_id)
+
+
+@pytest.fixture
+def store(redis):
+    return BroadcastJobStore(redis, chunk_size=3, lease_ttl=1)
+
+
+async def test_chunks_are_claimed_once(store):
+    job_id = await store.create_job(range(7), "hello")
+
+    chunks = []
+    while (chunk := await store.claim_chunk(job_id)) is not None:
+        chunks.append(chunk)
+
+    assert chunks == [(0, ["0", "1", "2"]), (3, ["3", "4", "5"]), (6, ["6"])]
+
+
+async def test_expired_chunk_is_resumed_without_processed_recipients(store):
+    job_id = await store.create_job(range(3), "hello")
+    start, recipients = await store.claim_chunk(job_id)
+    await store.mark(job_id, start, recipients[0], success=True)
+
+    # The replica that claimed the chunk died
+    await asyncio.sleep(1.1)
+
+    assert await store.claim_chunk(job_id) == (0, ["1", "2"])
+
+
+async def test_failed_create_job_leaves_nothing(store, redis):
+    async def recipients():
+        yield 1
+        raise RuntimeError("database went away")
+
+    with pytest.raises(RuntimeError):
+        await store.create_job(recipients(), "hello", batch_size=1)
+
+    assert await store.active_jobs() == []
+    assert not await redis.exists(store._key("1", "recipients"), store._key("1"))
+
+
+async def test_runner_sends_job_and_finishes_it(store):
+    bot = FakeBot()
+    job_id = await store.create_job(range(5), "hello")
+
+    await BroadcastJobRunner(bot, store).process_job(job_id)
+
+    assert sorted(bot.sent) == ["0", "1", "2", "3", "4"]
+    status = await store.get_status(job_id)
+    assert (status.status, status.sent) == ("done", 5)
+
+
+async def test_lease_is_renewed_during_retry_after_pause(store):
+    bot = FakeBot(hold=2)
+    job_id = await store.create_job([1], "hello")
+    task = asyncio.create_task(BroadcastJobRunner(bot, store).process_job(job_id))
+
+    await asyncio.sleep(1.5)
+    # Another replica must not take over the paused chunk
+    assert await store.claim_chunk(job_id) is None
+    await task
+    assert bot.sent == ["1"]
+
+
+async def test_runner_survives_broken_job(store, redis):
+    job_id = await store.create_job([1], "hello")
+    await redis.hdel(store._key(job_id), "text")
+    runner = BroadcastJobRunner(FakeBot(), store, poll_interval=0.05)
+
+    runner.start()
+    await asyncio.sleep(0.1)
+    assert runner._task is not None and not runner._task.done()
+    await runner.close()
+
+    assert (await store.get_status(job_id)).status == "failed"
@@ -0,0 +1,69 @@
+import asyncio
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from infrastructure.metrics import BROADCAST_MESSAGES
+from services.broadcaster import Broadcaster, get_broadcaster
+from services.request_scheduler import RequestScheduler
+
+
+class SlowBot:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+
+def test_one_broadcaster_per_bot():
+    bot = SlowBot()
+
+    assert get_broadcaster(bot) is get_broadcaster(bot)
+    assert get_broadcaster(bot) is not get_broadcaster(SlowBot())
+
+
+async def test_concurrency_is_bounded_across_runs():
+    bot = SlowBot()
+    broadcaster = Broadcaster(bot, concurrency=3)
+
+    results = await asyncio.gather(
+        broadcaster.run(range(10), "first"),
+        broadcaster.run(range(5), "second"),
+        broadcaster.send(1, "single"),
+    )
+
+    assert results == [10, 5, True]
+    assert bot.max_in_flight == 3
+    assert broadcaster.sent == 16
+
+
+class FloodedBot:
+    """Sends through the session middleware, the first request hits the flood limit."""
+
+    def __init__(self) -> None:
+        self.scheduler = RequestScheduler(rate=100, chat_interval=0)
+        self.flooded = False
+
+    async def make_request(self, bot, method):
+        if not self.flooded:
+            self.flooded = True
+            raise TelegramRetryAfter(method, "Flood control", 0)
+        return True
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self.scheduler(self.make_request, self, SendMessage(chat_id=chat_id, text=text))
+
+
+async def test_retries_are_counted():
+    broadcaster = Broadcaster(FloodedBot(), concurrency=2)
+    retries = BROADCAST_MESSAGES._values.get(("retry",), 0)
+
+    assert await broadcaster.run(range(3), "hello") == 3
+
+    assert broadcaster.retries == 1
+    assert BROADCAST_MESSAGES._values[("retry",)] == retries + 1
@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi_cache import FastAPICache
+from fastapi_cache.decorator import cache
+
+from infrastructure.api_services.common.cache_backend import StampedeProtectedBackend
+
+
+@pytest.fixture
+def backend(redis):
+    return StampedeProtectedBackend(redis, lock_timeout=30, lock_wait=5)
+
+
+async def test_lock_of_failed_recompute_is_released(backend, redis):
+    async with backend.recompute_scope():
+        assert await backend.get_with_ttl("key") == (0, None)
+        # The endpoint raised, `set` is never called
+
+    other_replica = StampedeProtectedBackend(redis, lock_timeout=30, lock_wait=5)
+    start = time.monotonic()
+    assert await other_replica.get_with_ttl("key") == (0, None)
+    assert time.monotonic() - start < 1
+
+
+async def test_stored_value_is_served(backend, redis):
+    async with backend.recompute_scope():
+        assert await backend.get_with_ttl("key") == (0, None)
+        await backend.set("key", b"value", expire=60)
+
+    ttl, value = await backend.get_with_ttl("key")
+    assert value == b"value" and 0 < ttl <= 60
+    assert not await redis.exists("key:lock")
+
+
+async def test_set_releases_only_its_own_lock(redis):
+    backend = StampedeProtectedBackend(redis, lock_wait=0.1)
+    recomputed = asyncio.Event()
+
+    async def recompute():
+        async with backend.recompute_scope():
+            assert await backend.get_with_ttl("key") == (0, None)
+            await recomputed.wait()
+            await backend.set("key", b"slow", expire=60)
+
+    async def give_up_waiting():
+        async with backend.recompute_scope():
+            assert await backend.get_with_ttl("key") == (0, None)
+            await backend.set("key", b"fast", expire=60)
+
+    slow = asyncio.create_task(recompute())
+    await asyncio.sleep(0)
+    await give_up_waiting()
+    # The lock of the recomputing request is still held
+    assert await redis.exists("key:lock")
+
+    recomputed.set()
+    await slow
+    assert not await redis.exists("key:lock")
+
+
+async def test_entry_without_expiry_is_not_cached_by_clients(backend):
+    assert await backend.get_with_ttl("key") == (0, None)
+    await backend.set("key", b"value")
+
+    assert await backend.get_with_ttl("key") == (0, b"value")
+
+
+async def test_failing_endpoint_releases_the_lock(backend, redis):
+    FastAPICache.init(backend, prefix="test")
+    app = FastAPI()
+    calls = []
+
+    @app.middleware("http")
+    async def release_cache_locks(request: Request, call_next):
+        async with FastAPICache.get_backend().recompute_scope():
+            return await call_next(request)
+
+    @app.get("/flaky")
+    @cache(expire=60)
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise HTTPException(503)
+        return {"ok": True}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        assert (await client.get("/flaky")).status_code == 503
+        start = time.monotonic()
+        assert (await client.get("/flaky")).json() == {"ok": True}
+        assert time.monotonic() - start < 1
+    assert not await redis.keys("*:lock")
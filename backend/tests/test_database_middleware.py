@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+
+from infrastructure.database.models import User
+from middlewares.database import DatabaseMiddleware
+
+
+class FakeUserCache:
+    async def get_user(self, user_id, **kwargs):
+        return SimpleNamespace(id=user_id)
+
+
+@pytest.fixture
+def opened(sessionmaker):
+    """Sessions opened by the middleware and the unit of work calls made on them."""
+    sessions, calls = [], []
+
+    def open_session():
+        session = sessionmaker()
+        for name in ("commit", "rollback", "close"):
+            method = getattr(session, name)
+
+            async def record(method=method, name=name):
+                calls.append(name)
+                await method()
+
+            setattr(session, name, record)
+        sessions.append(session)
+        return session
+
+    return SimpleNamespace(sessions=sessions, open=open_session, calls=calls)
+
+
+@pytest.fixture
+def middleware(opened, redis):
+    return DatabaseMiddleware(opened.open, redis, FakeUserCache())
+
+
+@pytest.fixture
+def message():
+    return SimpleNamespace(from_user=SimpleNamespace(
+        id=1, first_name="John", last_name=None, language_code="en", username=None,
+    ))
+
+
+async def test_update_without_database_opens_no_session(middleware, opened, message):
+    async def handler(event, data):
+        assert data["user"].id == 1
+        return "handled"
+
+    assert await middleware(handler, message, {}) == "handled"
+    assert opened.sessions == []
+    assert opened.calls == []
+
+
+async def test_handler_error_rolls_back(middleware, opened, message, sessionmaker):
+    async def handler(event, data):
+        data["session"].add(User(id=1, first_name="John"))
+        await data["session"].flush()
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await middleware(handler, message, {})
+
+    assert len(opened.sessions) == 1
+    assert opened.calls == ["rollback", "close"]
+    async with sessionmaker() as session:
+        assert await session.scalar(select(func.count()).select_from(User)) == 0
+
+
+async def test_handler_writes_are_committed(middleware, opened, message, sessionmaker):
+    async def handler(event, data):
+        data["session"].add(User(id=1, first_name="John"))
+
+    await middleware(handler, message, {})
+
+    assert opened.calls == ["commit", "close"]
+    async with sessionmaker() as session:
+        assert await session.scalar(select(func.count()).select_from(User)) == 1
@@ -0,0 +1,62 @@
+import pytest
+
+from infrastructure.api_services.common.cache import RedisCache
+from infrastructure.database.models import User
+from infrastructure.database.requests import RequestsRepo
+from infrastructure.database.repo.users import UserRepo
+
+
+@pytest.fixture
+async def users(sessionmaker, redis):
+    async with sessionmaker() as session:
+        session.add_all([User(id=1, username="old"), User(id=2, username="other")])
+        await session.commit()
+    return UserRepo(sessionmaker, cache=RedisCache(redis))
+
+
+async def test_read_after_commit_misses(users, sessionmaker, redis):
+    assert (await users.get(1)).username == "old"
+
+    async with RequestsRepo(sessionmaker, redis, unit_of_work=True) as repo:
+        await repo.users.update(1, username="new")
+        # The unit of work reads its own write, everybody else the committed row
+        assert (await repo.users.get(1)).username == "new"
+        assert (await users.get(1)).username == "old"
+
+    assert (await users.get(1)).username == "new"
+    assert users.entity_cache.misses == 2
+
+
+async def test_rollback_keeps_the_entry(users, sessionmaker, redis):
+    await users.get(1)
+
+    repo = RequestsRepo(sessionmaker, redis, unit_of_work=True)
+    await repo.users.update(1, username="new")
+    await repo.rollback()
+    await repo.close()
+
+    assert await redis.get(users.entity_cache._version_key(1)) is None
+    assert (await users.get(1)).username == "old"
+    assert (users.entity_cache.hits, users.entity_cache.misses) == (1, 1)
+
+
+async def test_insert_evicts_the_negative_entry(users):
+    assert await users.get(3) is None
+    assert await users.get(3) is None
+    assert users.entity_cache.hits == 1
+
+    await users.create(id=3, username="created")
+
+    assert (await users.get(3)).username == "created"
+
+
+async def test_generation_bump_invalidates_the_table(users, redis):
+    await users.get(1)
+    await users.get(2)
+
+    await users.delete_all()
+
+    assert int(await redis.get(users.entity_cache._generation_key())) == 1
+    assert await users.get(1) is None
+    assert await users.get(2) is None
+    assert users.entity_cache.hits == 0
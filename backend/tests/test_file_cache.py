@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import FSInputFile
+
+from utils.file_cache import FileIdCache
+
+
+class FakeMessage:
+    """Records what `answer_photo` was sent with; uploads get a new file_id each."""
+
+    def __init__(self, rejected=()):
+        self.sent = []
+        self.rejected = set(rejected)
+
+    async def answer_photo(self, photo, **kwargs):
+        self.sent.append(photo)
+        if isinstance(photo, FSInputFile):
+            return SimpleNamespace(photo=[SimpleNamespace(file_id=f"uploaded-{len(self.sent)}")])
+        if photo in self.rejected:
+            raise TelegramBadRequest(SendPhoto(chat_id=1, photo=photo), "Bad Request: wrong file identifier")
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=photo)])
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(b"png")
+    return str(path)
+
+
+async def test_file_id_is_reused(redis, photo):
+    message = FakeMessage()
+    await FileIdCache(redis).answer_photo(message, photo)
+    # Another instance finds the id in Redis
+    await FileIdCache(redis).answer_photo(message, photo)
+
+    assert isinstance(message.sent[0], FSInputFile)
+    assert message.sent[1] == "uploaded-1"
+
+
+async def test_edited_file_is_uploaded_again(redis, photo):
+    cache, message = FileIdCache(redis), FakeMessage()
+    await cache.answer_photo(message, photo)
+
+    with open(photo, "ab") as file:
+        file.write(b" edited")
+    await cache.answer_photo(message, photo)
+
+    assert all(isinstance(sent, FSInputFile) for sent in message.sent)
+
+
+async def test_rejected_file_id_is_replaced(redis, photo):
+    cache = FileIdCache(redis)
+    await cache.answer_photo(FakeMessage(), photo)
+
+    message = FakeMessage(rejected={"uploaded-1"})
+    await cache.answer_photo(message, photo)
+    assert message.sent[0] == "uploaded-1"
+    assert isinstance(message.sent[1], FSInputFile)
+
+    # The new id replaced the stale one, in Redis too
+    message = FakeMessage()
+    await FileIdCache(redis).answer_photo(message, photo)
+    assert message.sent == ["uploaded-2"]
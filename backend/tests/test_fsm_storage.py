@@ -0,0 +1,74 @@
+import asyncio
+
+from aiogram.fsm.storage.base import StorageKey
+from fakeredis import FakeAsyncRedis
+
+from services.fsm_storage import PipelinedRedisStorage
+
+KEY = StorageKey(bot_id=1, chat_id=1, user_id=1)
+
+
+async def test_replicas_see_each_others_writes(redis, redis_server):
+    other_redis = FakeAsyncRedis(server=redis_server)
+    first, second = PipelinedRedisStorage(redis), PipelinedRedisStorage(other_redis)
+    await first.set_state(KEY, "Form:name")
+    await first.set_data(KEY, {"step": 1})
+
+    # Update 1 lands on the first replica
+    assert await first.get_state(KEY) == "Form:name"
+    assert await first.get_data(KEY) == {"step": 1}
+
+    # Update 2 on the second one
+    assert await second.get_state(KEY) == "Form:name"
+    await second.set_state(KEY, "Form:age")
+    await second.set_data(KEY, {"step": 2})
+
+    # Update 3 back on the first one
+    assert await first.get_state(KEY) == "Form:age"
+    assert await first.get_data(KEY) == {"step": 2}
+    await other_redis.close()
+
+
+async def test_prefetched_data_is_scoped_to_the_update(redis, redis_server):
+    other_redis = FakeAsyncRedis(server=redis_server)
+    storage, other = PipelinedRedisStorage(redis), PipelinedRedisStorage(other_redis)
+    await storage.set_data(KEY, {"step": 1})
+
+    # An update reads the state and doesn't need the data
+    await asyncio.create_task(storage.get_state(KEY))
+    # Another replica writes
+    await other.set_data(KEY, {"step": 2})
+
+    # The next update on this replica
+    assert await asyncio.create_task(storage.get_data(KEY)) == {"step": 2}
+    await other_redis.close()
+
+
+async def test_prefetched_data_is_used_once(redis, monkeypatch):
+    storage = PipelinedRedisStorage(redis)
+    await storage.set_data(KEY, {"step": 1})
+    reads = []
+    get = redis.get
+
+    async def counting_get(name):
+        reads.append(name)
+        return await get(name)
+
+    monkeypatch.setattr(redis, "get", counting_get)
+
+    await storage.get_state(KEY)
+    assert await storage.get_data(KEY) == {"step": 1}
+    assert not reads
+
+    assert await storage.get_data(KEY) == {"step": 1}
+    assert reads == [storage.key_builder.build(KEY, "data")]
+
+
+async def test_write_drops_prefetched_data(redis):
+    storage = PipelinedRedisStorage(redis)
+    await storage.set_data(KEY, {"step": 1})
+    await storage.get_state(KEY)
+
+    await storage.set_data(KEY, {"step": 2})
+
+    assert await storage.get_data(KEY) == {"step": 2}
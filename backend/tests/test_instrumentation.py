@@ -0,0 +1,28 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from infrastructure.database.instrumentation import QueryInstrumentation, fingerprint
+from infrastructure.metrics import DB_STATEMENT_CALLS
+
+
+def test_fingerprint_ignores_literals_and_list_lengths():
+    assert fingerprint("SELECT * FROM users WHERE id IN (1, 2, 3) AND name = 'x'") == \
+        fingerprint("SELECT * FROM users WHERE id IN (4) AND name = 'y'")
+
+
+async def test_metric_labels_are_bounded():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    instrumentation = QueryInstrumentation(max_exported_fingerprints=2)
+    instrumentation.attach(engine)
+
+    async with engine.connect() as connection:
+        for statement in ["SELECT 1", "SELECT 1, 2", "SELECT 1, 2, 3", "SELECT 1, 2, 3, 4"]:
+            await connection.execute(text(statement))
+    await engine.dispose()
+
+    labels = sorted(stats.label for stats in instrumentation.statements.values())
+    assert labels.count("other") == 2
+    assert all(len(label) == 12 for label in labels if label != "other")
+    rendered = DB_STATEMENT_CALLS.render()
+    assert 'fingerprint="other"' in rendered
+    assert "statement=" not in rendered
@@ -0,0 +1,26 @@
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from middlewares.database import LazyResource
+
+
+async def test_session_is_created_on_first_use_only():
+    created = []
+    resource = LazyResource(lambda: created.append(1) or object())
+
+    assert not resource.created
+    assert created == []
+
+
+async def test_proxy_behaves_like_the_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    sessionmaker = async_sessionmaker(engine)
+    session = LazyResource(sessionmaker)
+
+    assert isinstance(session, AsyncSession)
+    session.info["origin"] = "handler"
+    session.autoflush = False
+    async with session as real_session:
+        assert real_session is session.instance
+        assert real_session.info == {"origin": "handler"}
+        assert real_session.autoflush is False
+    await engine.dispose()
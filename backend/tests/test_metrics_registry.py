@@ -0,0 +1,85 @@
+import pytest
+
+from infrastructure.metrics.registry import Registry
+
+
+def test_label_values_and_help_are_escaped():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests of C:\\path\nby \"path\".", ["path"])
+
+    counter.labels('a"b\\c\nd').inc()
+
+    assert registry.render() == (
+        '# HELP requests_total Requests of C:\\\\path\\nby "path".\n'
+        "# TYPE requests_total counter\n"
+        'requests_total{path="a\\"b\\\\c\\nd"} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("wait_seconds", "Wait.", buckets=[0.1, 1.0])
+
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.samples() == [
+        'wait_seconds_bucket{le="0.1"} 2',
+        'wait_seconds_bucket{le="1"} 3',
+        'wait_seconds_bucket{le="+Inf"} 4',
+        "wait_seconds_sum 3.65",
+        "wait_seconds_count 4",
+    ]
+
+
+def test_histogram_le_follows_the_other_labels():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency.", ["route"], buckets=[1.0])
+
+    histogram.labels("/ping").observe(2)
+
+    assert histogram.samples()[0] == 'latency_seconds_bucket{route="/ping",le="1"} 0'
+    assert histogram.samples()[1] == 'latency_seconds_bucket{route="/ping",le="+Inf"} 1'
+
+
+def test_label_count_must_match():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events.", ["kind", "result"])
+
+    with pytest.raises(ValueError):
+        counter.labels("only_kind")
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_one_series_per_label_combination():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events.", ["kind"])
+
+    for kind in ("a", "b", "a", 1, "1"):
+        counter.labels(kind).inc()
+
+    assert sorted(counter.samples()) == [
+        'events_total{kind="1"} 2',
+        'events_total{kind="a"} 2',
+        'events_total{kind="b"} 1',
+    ]
+
+
+def test_gauge_functions_are_read_at_scrape_time():
+    registry = Registry()
+    gauge = registry.gauge("depth", "Depth.")
+    depth = [1]
+    gauge.set_function(lambda: depth[0])
+
+    depth[0] = 7
+
+    assert gauge.samples() == ["depth 7"]
+
+
+def test_metric_names_are_unique():
+    registry = Registry()
+    registry.counter("events_total", "Events.")
+
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events.")
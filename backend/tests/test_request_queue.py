@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+import pytest
+
+from infrastructure.api_services.common import request as request_module
+from infrastructure.api_services.common.exceptions import CircuitOpenError, RequestQueueFull
+from infrastructure.api_services.common.request import PRIORITY_HIGH, PRIORITY_LOW, RequestQueue, make_request
+
+
+class FakeClients:
+    def __init__(self, handler) -> None:
+        self.handler = handler
+        self.routes = []
+
+    async def request(self, method, base_url, route, **kwargs) -> httpx.Response:
+        self.routes.append(route)
+        return await self.handler(httpx.Request(method, f"{base_url}/{route}"))
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    def install(handler) -> FakeClients:
+        clients = FakeClients(handler)
+        monkeypatch.setattr(request_module, "get_http_clients", lambda: clients)
+        return clients
+    return install
+
+
+async def test_future_carries_transport_error(upstream):
+    async def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    upstream(handler)
+    queue = RequestQueue(min_workers=1, max_workers=1)
+    try:
+        future = await queue.submit("GET", "users", "upstream", "80")
+        with pytest.raises(httpx.ConnectError):
+            await future
+    finally:
+        await queue.stop()
+
+
+async def test_future_carries_status_and_circuit_errors(upstream):
+    async def handler(request):
+        if request.url.path == "/open":
+            raise CircuitOpenError("http://upstream:80", 5.0)
+        return httpx.Response(500, request=request)
+
+    upstream(handler)
+    queue = RequestQueue(min_workers=1, max_workers=1)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            await queue.request("GET", "broken", "upstream", "80")
+        with pytest.raises(CircuitOpenError):
+            await queue.request("GET", "open", "upstream", "80")
+    finally:
+        await queue.stop()
+
+
+async def test_make_request_returns_none_on_error_by_default(upstream):
+    async def handler(request):
+        return httpx.Response(503, request=request)
+
+    upstream(handler)
+    assert await make_request("GET", "users", "upstream", "80") is None
+    with pytest.raises(httpx.HTTPStatusError):
+        await make_request("GET", "users", "upstream", "80", raise_errors=True)
+
+
+async def test_not_found_is_a_result(upstream):
+    async def handler(request):
+        return httpx.Response(404, request=request)
+
+    upstream(handler)
+    queue = RequestQueue(min_workers=1, max_workers=1)
+    try:
+        assert await queue.request("GET", "missing", "upstream", "80") is None
+    finally:
+        await queue.stop()
+
+
+async def test_priority_order_and_full_queue(upstream):
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.path == "/blocker":
+            await release.wait()
+        return httpx.Response(200, json={}, request=request)
+
+    clients = upstream(handler)
+    queue = RequestQueue(maxsize=2, min_workers=1, max_workers=1)
+    try:
+        blocker = await queue.submit("GET", "blocker", "upstream", "80")
+        await asyncio.sleep(0)
+        low = await queue.submit("GET", "low", "upstream", "80", priority=PRIORITY_LOW)
+        high = await queue.submit("GET", "high", "upstream", "80", priority=PRIORITY_HIGH)
+        with pytest.raises(RequestQueueFull):
+            await queue.submit("GET", "rejected", "upstream", "80", block=False)
+        with pytest.raises(RequestQueueFull):
+            await queue.submit("GET", "rejected", "upstream", "80", timeout=0.01)
+
+        release.set()
+        await asyncio.gather(blocker, low, high)
+        assert clients.routes == ["blocker", "high", "low"]
+    finally:
+        await queue.stop()
+
+
+async def test_idle_workers_scale_down(upstream):
+    async def handler(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={}, request=request)
+
+    upstream(handler)
+    queue = RequestQueue(min_workers=1, max_workers=3, idle_timeout=0.05)
+    try:
+        await asyncio.gather(*[queue.request("GET", f"job{i}", "upstream", "80") for i in range(6)])
+        assert queue.workers > 1
+        await asyncio.sleep(0.2)
+        assert queue.workers == 1
+    finally:
+        await queue.stop()
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+from services.request_scheduler import RequestScheduler, retry_listener
+from utils.rate_limit import ChatPacer
+
+
+class FakeApi:
+    def __init__(self, retry_after: int = 0) -> None:
+        self.retry_after = retry_after
+        self.sent = []
+
+    async def __call__(self, bot, method):
+        if self.retry_after:
+            retry_after, self.retry_after = self.retry_after, 0
+            raise TelegramRetryAfter(method, "Flood control", retry_after)
+        self.sent.append((time.monotonic(), method))
+        return True
+
+
+def test_pacer_lets_a_burst_through():
+    pacer = ChatPacer(interval=1.0, burst=3)
+
+    delays = [pacer.reserve(1) for _ in range(5)]
+
+    assert delays[:3] == [0, 0, 0]
+    assert delays[3] == pytest.approx(1.0, abs=0.01)
+    assert delays[4] == pytest.approx(2.0, abs=0.01)
+
+
+async def test_sends_to_one_chat_are_not_serialized_within_burst():
+    scheduler = RequestScheduler(rate=100, chat_interval=0.2, chat_burst=3)
+    api = FakeApi()
+    start = time.monotonic()
+
+    await asyncio.gather(*[scheduler(api, None, SendMessage(chat_id=1, text=str(i))) for i in range(4)])
+
+    times = sorted(sent_at - start for sent_at, _ in api.sent)
+    assert times[2] < 0.05
+    assert times[3] == pytest.approx(0.2, abs=0.05)
+    assert [method.text for _, method in api.sent] == ["0", "1", "2", "3"]
+
+
+async def test_retry_after_pauses_all_sends():
+    scheduler = RequestScheduler(rate=100, chat_interval=0)
+    api = FakeApi(retry_after=1)
+    start = time.monotonic()
+
+    held = asyncio.create_task(scheduler(api, None, SendMessage(chat_id=1, text="held")))
+    await asyncio.sleep(0.1)
+    await scheduler(api, None, SendMessage(chat_id=2, text="other"))
+    await held
+
+    assert scheduler.retries == 1
+    assert sorted(method.text for _, method in api.sent) == ["held", "other"]
+    # The flood limit is bot-wide, so the other chat waits too
+    assert all(sent_at - start >= 1 for sent_at, _ in api.sent)
+
+
+async def test_retry_after_is_reported_to_the_listener():
+    scheduler = RequestScheduler(rate=100, chat_interval=0)
+    errors = []
+    token = retry_listener.set(errors.append)
+    try:
+        await scheduler(FakeApi(retry_after=1), None, SendMessage(chat_id=1, text="held"))
+    finally:
+        retry_listener.reset(token)
+
+    assert [error.retry_after for error in errors] == [1]
+
+
+async def test_expired_holds_are_purged():
+    scheduler = RequestScheduler(rate=100, chat_interval=0, max_chats=2)
+    scheduler._hold(1).held_until = time.monotonic() + 0.05
+    scheduler._hold(2).held_until = time.monotonic() + 60
+    await asyncio.sleep(0.1)
+
+    await scheduler(FakeApi(), None, SendMessage(chat_id=3, text="hello"))
+    await scheduler(FakeApi(), None, GetMe())
+
+    assert list(scheduler._chats) == [2]
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+from redis.asyncio import Redis
+
+from infrastructure.api_services.common.response_cache import ResponseCache
+
+
+class Upstream:
+    def __init__(self, delay: float = 0.1) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"call": self.calls}
+
+
+async def test_concurrent_misses_share_one_call_across_instances(redis):
+    upstream = Upstream()
+    replicas = [ResponseCache(redis), ResponseCache(redis)]
+
+    results = await asyncio.gather(*(
+        cache.get_or_fetch("key", upstream.fetch, ttl=60) for cache in replicas for _ in range(5)
+    ))
+
+    assert upstream.calls == 1
+    assert results == [{"call": 1}] * 10
+
+
+async def test_stale_entry_is_served_while_refreshed(redis):
+    upstream = Upstream(delay=0.05)
+    cache = ResponseCache(redis)
+    await cache.get_or_fetch("key", upstream.fetch, ttl=0)
+
+    assert await cache.get_or_fetch("key", upstream.fetch, ttl=60) == {"call": 1}
+    await asyncio.sleep(0.1)
+    assert await cache.get_or_fetch("key", upstream.fetch, ttl=60) == {"call": 2}
+
+
+async def test_fetches_at_once_when_redis_is_unavailable():
+    redis = Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1)
+    upstream = Upstream(delay=0)
+    cache = ResponseCache(redis, lock_timeout=10)
+
+    start = time.monotonic()
+    assert await cache.get_or_fetch("key", upstream.fetch, ttl=60) == {"call": 1}
+    assert time.monotonic() - start < 1
+
+
+async def test_waiter_takes_over_when_fetching_caller_is_cancelled(redis):
+    upstream = Upstream(delay=0.2)
+    cache = ResponseCache(redis)
+
+    leader = asyncio.create_task(cache.get_or_fetch("key", upstream.fetch, ttl=60))
+    await asyncio.sleep(0.05)
+    waiter = asyncio.create_task(cache.get_or_fetch("key", upstream.fetch, ttl=60))
+    await asyncio.sleep(0.05)
+    leader.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert await waiter == {"call": 2}
+
+
+async def test_fetch_errors_reach_waiters(redis):
+    cache = ResponseCache(redis)
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(*(cache.get_or_fetch("key", failing, ttl=60) for _ in range(3)),
+                                   return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
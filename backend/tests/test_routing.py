@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from infrastructure.database.models import User
+from infrastructure.database.models.base import Base
+from infrastructure.database.routing import REPLICAS, ReplicaPool, RoutingSession, replica_reads
+
+
+async def create_database(username=None):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    if username is not None:
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.execute(User.__table__.insert().values(id=1, username=username))
+    return engine
+
+
+@pytest.fixture
+async def databases():
+    primary = await create_database("primary")
+    replica = await create_database("replica")
+    # A replica whose queries fail
+    broken = await create_database()
+    yield primary, replica, broken
+    for engine in (primary, replica, broken):
+        await engine.dispose()
+
+
+def session_pool(primary, *replicas):
+    pool = ReplicaPool(list(replicas))
+    sessionmaker = async_sessionmaker(
+        bind=primary,
+        expire_on_commit=False,
+        sync_session_class=RoutingSession,
+        info={REPLICAS: pool},
+    )
+    return sessionmaker, pool
+
+
+async def read_username(session) -> str:
+    return (await session.execute(select(User.username).filter_by(id=1))).scalar_one()
+
+
+async def test_reads_go_to_the_replica(databases):
+    primary, replica, _ = databases
+    sessionmaker, _ = session_pool(primary, replica)
+
+    async with sessionmaker() as session:
+        assert await read_username(session) == "primary"
+        with replica_reads(session):
+            assert await read_username(session) == "replica"
+
+
+async def test_reads_after_a_write_go_to_the_primary(databases):
+    primary, replica, _ = databases
+    sessionmaker, _ = session_pool(primary, replica)
+
+    async with sessionmaker() as session:
+        with replica_reads(session):
+            await session.execute(User.__table__.update().values(username="written"))
+            assert await read_username(session) == "written"
+
+
+async def test_reads_fall_back_to_the_primary_without_healthy_replicas(databases):
+    primary, replica, _ = databases
+    sessionmaker, pool = session_pool(primary, replica)
+    pool._set_healthy(replica, False)
+
+    async with sessionmaker() as session:
+        with replica_reads(session):
+            assert await read_username(session) == "primary"
+
+
+async def test_failed_replica_read_is_retried_on_the_primary(databases):
+    primary, replica, broken = databases
+    sessionmaker, pool = session_pool(primary, broken, replica)
+
+    async with sessionmaker() as session:
+        with replica_reads(session):
+            assert await read_username(session) == "primary"
+            # The session stays on the primary, and the replica is out of rotation at once
+            assert await read_username(session) == "primary"
+        await session.commit()
+
+    assert pool.next() is replica.sync_engine
+    assert pool.next() is replica.sync_engine
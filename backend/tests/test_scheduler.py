@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from apscheduler.jobstores.base import ConflictingIdError
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from services.sheduler import BatchingRedisJobStore, ScheduledJob, SchedulerLeader, set_scheduled_jobs_bulk
+
+executed = []
+
+
+def record(value):
+    executed.append(value)
+
+
+@pytest.fixture
+def jobstore(redis_server):
+    store = BatchingRedisJobStore()
+    store.redis = fakeredis.FakeRedis(server=redis_server)
+    return store
+
+
+async def test_bulk_add_skips_existing_ids(jobstore):
+    scheduler = AsyncIOScheduler(jobstores={"default": jobstore})
+    scheduler.start(paused=True)
+    try:
+        jobs = [ScheduledJob(record, minutes_before=10, args=(i,), job_id=f"job-{i}") for i in range(3)]
+        assert await set_scheduled_jobs_bulk(scheduler, jobstore, jobs) == 3
+        assert await set_scheduled_jobs_bulk(scheduler, jobstore, jobs + [ScheduledJob(record, args=(3,), job_id="new")]) == 1
+        assert {job.id for job in scheduler.get_jobs()} == {"job-0", "job-1", "job-2", "new"}
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+async def test_bulk_add_keeps_the_event_loop_free(jobstore, monkeypatch):
+    scheduler = AsyncIOScheduler(jobstores={"default": jobstore})
+    scheduler.start(paused=True)
+    pipeline = jobstore.redis.pipeline
+
+    def slow_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def slow_execute(*execute_args, **execute_kwargs):
+            # A slow round trip of the blocking Redis client
+            time.sleep(0.1)
+            return execute(*execute_args, **execute_kwargs)
+
+        pipe.execute = slow_execute
+        return pipe
+
+    monkeypatch.setattr(jobstore.redis, "pipeline", slow_pipeline)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        jobs = [ScheduledJob(record, minutes_before=10, args=(i,), job_id=f"job-{i}") for i in range(3)]
+        assert await set_scheduled_jobs_bulk(scheduler, jobstore, jobs) == 3
+        assert ticks >= 10
+    finally:
+        ticker.cancel()
+        scheduler.shutdown(wait=False)
+
+
+async def test_batched_add_job_raises_on_duplicate_id(jobstore):
+    scheduler = AsyncIOScheduler(jobstores={"default": jobstore})
+    scheduler.start(paused=True)
+    try:
+        scheduler.add_job(record, "date", id="dup", args=(1,))
+        with jobstore.batch():
+            with pytest.raises(ConflictingIdError):
+                scheduler.add_job(record, "date", id="dup", args=(2,))
+    finally:
+        scheduler.shutdown(wait=False)
+
+
+async def test_leader_runs_jobs_added_by_follower(redis, redis_server):
+    executed.clear()
+    leader_scheduler = AsyncIOScheduler(jobstores={"default": _store(redis_server)})
+    follower_scheduler = AsyncIOScheduler(jobstores={"default": _store(redis_server)})
+    leader_scheduler.start(paused=True)
+    follower_scheduler.start(paused=True)
+    leader = SchedulerLeader(leader_scheduler, redis, ttl=1)
+    follower = SchedulerLeader(follower_scheduler, redis, ttl=1)
+    leader.start()
+    try:
+        await asyncio.sleep(0.1)
+        follower.start()
+        await asyncio.sleep(0.1)
+        assert leader.is_leader and not follower.is_leader
+
+        # The leader is idle with an empty store; the follower's add_job doesn't wake it up
+        follower_scheduler.add_job(record, "date", args=("from follower",))
+        await asyncio.sleep(1)
+        assert executed == ["from follower"]
+    finally:
+        await follower.close()
+        await leader.close()
+        leader_scheduler.shutdown(wait=False)
+        follower_scheduler.shutdown(wait=False)
+
+
+def _store(redis_server):
+    store = BatchingRedisJobStore()
+    store.redis = fakeredis.FakeRedis(server=redis_server)
+    return store
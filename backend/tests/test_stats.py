@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from infrastructure.database.models import User
+from infrastructure.database.repo import stats as stats_module
+from infrastructure.database.repo.stats import StatsRepo
+
+
+async def add_users(sessionmaker, *users: User) -> None:
+    async with sessionmaker() as session:
+        session.add_all(users)
+        await session.commit()
+
+
+async def test_reconcile_corrects_counters(sessionmaker, redis):
+    await add_users(
+        sessionmaker,
+        User(id=1, language="en", created_at=datetime.now() - timedelta(days=3)),
+        User(id=2, language="en"),
+        User(id=3, language="de"),
+    )
+    stats = StatsRepo(sessionmaker, redis)
+    # Drifted counters, including a language nobody has any more
+    await redis.set(stats.total_key, 10)
+    await redis.hset(stats.languages_key, mapping={"en": 7, "fr": 3})
+
+    result = await stats.reconcile()
+
+    assert (result.total, result.new_today, result.languages) == (3, 2, {"en": 2, "de": 1})
+    assert await stats._read() == result
+
+
+async def test_reconcile_keeps_users_counted_during_the_scan(sessionmaker, redis):
+    await add_users(sessionmaker, User(id=1, language="en"))
+    stats = StatsRepo(sessionmaker, redis)
+    await stats.reconcile()
+
+    class ScanningSession:
+        def __init__(self, session):
+            self.session = session
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            await self.session.close()
+
+        async def execute(self, stmt):
+            result = await self.session.execute(stmt)
+            # A user created after the scan has read the table
+            await add_users(sessionmaker, User(id=2, language="de"))
+            await stats.record_new_user("de")
+            return result
+
+    stats.sessionmaker = lambda: ScanningSession(sessionmaker())
+
+    result = await stats.reconcile()
+
+    assert (result.total, result.new_today, result.languages) == (2, 2, {"en": 1, "de": 1})
+
+
+@pytest.fixture
+def clock(monkeypatch, host_timezone):
+    """Frozen clock of the stats module, set in UTC."""
+    now = [datetime(2024, 1, 1, 20, 0, tzinfo=timezone.utc)]
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            if tz is None:
+                return now[0].astimezone().replace(tzinfo=None)
+            return now[0].astimezone(tz)
+
+    monkeypatch.setattr(stats_module, "datetime", FrozenDatetime)
+    return now
+
+
+async def test_new_users_are_counted_by_the_utc_day(sessionmaker, redis, clock):
+    # 05:00 on January 2 on the host, still January 1 in UTC and in the database
+    await add_users(
+        sessionmaker,
+        User(id=1, language="en", created_at=datetime(2023, 12, 31, 23, 0)),
+        User(id=2, language="en", created_at=datetime(2024, 1, 1, 10, 0)),
+    )
+    stats = StatsRepo(sessionmaker, redis)
+    await stats.reconcile()
+
+    await add_users(sessionmaker, User(id=3, language="en", created_at=datetime(2024, 1, 1, 19, 0)))
+    await stats.record_new_user("en")
+    assert (await stats._read()).new_today == 2
+
+    # Midnight UTC
+    clock[0] = datetime(2024, 1, 2, 0, 30, tzinfo=timezone.utc)
+    assert (await stats._read()).new_today == 0
+    await add_users(sessionmaker, User(id=4, language="en", created_at=datetime(2024, 1, 2, 0, 10)))
+    await stats.record_new_user("en")
+    assert (await stats._read()).new_today == 1
+
+    result = await stats.reconcile()
+    assert (result.total, result.new_today) == (4, 1)
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from infrastructure.api_services.common.cache import TieredCache
+
+
+@pytest.fixture
+async def caches(redis_server):
+    clients = [FakeAsyncRedis(server=redis_server) for _ in range(2)]
+    caches = [TieredCache(client, local_ttl=60, compress_min_size=16) for client in clients]
+    for cache in caches:
+        cache.start()
+    # Let both subscribe
+    await asyncio.sleep(0.1)
+    yield caches
+    for cache, client in zip(caches, clients):
+        await cache.close()
+        await client.close()
+
+
+async def wait_for(condition, timeout: float = 1.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def test_write_invalidates_other_processes(caches):
+    first, second = caches
+    await first.set("key", {"v": 1})
+    assert await second.get("key") == {"v": 1}
+
+    await first.set("key", {"v": 2})
+
+    await wait_for(lambda: "key" not in second._local)
+    assert await second.get("key") == {"v": 2}
+
+
+async def test_invalidation_during_fetch_is_not_overwritten(caches, monkeypatch):
+    first, second = caches
+    await first.set("key", "old")
+    mget = second.client.mget
+
+    async def slow_mget(keys):
+        values = await mget(keys)
+        # Another process writes while the old value is on its way
+        await first.set("key", "new")
+        await wait_for(lambda: second._generation > generation)
+        return values
+
+    generation = second._generation
+    monkeypatch.setattr(second.client, "mget", slow_mget)
+    assert await second.get("key") == "old"
+    monkeypatch.undo()
+
+    assert "key" not in second._local
+    assert await second.get("key") == "new"
+
+
+@pytest.mark.parametrize("value", [b"\xf0 raw bytes", b"\xf2" * 100, {"nested": [1, 2, 3]}, "x" * 100, 42])
+async def test_values_round_trip(caches, value):
+    first, second = caches
+
+    await first.set("key", value)
+
+    assert await second.get("key") == value
+
+
+@pytest.mark.parametrize("raw", [b"\xf0\x9f\x98\x80 emoji", b"\xf1compressed?", b"17", b'{"json": true}'])
+async def test_values_of_other_clients_are_returned_raw(caches, raw):
+    first, _ = caches
+
+    await first.client.set("key", raw)
+
+    assert await first.get("key") == raw
+
+
+async def test_writer_reads_what_other_processes_read(caches):
+    first, second = caches
+    value = {"t": (1, 2), "d": datetime(2024, 1, 1)}
+
+    await first.set("key", value)
+    value["t"] = None
+
+    expected = {"t": [1, 2], "d": "2024-01-01T00:00:00"}
+    assert await first.get("key") == expected
+    assert await second.get("key") == expected
@@ -0,0 +1,135 @@
+import asyncio
+from contextvars import ContextVar
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import CommandStart, StateFilter
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.types import Chat, Update
+
+from services.update_executor import UpdateExecutor
+
+
+def make_update(update_id: int, text: str = "hi") -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "John"},
+            "text": text,
+        },
+    })
+
+
+@pytest.fixture
+async def executor_factory():
+    executors = []
+
+    def create(**kwargs) -> UpdateExecutor:
+        executor = UpdateExecutor(Dispatcher(), concurrency=2, **kwargs)
+        executor.start()
+        executors.append(executor)
+        return executor
+
+    yield create
+    for executor in executors:
+        await executor.close(timeout=1)
+
+
+async def test_polling_mode_returns_before_the_update_runs(executor_factory):
+    executor = executor_factory()
+    done = asyncio.Event()
+
+    async def handler(event, data):
+        await asyncio.sleep(0.05)
+        done.set()
+        return "handled"
+
+    assert await executor(handler, make_update(1), {"event_chat": Chat(id=1, type="private")}) is None
+    assert not done.is_set()
+    await asyncio.wait_for(done.wait(), 1)
+
+
+async def test_webhook_mode_waits_for_the_result(executor_factory):
+    executor = executor_factory(wait_for_result=True)
+    order = []
+
+    async def handler(event, data):
+        await asyncio.sleep(0.01 * (3 - event.update_id))
+        order.append(event.update_id)
+        return event.update_id
+
+    chat = {"event_chat": Chat(id=1, type="private")}
+    results = await asyncio.gather(*[executor(handler, make_update(i), chat) for i in range(3)])
+
+    assert results == [0, 1, 2]
+    # Updates of one chat still run in order
+    assert order == [0, 1, 2]
+    assert executor.depth == 0
+
+
+async def test_failed_update_is_reported_unhandled(executor_factory):
+    executor = executor_factory(wait_for_result=True)
+
+    async def handler(event, data):
+        raise RuntimeError("boom")
+
+    assert await executor(handler, make_update(1), {}) is UNHANDLED
+    assert executor.stats.failed == 1
+
+
+class Form(StatesGroup):
+    name = State()
+
+
+async def test_state_is_read_after_earlier_updates_of_the_chat():
+    routed = []
+    router = Router()
+
+    @router.message(CommandStart())
+    async def start(message, state: FSMContext):
+        # The next update of the chat is already queued by now
+        await asyncio.sleep(0.05)
+        await state.set_state(Form.name)
+        routed.append("start")
+
+    @router.message(StateFilter(Form.name), F.text)
+    async def name(message, state: FSMContext):
+        routed.append(f"name:{message.text}")
+
+    @router.message()
+    async def no_state(message):
+        routed.append("no-state")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    executor = UpdateExecutor(dp, concurrency=2)
+    executor.install(dp)
+    executor.start()
+    bot = Bot("42:TEST")
+
+    await dp.feed_update(bot, make_update(1, "/start"))
+    await dp.feed_update(bot, make_update(2, "John"))
+    await executor.close(timeout=1)
+    await bot.session.close()
+
+    assert routed == ["start", "name:John"]
+
+
+async def test_context_of_an_update_does_not_reach_the_next_one(executor_factory):
+    executor = executor_factory(wait_for_result=True)
+    seen = ContextVar("seen", default=None)
+
+    async def handler(event, data):
+        previous = seen.get()
+        seen.set(event.update_id)
+        return previous
+
+    chat = {"event_chat": Chat(id=1, type="private")}
+    # One chat, so both run on the same worker one after the other
+    results = await asyncio.gather(executor(handler, make_update(1), chat), executor(handler, make_update(2), chat))
+    assert results == [None, None]
@@ -0,0 +1,29 @@
+from sqlalchemy.dialects import postgresql
+
+from infrastructure.database.models import User
+from infrastructure.database.repo.users import UserRepo
+
+
+class RecordingSession:
+    def __init__(self) -> None:
+        self.statements = []
+        self.info = {}
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return self
+
+    def one(self):
+        return User(id=1), False
+
+
+async def test_upsert_updates_the_whole_profile_on_conflict():
+    session = RecordingSession()
+    repo = UserRepo(sessionmaker=None, session=session)
+
+    await repo.upsert(1, first_name="New", last_name=None, language="de", username="new")
+
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    update_set = sql.split("DO UPDATE SET", 1)[1]
+    for column in ("first_name", "last_name", "username", "language", "updated_at"):
+        assert f"{column} = " in update_set
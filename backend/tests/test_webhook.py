@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from services.webhook import BoundedRequestHandler, run_webhook
+from settings.bot_settings import BotSettings
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "hi"}}
+
+
+async def test_webhook_mode_requires_secret():
+    bot = Bot(token="123456:TEST")
+    try:
+        with pytest.raises(RuntimeError):
+            # Without the check it would serve forever
+            await asyncio.wait_for(run_webhook(Dispatcher(), bot, BotSettings(use_webhook=True, webhook_secret="")), 5)
+    finally:
+        await bot.session.close()
+
+
+async def test_update_without_secret_is_rejected():
+    bot = Bot(token="123456:TEST")
+    app = web.Application()
+    BoundedRequestHandler(Dispatcher(), bot, secret_token="s3cret").register(app, path="/webhook")
+
+    async with TestClient(TestServer(app)) as client:
+        response = await client.post("/webhook", json=UPDATE)
+        assert response.status == 401
+        response = await client.post("/webhook", json=UPDATE,
+                                     headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+        assert response.status == 401
+        response = await client.post("/webhook", json=UPDATE,
+                                     headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"})
+        assert response.status == 200
+    await bot.session.close()